@@ -1,15 +1,39 @@
-import boto3
 import json
 import os
 import re
-from datetime import datetime, timedelta
+import time
+import hashlib
 import logging
-from botocore.signers import CloudFrontSigner
-import rsa
 
-# Initialize AWS clients
-ses = boto3.client('ses')
-ssm = boto3.client('ssm')
+import aws_clients # Lazy, shared boto3 clients, see aws_clients.py
+import cloudfront_signing # Long-lived CloudFront signers with a pluggable RSA backend
+import param_cache # Shared, TTL-cached SSM parameters, see param_cache.py
+import cv_queue # Pluggable queue (SQS / in-process / file) and paced draining for queued delivery
+import rate_limit # DynamoDB token buckets and idempotency records, see rate_limit.py
+import tracing # Per-invocation stage timings and one EMF metrics line, see tracing.py
+import api_response # Shared CORS headers, JSON encoding and error responses, see api_response.py
+
+# AWS clients (SES, SSM, DynamoDB) are built on first use by aws_clients, so preflights and validation errors never pay for them.
+
+PRIVATE_KEY_PARAM = '/cloudfront/private_key'
+KEY_PAIR_ID_PARAM = '/cloudfront/key_pair_id'
+
+# Delivery mode: "sync" sends the email inside the API request, "queue" enqueues it and answers 202 (see worker_handler).
+# "queue" needs CV_QUEUE, an SQS queue URL under Lambda (see cv_queue.queue_from_env); without it the import fails.
+delivery_mode = os.environ.get('CV_DELIVERY_MODE', 'sync')
+dedupe_seconds = int(os.environ.get('CV_DEDUPE_SECONDS', '300')) # Same address within this window is only enqueued once.
+send_rate = float(os.environ.get('CV_SEND_RATE', '1')) # Emails per second per worker (SES sandbox allows 1/s).
+max_attempts = int(os.environ.get('CV_MAX_ATTEMPTS', '5'))
+cv_request_queue = cv_queue.queue_from_env() if delivery_mode == 'queue' else None
+
+# Abuse protection, enabled by setting RATE_LIMIT_TABLE (partition key "limit_key", TTL attribute "expires_at").
+rate_limit_table_name = os.environ.get('RATE_LIMIT_TABLE')
+rate_limit_table = aws_clients.lazy_table(rate_limit_table_name) # None when rate limiting is off
+email_capacity = int(os.environ.get('RATE_LIMIT_EMAIL_CAPACITY', '3')) # Burst of requests allowed per recipient...
+email_refill_per_hour = float(os.environ.get('RATE_LIMIT_EMAIL_PER_HOUR', '3')) # ...and how fast that allowance comes back.
+ip_capacity = int(os.environ.get('RATE_LIMIT_IP_CAPACITY', '10'))
+ip_refill_per_hour = float(os.environ.get('RATE_LIMIT_IP_PER_HOUR', '20'))
+idempotency_seconds = int(os.environ.get('IDEMPOTENCY_MINUTES', '10')) * 60 # Duplicate submissions in this window get the original result.
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -26,150 +50,225 @@ def get_parameter(param_name):
     Retrieve parameter from AWS Systems Manager Parameter Store.
     """
     try:
-        response = ssm.get_parameter(Name=param_name, WithDecryption=True)
-        return response['Parameter']['Value']
+        return param_cache.get_parameter(param_name) # Served from memory on warm invocations.
     except Exception as e:
         logger.error(f"Error retrieving parameter {param_name}: {str(e)}")
         raise e
 
-def rsa_signer(message):
+def generate_signed_url(url, key_pair_id, expiration_minutes=60):
     """
-    Signer function for CloudFrontSigner.
+    Generate a CloudFront pre-signed URL using CloudFrontSigner.
     """
-    private_key_pem = get_parameter('/cloudfront/private_key')
-    private_key = rsa.PrivateKey.load_pkcs1(private_key_pem.encode('utf-8'))
-    return rsa.sign(message, private_key, 'SHA-1')
+    # The parsed key (wrapped in a sign function with a signature cache) is kept in memory and only
+    # re-parsed if the parameter value changes. See cloudfront_signing.py for the backends and signature reuse.
+    sign = param_cache.get_parsed(PRIVATE_KEY_PARAM, cloudfront_signing.load_signing_key)
+    return cloudfront_signing.signed_url(url, key_pair_id, sign, expiration_minutes=expiration_minutes)
 
-def generate_signed_url(url, key_pair_id, expiration_minutes=60):
+def compose_email(signed_url):
     """
-    Generate a CloudFront pre-signed URL using CloudFrontSigner.
+    Return the (subject, body) of the CV email.
     """
-    cloudfront_signer = CloudFrontSigner(key_pair_id, rsa_signer)
-    expire_date = datetime.utcnow() + timedelta(minutes=expiration_minutes)
-    signed_url = cloudfront_signer.generate_presigned_url(
-        url, date_less_than=expire_date
+    subject = "Your Requested CV"
+    body_text = (
+        f"Dear User,\n\n"
+        f"Please find your requested CV at the following link:\n{signed_url}\n\n"
+        f"Note: This link will expire in 1 hour.\n\n"
+        f"Best regards,\nSamuel Albershtein"
     )
-    return signed_url
+    return subject, body_text
 
-def lambda_handler(event, context):
+def send_email(sender_email, recipient_email, signed_url):
     """
-    Handle the Lambda invocation for sending the CV link.
+    Send the CV email with SES.
+    """
+    subject, body_text = compose_email(signed_url)
+    with tracing.stage('ses'):
+        aws_clients.client('ses').send_email(
+            Source=sender_email,
+            Destination={"ToAddresses": [recipient_email]},
+            Message={
+                "Subject": {"Data": subject},
+                "Body": {"Text": {"Data": body_text}}
+            }
+        )
+
+def deliver(message):
+    """
+    Sign a fresh link and send it for one queued request. Raises on failure so the worker can retry.
+    """
+    key_pair_id = param_cache.get_parameter(KEY_PAIR_ID_PARAM)
+    with tracing.stage('signing'):
+        signed_url = generate_signed_url(os.environ['CLOUDFRONT_URL'], key_pair_id)
+    send_email(os.environ['SENDER_EMAIL'], message['email'], signed_url)
+
+def enqueue_request(recipient_email):
+    """
+    Queue a validated CV request and answer 202 straight away.
     """
+    # Requests for the same address in the same window share a dedupe ID, so double clicks are only queued once.
+    window = int(time.time() // dedupe_seconds)
+    dedupe_id = hashlib.sha256(f"{recipient_email.lower()}|{window}".encode('utf-8')).hexdigest()
+    try:
+        with tracing.stage('queue'):
+            queued = cv_request_queue.send({'email': recipient_email, 'requested_at': int(time.time())}, dedupe_id)
+    except Exception as e:
+        logger.error(f"Failed to queue CV request: {str(e)}")
+        return api_response.error(500, f"Failed to queue request: {str(e)}", api_response.POST_HEADERS)
+    message = "Request received, the CV link is on its way!" if queued else "Request already received, the CV link is on its way!"
+    return api_response.respond(202, {"message": message}, api_response.POST_HEADERS, cache_control=api_response.NO_STORE)
+
+def hashed(kind, value):
+    """
+    Build a rate-limit table key without storing the address or IP in the clear.
+    """
+    return f"{kind}#{hashlib.sha256(value.strip().lower().encode('utf-8')).hexdigest()}"
+
+def protect(event, recipient_email):
+    """
+    Apply the idempotency window and the per-recipient / per-IP token buckets.
+    Returns (response to send back instead, or None; idempotency key we now own, or None).
+    """
+    if rate_limit_table is None:
+        return None, None
+
+    idempotency_key = hashed('idem', recipient_email)
+    claimed = None # Set once the claim is ours; from then on it must be completed or released.
+    try:
+        # Duplicate submission? Hand back the original result, no signing, no sending, no token spent.
+        existing = rate_limit.claim(rate_limit_table, idempotency_key, idempotency_seconds)
+        if existing:
+            tracing.outcome('idempotency', 'replay')
+            if existing.get('response'):
+                return existing['response'], None
+            return api_response.respond(202, {"message": "Request already in progress"}, api_response.POST_HEADERS, cache_control=api_response.NO_STORE), None
+        claimed = idempotency_key
 
-    # Log the incoming event for debugging
-    logger.info(json.dumps(event))
+        source_ip = ((event.get('requestContext') or {}).get('identity') or {}).get('sourceIp', 'unknown')
+        limits = [
+            (hashed('ip', source_ip), ip_capacity, ip_refill_per_hour),
+            (hashed('email', recipient_email), email_capacity, email_refill_per_hour)
+        ]
+        for key, capacity, per_hour in limits:
+            allowed, retry_after = rate_limit.take_token(rate_limit_table, key, capacity, per_hour / 3600)
+            if not allowed:
+                rate_limit.release(rate_limit_table, idempotency_key)
+                logger.info(f"Rate limited {key.split('#')[0]}")
+                tracing.outcome('rate_limit', key.split('#')[0])
+                return api_response.error(
+                    429, "Too many requests, please try again later.", api_response.POST_HEADERS,
+                    headers={"Retry-After": str(int(retry_after) + 1)}
+                ), None
+    except Exception as e:
+        # The limiter protects the expensive path, it shouldn't take the feature down. Fail open, but hand back a
+        # claim we already hold: the caller completes or releases it, otherwise every retry in the window would be
+        # answered "already in progress" for a request that is long over.
+        logger.error(f"Rate limiting unavailable: {str(e)}")
+        return None, claimed
+    return None, claimed
 
+@tracing.traced # Timings and outcomes go out as one metrics line; the raw event is only logged for a sample.
+def lambda_handler(event, context):
+    """
+    Handle the Lambda invocation for sending the CV link.
+    """
     # Handle CORS preflight (OPTIONS request) # important for the receive CV button 
     if event.get('httpMethod') == 'OPTIONS':
-        return {
-            "statusCode": 200,
-            "headers": {
-                "Access-Control-Allow-Origin": "*",  # Replace "*" with your domain if needed
-                "Access-Control-Allow-Methods": "POST,OPTIONS",
-                "Access-Control-Allow-Headers": "Content-Type,Authorization",
-            },
-            "body": json.dumps({"message": "CORS preflight request success"})
-        }
+        return api_response.preflight(api_response.POST_HEADERS)
     
     # Extract the email address from the event
     try:
         recipient_email = json.loads(event['body'])['email']
     except (KeyError, json.JSONDecodeError, TypeError) as e:
         logger.error(f"Invalid input format: {str(e)}")
-        return {
-            "statusCode": 400,
-            "headers": {
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST,OPTIONS",
-                "Access-Control-Allow-Headers": "Content-Type,Authorization"
-            },
-            "body": json.dumps({"error": "Invalid input format. Expected a JSON with 'email' key."})
-        }
+        return api_response.error(400, "Invalid input format. Expected a JSON with 'email' key.", api_response.POST_HEADERS)
+
+    # Validate email address
+    if not recipient_email or not is_valid_email(recipient_email):
+        logger.error("Invalid email address")
+        return api_response.error(400, "Invalid email address", api_response.POST_HEADERS)
 
+    # Rate limits and idempotency (only when RATE_LIMIT_TABLE is set), before any expensive work
+    with tracing.stage('rate_limit'):
+        blocked, idempotency_key = protect(event, recipient_email)
+    if blocked:
+        return blocked
+
+    response = enqueue_request(recipient_email) if delivery_mode == 'queue' else send_cv(recipient_email)
+
+    if idempotency_key:
+        try:
+            with tracing.stage('rate_limit'):
+                if response['statusCode'] < 300:
+                    rate_limit.complete(rate_limit_table, idempotency_key, response, idempotency_seconds) # Repeats get this response back.
+                else:
+                    rate_limit.release(rate_limit_table, idempotency_key) # Failed, let the user try again right away.
+        except Exception as e:
+            logger.error(f"Failed to store idempotency record: {str(e)}")
+    return response
+
+def send_cv(recipient_email):
+    """
+    Sign the CV link and email it right away (synchronous delivery). Returns the API response.
+    """
     sender_email = os.environ['SENDER_EMAIL']
     cloudfront_url = os.environ['CLOUDFRONT_URL']
 
     # Retrieve parameters from Parameter Store
     try:
-        private_key_pem = get_parameter('/cloudfront/private_key')
-        key_pair_id = get_parameter('/cloudfront/key_pair_id')
+        # One batched get_parameters call on a cold start, no SSM call at all while the cache is warm.
+        parameters = param_cache.get_parameters([PRIVATE_KEY_PARAM, KEY_PAIR_ID_PARAM])
+        key_pair_id = parameters[KEY_PAIR_ID_PARAM]
     except Exception as e:
         logger.error(f"Failed to retrieve parameters: {str(e)}")
-        return {
-            "statusCode": 500,
-            "headers": {
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST,OPTIONS",
-                "Access-Control-Allow-Headers": "Content-Type,Authorization"
-            },
-            "body": json.dumps({"error": f"Failed to retrieve parameters: {str(e)}"})
-        }
-
-    # Validate email address
-    if not recipient_email or not is_valid_email(recipient_email):
-        logger.error("Invalid email address")
-        return {
-            "statusCode": 400,
-            "headers": {
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST,OPTIONS",
-                "Access-Control-Allow-Headers": "Content-Type,Authorization"
-            },
-            "body": json.dumps({"error": "Invalid email address"})
-        }
+        return api_response.error(500, f"Failed to retrieve parameters: {str(e)}", api_response.POST_HEADERS)
 
     # Generate the pre-signed URL for the CV
     try:
-        signed_url = generate_signed_url(cloudfront_url, key_pair_id)
+        with tracing.stage('signing'):
+            signed_url = generate_signed_url(cloudfront_url, key_pair_id)
     except Exception as e:
         logger.error(f"Failed to generate pre-signed URL: {str(e)}")
-        return {
-            "statusCode": 500,
-            "headers": {
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST,OPTIONS",
-                "Access-Control-Allow-Headers": "Content-Type,Authorization"
-            },
-            "body": json.dumps({"error": f"Failed to generate pre-signed URL: {str(e)}"})
-        }
-
-    # Compose the email
-    subject = "Your Requested CV"
-    body_text = (
-        f"Dear User,\n\n"
-        f"Please find your requested CV at the following link:\n{signed_url}\n\n"
-        f"Note: This link will expire in 1 hour.\n\n"
-        f"Best regards,\nSamuel Albershtein"
-    )
+        return api_response.error(500, f"Failed to generate pre-signed URL: {str(e)}", api_response.POST_HEADERS)
 
     # Send email using SES
     try:
-        ses.send_email(
-            Source=sender_email,
-            Destination={"ToAddresses": [recipient_email]},
-            Message={
-                "Subject": {"Data": subject},
-                "Body": {"Text": {"Data": body_text}}
-            }
-        )
+        send_email(sender_email, recipient_email, signed_url)
         logger.info("Email sent successfully")
-        return {
-            "statusCode": 200,
-            "headers": {
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST,OPTIONS",
-                "Access-Control-Allow-Headers": "Content-Type,Authorization"
-            },
-            "body": json.dumps({"message": "Email sent successfully!"})
-        }
+        return api_response.respond(200, {"message": "Email sent successfully!"}, api_response.POST_HEADERS, cache_control=api_response.NO_STORE)
     except Exception as e:
         logger.error(f"Failed to send email: {str(e)}")
-        return {
-            "statusCode": 500,
-            "headers": {
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST,OPTIONS",
-                "Access-Control-Allow-Headers": "Content-Type,Authorization"
-            },
-            "body": json.dumps({"error": f"Failed to send email: {str(e)}"})
-        }
+        return api_response.error(500, f"Failed to send email: {str(e)}", api_response.POST_HEADERS)
+
+@tracing.traced
+def worker_handler(event, context):
+    """
+    Send queued CV emails, paced to CV_SEND_RATE and retried with backoff.
+
+    Triggered by an SQS event source mapping (event["Records"]), or invoked on a schedule / locally
+    to drain the CV_QUEUE queue by polling.
+    """
+    if 'Records' in event:
+        # SQS event source mapping: report failed messages back so only those are retried (ReportBatchItemFailures).
+        # Run the worker with reserved concurrency 1 to make CV_SEND_RATE a global limit.
+        pacer = cv_queue.Pacer(send_rate)
+        failures = []
+        for record in event['Records']:
+            message = cv_queue.from_sqs_record(record)
+            try:
+                delay = cv_queue.process(message, deliver, pacer, max_attempts)
+            except Exception as e:
+                logger.error(f"Dropping CV request after {max_attempts} attempts: {str(e)}")
+                continue
+            if delay is not None:
+                if isinstance(cv_request_queue, cv_queue.SQSQueue):
+                    cv_request_queue.retry(record['receiptHandle'], message, delay) # Backoff instead of the queue's default visibility timeout.
+                failures.append({'itemIdentifier': record['messageId']})
+        return {'batchItemFailures': failures}
+
+    queue = cv_request_queue or cv_queue.queue_from_env()
+    deadline = None
+    if context is not None:
+        deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - 5 # Stop 5 s before the Lambda timeout.
+    counts = cv_queue.drain(queue, deliver, rate=send_rate, max_attempts=max_attempts, deadline=deadline)
+    logger.info(json.dumps(counts))
+    return counts
@@ -0,0 +1,315 @@
+import argparse
+import gzip
+import json
+import os
+import sys
+
+try:
+    import numpy as np
+except ImportError: # Only this offline job needs NumPy, no Lambda does.
+    sys.exit("analytics_rollup.py needs NumPy: pip install numpy")
+
+try:
+    import orjson # Optional, parses the records several times faster than json.
+
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+'''
+Offline rollup of exported request records into hourly and daily traffic summaries.
+
+    python analytics_rollup.py exports/ --out rollup/
+    python analytics_rollup.py logs.gz more-logs/ --out rollup/ --chunk-size 500000
+
+Inputs (files, .gz files, directories walked recursively, or - for stdin), one record per line:
+
+    CloudWatch Logs export   "2026-10-18T10:00:00.000Z {"_aws": {...}, "route": "GET /crypto_api", "status": 200, ...}"
+                             the one EMF line every handler prints per invocation (see tracing.py); other log lines
+                             (START / END / REPORT, prints) are skipped.
+
+The logs are the only input: they go back as far as the log group's retention (or the archive they were exported
+to). The viewer table is not one. Its "seen#" dedupe items are deleted by TTL after VIEW_DEDUPE_WINDOW and a
+returning visitor's item is overwritten by their next counted visit, so an export of it only covers roughly the
+last window (30 minutes by default), not the period being rolled up.
+Counted vs. repeat views are in the logs instead, as the "dedupe" property (FIRST / REPEAT) of the POST
+/viewer-count lines; this rollup doesn't split them out.
+
+Records are parsed into fixed-size NumPy column chunks (--chunk-size rows, ~20 bytes per row), so memory depends on
+the chunk size and the number of distinct groups, not on how many months of records go in. Each chunk is grouped
+with one sort instead of a Python loop per record:
+
+    key = hour << 32 | route << 20 | status << 8 | cache    one int64 per record
+    argsort(key) -> boundaries where key changes -> np.add.reduceat / np.maximum.reduceat per column
+
+and the per-group partial sums are merged into the running totals the same way. Daily totals are the hourly ones
+grouped again on hour // 24.
+
+Outputs, NumPy .npz files (compressed, one array per column, np.load() them without pickle):
+
+    hourly.npz, daily.npz   period_start (epoch seconds, UTC), route, status, cache, requests, duration_ms_sum,
+                            duration_ms_max, cold_starts
+                            route and cache are codes into the "routes" and "caches" arrays of the same file.
+
+The printed summary shows per route the peak hour and the concurrency it needs (peak requests per second times the
+mean duration), and per cache outcome its share of requests, to size reserved concurrency and cache TTLs from
+real traffic. Status 0 and cache "-" mean the record didn't have one.
+'''
+
+CACHE_FIELDS = ('cache', 'count_cache', 'page_cache') # The outcome a route records, see tracing.outcome.
+NONE = '-'
+MAX_ROUTES = 1 << 12 # Field widths of the packed group key.
+MAX_STATUS = 1 << 12
+MAX_CACHES = 1 << 8
+
+CHUNK_COLUMNS = (
+    ('hour', np.int64),
+    ('route', np.int64),
+    ('status', np.int64),
+    ('cache', np.int64),
+    ('duration_ms', np.float32),
+    ('cold_start', np.int8)
+)
+
+
+def input_files(paths):
+    """
+    Yield the files to read: files as given, directories walked in sorted order, "-" for stdin.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def read_lines(paths):
+    """
+    Yield the lines of every input, one at a time (gzip files are decompressed on the fly).
+    """
+    for path in input_files(paths):
+        if path == '-':
+            yield from sys.stdin
+            continue
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8', errors='replace') as f:
+            yield from f
+
+
+def parse_record(line):
+    """
+    Return (epoch seconds, route, status, cache outcome, duration ms, cold start) for a record line, or None.
+    """
+    start = line.find('{')
+    if start < 0 or '"route"' not in line:
+        return None
+    try:
+        record = loads(line[start:])
+        timestamp = record['_aws']['Timestamp'] / 1000
+    except (ValueError, KeyError, TypeError):
+        return None
+    cache = next((record[field] for field in CACHE_FIELDS if field in record), NONE)
+    return (
+        timestamp, record['route'], int(record.get('status') or 0), str(cache),
+        float(record.get('duration_ms', 0)), int(record.get('cold_start', 0))
+    )
+
+
+def group(keys, columns):
+    """
+    Sum rows with the same key (max for *_max columns). Returns (unique sorted keys, {name: reduced column}).
+    """
+    if not len(keys):
+        return keys, columns
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    reduced = {}
+    for name, column in columns.items():
+        reduce = np.maximum if name.endswith('_max') else np.add
+        reduced[name] = reduce.reduceat(column[order], starts)
+    return keys[starts], reduced
+
+
+class Rollup:
+    """
+    Running hourly totals per (hour, route, status, cache outcome), fed one chunk of records at a time.
+    """
+
+    def __init__(self, chunk_size=200000):
+        self.chunk_size = chunk_size
+        self.routes = {} # name -> code
+        self.caches = {}
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.totals = {
+            'requests': np.zeros(0, dtype=np.int64),
+            'duration_ms_sum': np.zeros(0, dtype=np.float64),
+            'duration_ms_max': np.zeros(0, dtype=np.float32),
+            'cold_starts': np.zeros(0, dtype=np.int64)
+        }
+        self.records = 0
+        self._chunk = {name: np.zeros(chunk_size, dtype=dtype) for name, dtype in CHUNK_COLUMNS}
+        self._rows = 0
+
+    def _code(self, vocabulary, name, limit):
+        code = vocabulary.get(name)
+        if code is None:
+            if len(vocabulary) >= limit:
+                raise ValueError(f"More than {limit} distinct values, can't pack {name!r} into the group key")
+            code = vocabulary[name] = len(vocabulary)
+        return code
+
+    def add(self, timestamp, route, status, cache, duration_ms, cold_start):
+        """
+        Add one parsed record; every chunk_size records the chunk is grouped into the totals.
+        """
+        row, chunk = self._rows, self._chunk
+        chunk['hour'][row] = int(timestamp // 3600)
+        chunk['route'][row] = self._code(self.routes, route, MAX_ROUTES)
+        chunk['status'][row] = status if 0 <= status < MAX_STATUS else 0
+        chunk['cache'][row] = self._code(self.caches, cache, MAX_CACHES)
+        chunk['duration_ms'][row] = duration_ms
+        chunk['cold_start'][row] = cold_start
+        self._rows += 1
+        if self._rows == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Group the pending chunk and merge it into the running totals.
+        """
+        rows, chunk = self._rows, {name: column[:self._rows] for name, column in self._chunk.items()}
+        if not rows:
+            return
+        keys = chunk['hour'] << 32 | chunk['route'] << 20 | chunk['status'] << 8 | chunk['cache']
+        duration = chunk['duration_ms'].astype(np.float64)
+        keys, partial = group(keys, {
+            'requests': np.ones(rows, dtype=np.int64),
+            'duration_ms_sum': duration,
+            'duration_ms_max': chunk['duration_ms'],
+            'cold_starts': chunk['cold_start'].astype(np.int64)
+        })
+        self.keys, self.totals = group(
+            np.concatenate((self.keys, keys)),
+            {name: np.concatenate((self.totals[name], partial[name])) for name in self.totals}
+        )
+        self.records += rows
+        self._rows = 0
+
+    def table(self, period='hour'):
+        """
+        Return the totals as columns, one row per (period, route, status, cache), period 'hour' or 'day'.
+        """
+        self.flush()
+        keys, totals = self.keys, self.totals
+        if period == 'day':
+            keys, totals = group((keys >> 32) // 24 << 32 | keys & 0xFFFFFFFF, totals)
+        seconds = 3600 if period == 'hour' else 86400
+        return dict(
+            period_start=(keys >> 32) * seconds,
+            route=(keys >> 20 & (MAX_ROUTES - 1)).astype(np.int16),
+            status=(keys >> 8 & (MAX_STATUS - 1)).astype(np.int16),
+            cache=(keys & (MAX_CACHES - 1)).astype(np.uint8),
+            routes=np.array(list(self.routes), dtype=str),
+            caches=np.array(list(self.caches), dtype=str),
+            **totals
+        )
+
+
+def rollup(paths, chunk_size=200000):
+    """
+    Stream every record of the inputs through a Rollup. Returns (rollup, lines read).
+    """
+    result = Rollup(chunk_size)
+    lines = 0
+    for line in read_lines(paths):
+        lines += 1
+        record = parse_record(line)
+        if record is not None:
+            result.add(*record)
+    result.flush()
+    return result, lines
+
+
+def write_tables(result, out_dir):
+    """
+    Write hourly.npz and daily.npz into out_dir. Returns the paths written.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    for period, name in (('hour', 'hourly.npz'), ('day', 'daily.npz')):
+        path = os.path.join(out_dir, name)
+        np.savez_compressed(path, **result.table(period))
+        written.append(path)
+    return written
+
+
+def summarize(hourly):
+    """
+    Per route: requests, peak hour, concurrency needed at the peak, 5xx share. Per cache outcome: share of requests.
+    Every route in the vocabulary has at least one row.
+    """
+    routes, caches = hourly['routes'], hourly['caches']
+    requests, duration = hourly['requests'], hourly['duration_ms_sum']
+    total = int(requests.sum())
+    report = {'requests': total, 'routes': [], 'caches': []}
+
+    for code, route in enumerate(routes):
+        mine = hourly['route'] == code
+        _, per_hour = np.unique(hourly['period_start'][mine], return_inverse=True)
+        hour_requests = np.bincount(per_hour, weights=requests[mine]) # Rows of one hour differ in status / cache.
+        count = int(requests[mine].sum())
+        mean_ms = float(duration[mine].sum()) / count
+        peak_rps = float(hour_requests.max()) / 3600
+        report['routes'].append({
+            'route': str(route),
+            'requests': count,
+            'peak_hour_requests': int(hour_requests.max()),
+            'mean_ms': round(mean_ms, 1),
+            'max_ms': round(float(hourly['duration_ms_max'][mine].max()), 1),
+            'peak_concurrency': round(peak_rps * mean_ms / 1000, 3), # Little's law: arrivals per second x seconds each.
+            'errors_5xx_pct': round(100 * float(requests[mine & (hourly['status'] >= 500)].sum()) / count, 2),
+            'cold_start_pct': round(100 * float(hourly['cold_starts'][mine].sum()) / count, 2)
+        })
+    report['routes'].sort(key=lambda entry: -entry['requests'])
+
+    for code, cache in enumerate(caches):
+        count = int(requests[hourly['cache'] == code].sum())
+        report['caches'].append({'cache': str(cache), 'requests': count, 'pct': round(100 * count / max(1, total), 2)})
+    report['caches'].sort(key=lambda entry: -entry['requests'])
+    return report
+
+
+def print_summary(report):
+    print(f"{report['requests']:,} records")
+    print()
+    print(f"{'route':32} {'requests':>10} {'peak/h':>8} {'mean':>8} {'max':>9} {'conc.':>7} {'5xx %':>6} {'cold %':>6}  (ms)")
+    for entry in report['routes']:
+        print(f"{entry['route'][:32]:32} {entry['requests']:>10,} {entry['peak_hour_requests']:>8,} {entry['mean_ms']:>8} "
+              f"{entry['max_ms']:>9} {entry['peak_concurrency']:>7} {entry['errors_5xx_pct']:>6} {entry['cold_start_pct']:>6}")
+    print()
+    print(f"{'cache outcome':32} {'requests':>10} {'%':>8}")
+    for entry in report['caches']:
+        print(f"{entry['cache']:32} {entry['requests']:>10,} {entry['pct']:>8}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Roll exported request records up into hourly and daily summaries")
+    parser.add_argument('inputs', nargs='+', help="Log export files, .gz files or directories (- for stdin)")
+    parser.add_argument('--out', default='rollup', help="Directory for hourly.npz and daily.npz")
+    parser.add_argument('--chunk-size', type=int, default=200000, help="Records grouped per NumPy chunk")
+    parser.add_argument('--json', action='store_true', help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    result, lines = rollup(args.inputs, args.chunk_size)
+    written = write_tables(result, args.out)
+    report = summarize(result.table('hour'))
+    if args.json:
+        print(json.dumps(dict(report, lines=lines, files=written), indent=2))
+    else:
+        print_summary(report)
+        print()
+        print(f"{lines:,} lines read, written: {', '.join(written)}")
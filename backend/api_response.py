@@ -0,0 +1,109 @@
+import hashlib
+import json
+from types import MappingProxyType
+
+'''
+Shared API Gateway response builder for all handlers.
+
+Before this module every return branch rebuilt the same CORS header dict and called json.dumps inline.
+Now the header sets are built once at import time (read-only MappingProxyType, so nobody mutates the shared copy)
+and every response goes through respond() / error():
+
+- JSON encoding uses orjson when it's installed (several times faster than json.dumps), otherwise compact json.dumps.
+- Pass the event to get conditional requests: the body's ETag is compared to If-None-Match and an unchanged body
+  comes back as an empty 304, so browsers and CloudFront don't download it again.
+- cache_control sets Cache-Control, so CloudFront and browsers can absorb repeat reads
+  (e.g. "public, max-age=30, stale-while-revalidate=60" for prices, "no-store" for anything that writes).
+'''
+
+try:
+    import orjson # Optional, ship it in a layer to enable.
+
+    def encode(body):
+        """
+        Serialize a response body to a JSON string.
+        """
+        return orjson.dumps(body).decode('utf-8')
+except ImportError:
+    def encode(body):
+        """
+        Serialize a response body to a JSON string.
+        """
+        return json.dumps(body, separators=(',', ':'))
+
+
+def _cors(methods):
+    """
+    Build the read-only header set for a route that allows `methods`.
+    """
+    return MappingProxyType({
+        'Access-Control-Allow-Origin': '*', # Replace "*" with your domain if needed
+        'Access-Control-Allow-Methods': methods,
+        'Access-Control-Allow-Headers': 'Content-Type,Authorization,If-None-Match,Last-Event-ID',
+        'Access-Control-Expose-Headers': 'ETag,X-Cache,X-Cache-Hit-Ratio,X-Cache-Miss-Ratio,X-Cache-Stale-Ratio',
+        'Content-Type': 'application/json'
+    })
+
+
+# Precomputed header sets per route
+GET_HEADERS = _cors('GET,OPTIONS') # /crypto_api, /bootstrap
+GET_POST_HEADERS = _cors('GET,POST,OPTIONS') # /viewer-count (GET reads, POST counts)
+POST_HEADERS = _cors('POST,OPTIONS') # /send-cv
+
+NO_STORE = 'no-store'
+
+
+def etag(encoded_body):
+    """
+    Strong ETag for an encoded body.
+    """
+    return '"' + hashlib.sha1(encoded_body.encode('utf-8')).hexdigest()[:20] + '"'
+
+
+def _if_none_match(event):
+    """
+    Return the If-None-Match request header (header names are case-insensitive).
+    """
+    headers = (event or {}).get('headers') or {}
+    for name, value in headers.items():
+        if name.lower() == 'if-none-match':
+            return value
+    return None
+
+
+def respond(status_code, body, route_headers=GET_HEADERS, headers=None, cache_control=None, event=None):
+    """
+    Build a Lambda proxy response with the route's CORS headers and a JSON body.
+    """
+    encoded = body if isinstance(body, str) else encode(body)
+    response_headers = dict(route_headers)
+    if cache_control:
+        response_headers['Cache-Control'] = cache_control
+    if headers:
+        response_headers.update(headers)
+
+    if event is not None and status_code == 200:
+        tag = etag(encoded)
+        response_headers['ETag'] = tag
+        match = _if_none_match(event)
+        if match and (match.strip() == '*' or tag in [value.strip().removeprefix('W/') for value in match.split(',')]): # CloudFront weakens ETags when it compresses.
+            return {'statusCode': 304, 'headers': response_headers, 'body': ''}
+
+    return {'statusCode': status_code, 'headers': response_headers, 'body': encoded}
+
+
+def error(status_code, message, route_headers=GET_HEADERS, headers=None):
+    """
+    Build an error response ({"error": message}) that is never cached.
+    """
+    return respond(status_code, {'error': message}, route_headers, headers=headers, cache_control=NO_STORE)
+
+
+def preflight(route_headers=GET_HEADERS):
+    """
+    Answer a CORS preflight (OPTIONS) request.
+    """
+    return respond(
+        200, {'message': 'CORS preflight request success'}, route_headers,
+        headers={'Access-Control-Max-Age': '86400'} # Browsers skip the preflight for a day.
+    )
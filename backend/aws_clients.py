@@ -0,0 +1,116 @@
+import threading
+
+'''
+Lazy, memoized boto3 clients and resources shared by all handlers.
+
+Creating a boto3 client is one of the most expensive things a cold Lambda does: importing boto3 alone takes
+well over 100 ms, and building the first client loads the service model JSON on top of that. Before this module
+every handler did it at import time, so a CORS preflight or a cached price paid for clients it never used.
+
+Now nothing is imported or built until the first call that needs it:
+
+    aws_clients.client('ses')                 -> boto3.client('ses'), built once per container
+    aws_clients.resource('dynamodb')          -> boto3.resource('dynamodb'), built once per container
+    aws_clients.table('ViewerCountTable')     -> the Table, built once per container
+    aws_clients.lazy_table('ViewerCountTable')-> a stand-in that builds the Table on first attribute access
+
+lazy_table() is for module-level settings: the handler can keep a "table" global, and a request that never touches
+DynamoDB (preflight, in-memory cache hit) never builds the resource.
+
+override() swaps in a stand-in client or resource (stubs for local runs and benchmarks), reset() forgets everything.
+'''
+
+_clients = {} # ('client' | 'resource', service name) -> boto3 object
+_tables = {} # table name -> Table
+_lock = threading.Lock()
+
+
+def _get(kind, service):
+    """
+    Return the memoized boto3 client or resource, building it on first use.
+    """
+    key = (kind, service)
+    with _lock:
+        if key not in _clients:
+            import boto3 # Deferred: importing boto3 is a large share of the cold start.
+
+            _clients[key] = getattr(boto3, kind)(service)
+        return _clients[key]
+
+
+def client(service):
+    """
+    Return the shared boto3 client for a service (e.g. 'ses', 'ssm', 'sqs').
+    """
+    return _get('client', service)
+
+
+def resource(service):
+    """
+    Return the shared boto3 resource for a service (e.g. 'dynamodb').
+    """
+    return _get('resource', service)
+
+
+def table(name):
+    """
+    Return the shared DynamoDB Table object for a table name.
+    """
+    dynamodb = resource('dynamodb')
+    with _lock:
+        if name not in _tables:
+            _tables[name] = dynamodb.Table(name)
+        return _tables[name]
+
+
+class LazyTable:
+    """
+    Stands in for a DynamoDB Table and builds the real one on first attribute access.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attribute):
+        # Only called for attributes LazyTable doesn't have itself, i.e. everything but .name.
+        return getattr(table(self.name), attribute)
+
+    def __repr__(self):
+        return f"LazyTable({self.name!r})"
+
+
+def lazy_table(name):
+    """
+    Return a LazyTable for name, or None when name is empty (feature turned off).
+    """
+    return LazyTable(name) if name else None
+
+
+def override(service, client=None, resource=None):
+    """
+    Use the given objects instead of real boto3 clients / resources for a service (local runs, benchmarks).
+    """
+    with _lock:
+        if client is not None:
+            _clients[('client', service)] = client
+        if resource is not None:
+            _clients[('resource', service)] = resource
+            if service == 'dynamodb':
+                _tables.clear()
+
+
+def reset():
+    """
+    Forget every client, resource and table, so the next call builds them again (simulates a cold start).
+    """
+    with _lock:
+        _clients.clear()
+        _tables.clear()
+
+
+def created():
+    """
+    Return the names of the clients and resources built so far, e.g. ['client:ssm', 'resource:dynamodb'].
+    """
+    with _lock:
+        return sorted(f"{kind}:{service}" for kind, service in _clients)
@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+
+import api_response # Shared CORS headers, JSON encoding and error responses, see api_response.py
+import tracing # Per-invocation stage timings and one EMF metrics line, see tracing.py
+import price_cache # Cache outcome headers, see price_cache.py
+import lambda_function # count_view(): the /viewer-count logic
+import crypto_api # lookup_prices(): the /crypto_api logic, through the shared price cache
+
+'''
+GET /bootstrap: everything the page needs on load, in one request.
+
+    {"message": "View count updated", "view_count": 1234, "prices": {"BTC": 67012.5, "ETH": 2401.1}}
+
+?path=/blog/post-1 counts that page too, like POST /viewer-count?path=... (see lambda_function.py).
+
+Before, frontend/index.js called /viewer-count and /crypto_api separately on every page load: two API Gateway
+requests, two Lambda invocations (two cold starts on a quiet site) and, for a first-time visitor, a TLS handshake
+on each connection the browser opened. This handler runs the same two pieces of work in one invocation:
+
+    view increment (deduped, DynamoDB)     ─┐
+                                             ├─ in parallel on a thread pool, the response waits for the slower one
+    price lookup (cache, or CoinMarketCap) ─┘
+
+Both are blocking network calls (boto3 and requests release the GIL while they wait), so threads overlap them and
+the handler takes about as long as the slower call instead of the sum. The pool is built by the first request,
+like price_history's writers (the import stays cheap), and kept at module level, so warm invocations reuse its
+threads. The workers are submitted with tracing.bind, so their DynamoDB / upstream stage times still land in this
+invocation's metrics line.
+
+If one half fails (or takes longer than BOOTSTRAP_TIMEOUT seconds), the other half is still returned with a 200 and
+the failure is listed under "errors", e.g. {"view_count": 1234, "errors": {"prices": "HTTP request failed"}}.
+Only when both fail is the answer a 500.
+
+python local_api.py pageload compares a page load through this handler with the two-call flow.
+'''
+
+default_symbols = os.environ.get('BOOTSTRAP_SYMBOLS', crypto_api.prewarm_symbols) # Same list as frontend/index.js
+timeout = float(os.environ.get('BOOTSTRAP_TIMEOUT', '5')) # Seconds to wait for both halves together.
+DEADLINE_MARGIN = 0.5 # Seconds kept in reserve to answer before Lambda's own timeout.
+
+_pool = None # ThreadPoolExecutor, built on the first request so importing this module stays cheap.
+_pool_lock = threading.Lock()
+
+
+def _workers():
+    """
+    The shared worker pool. 2 tasks per request; spare threads cover abandoned (timed-out) ones.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from concurrent.futures import ThreadPoolExecutor # Loads concurrent.futures.thread, only requests need it.
+            _pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='bootstrap')
+        return _pool
+
+
+def wait_budget(context):
+    """
+    Seconds we can wait for the workers: BOOTSTRAP_TIMEOUT, or less if the Lambda is about to time out.
+    """
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        return max(0.0, min(timeout, context.get_remaining_time_in_millis() / 1000 - DEADLINE_MARGIN))
+    return timeout
+
+
+def lookup_prices(symbols):
+    """
+    Return (prices, cache outcome, unknown symbols): the /crypto_api lookup, allow-list check included.
+    Runs on the pool, so even a cold symbol registry load overlaps with the view increment.
+    """
+    wanted, unknown = crypto_api.resolve_symbols(symbols) # Raises TooManySymbols, reported under "errors".
+    if not wanted:
+        return {}, None, unknown
+    prices, outcome = crypto_api.lookup_prices(','.join(wanted))
+    return prices, outcome, unknown
+
+
+@tracing.traced
+def lambda_handler(event, context):
+    if event.get('httpMethod') == 'OPTIONS':
+        return api_response.preflight()
+
+    symbols = (event.get('queryStringParameters') or {}).get('symbols') or default_symbols
+    deadline = time.monotonic() + wait_budget(context)
+
+    # Both start right away; result() below only decides how long we wait for them.
+    from concurrent.futures import TimeoutError as FutureTimeout # Already loaded (price_cache, _workers()).
+    pool = _workers()
+    views = pool.submit(tracing.bind(lambda_function.count_view), event)
+    prices = pool.submit(tracing.bind(lookup_prices), symbols)
+
+    body, errors, headers = {}, {}, {}
+    try:
+        body.update(views.result(timeout=max(0.0, deadline - time.monotonic())))
+    except FutureTimeout:
+        errors['view_count'] = "Timed out"
+    except Exception as e:
+        errors['view_count'] = str(e)
+
+    try:
+        found, outcome, unknown = prices.result(timeout=max(0.0, deadline - time.monotonic()))
+        body['prices'] = found
+        if unknown:
+            body['unknown'] = unknown
+        if outcome:
+            tracing.outcome('cache', outcome)
+            headers = price_cache.stats_headers(outcome)
+    except FutureTimeout:
+        errors['prices'] = "Timed out"
+    except Exception as e:
+        errors['prices'] = f"HTTP request failed: {str(e)}" if crypto_api.is_http_error(e) else str(e)
+
+    if len(errors) == 2:
+        return api_response.error(500, f"View count: {errors['view_count']}; prices: {errors['prices']}")
+    if errors:
+        body['errors'] = errors
+        tracing.count('partial_failures')
+
+    return api_response.respond(200, body, headers=headers, cache_control=api_response.NO_STORE) # Counts a view, never cached.
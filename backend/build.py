@@ -0,0 +1,315 @@
+import argparse
+import ast
+import fnmatch
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import zipfile
+
+'''
+Deployment artifact builder: every Lambda function and layer, from one manifest (build_manifest.json).
+
+    python build.py                    # build everything into output_dir (../terraform/build)
+    python build.py crypto_api         # one artifact
+    python build.py --force            # rebuild even if nothing changed
+    python build.py --python /path/to/python3.9
+
+Functions
+    The handler module plus every backend module it imports (found by reading the import statements, including
+    imports inside functions), nothing else: no local tools, no benchmarks. The handler must import with no
+    site-packages at all (python -S), which catches a missing module at build time instead of on the first request.
+
+Layers
+    The pinned requirements, installed with pip for the Lambda platform (manylinux x86_64, the manifest's runtime).
+    Without pip / network access the committed layer zip (fallback_zip) is repacked instead.
+    Tests, docs, type stubs, dist-info, console scripts and the per-layer "strip" patterns are removed
+    (e.g. the rsa and pyasn1 copies that used to ride along in the requests layer).
+
+Every artifact is
+    - reproducible: entries sorted, fixed timestamps and permissions, so the same input gives the same bytes and
+      Terraform's source_code_hash only changes when the code does;
+    - precompiled: .pyc files for the target runtime in "unchecked-hash" mode. Lambda's code directory is read-only,
+      so without them every cold start compiles every module again. Needs an interpreter of the runtime's version
+      (found on PATH / pyenv, or --python); without one the zip ships sources only and says so;
+    - skipped when unchanged: the hash of all inputs is stored in the zip comment and compared before building.
+'''
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MANIFEST = os.path.join(HERE, 'build_manifest.json')
+BUILDER_VERSION = '1' # Bump when the output format changes, forces a rebuild of everything.
+FIXED_DATE = (1980, 1, 1, 0, 0, 0) # Earliest date a zip can hold.
+HASH_PREFIX = b'build-hash:'
+PLATFORM = 'manylinux2014_x86_64' # Lambda x86_64
+
+# Stand-in settings so a handler can be imported during the build check.
+IMPORT_CHECK_ENV = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'DYNAMODB_TABLE': 'build-check',
+    'SENDER_EMAIL': 'build@example.com',
+    'CLOUDFRONT_URL': 'https://example.cloudfront.net/cv.pdf'
+}
+
+
+def load_manifest(path=MANIFEST):
+    with open(path) as f:
+        return json.load(f)
+
+
+# ---------------------------------------------------------------------------------------------------------------
+# Inputs
+# ---------------------------------------------------------------------------------------------------------------
+
+def imported_names(path):
+    """
+    Return the top-level names of every module a source file imports (at any depth, including lazy imports).
+    """
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split('.')[0])
+    return names
+
+
+def module_closure(handler, source_dir=HERE):
+    """
+    Return the sorted file names of the handler module and every local module it (transitively) imports.
+    """
+    found, pending = set(), [handler]
+    while pending:
+        name = pending.pop()
+        path = os.path.join(source_dir, name + '.py')
+        if name in found or not os.path.exists(path):
+            continue # Standard library or a layer package.
+        found.add(name)
+        pending.extend(imported_names(path))
+    return sorted(name + '.py' for name in found)
+
+
+def find_interpreter(runtime, explicit=None):
+    """
+    Return the path of a Python interpreter matching the runtime (e.g. "python3.9"), or None.
+    """
+    version = runtime.replace('python', '')
+    candidates = [explicit] if explicit else [sys.executable, shutil.which(runtime)]
+    pyenv_root = os.environ.get('PYENV_ROOT', os.path.expanduser('~/.pyenv'))
+    if not explicit and os.path.isdir(os.path.join(pyenv_root, 'versions')):
+        for installed in sorted(os.listdir(os.path.join(pyenv_root, 'versions'))):
+            if installed == version or installed.startswith(version + '.'):
+                candidates.append(os.path.join(pyenv_root, 'versions', installed, 'bin', 'python'))
+    for candidate in candidates:
+        if not candidate or not os.path.exists(candidate):
+            continue
+        reported = subprocess.run(
+            [candidate, '-c', 'import sys; print("%d.%d" % sys.version_info[:2])'], capture_output=True, text=True
+        ).stdout.strip()
+        if reported == version:
+            return candidate
+    return None
+
+
+def inputs_hash(parts, files):
+    """
+    Hash everything that determines an artifact: settings (parts) and (name, file) pairs.
+    """
+    digest = hashlib.sha256(BUILDER_VERSION.encode('utf-8'))
+    digest.update(json.dumps(parts, sort_keys=True).encode('utf-8'))
+    for name, path in sorted(files):
+        digest.update(name.encode('utf-8') + b'\0')
+        with open(path, 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def stored_hash(zip_path):
+    """
+    Return the input hash recorded in an existing artifact, or None.
+    """
+    try:
+        with zipfile.ZipFile(zip_path) as z:
+            comment = z.comment
+    except (OSError, zipfile.BadZipFile):
+        return None
+    return comment[len(HASH_PREFIX):].decode('ascii') if comment.startswith(HASH_PREFIX) else None
+
+
+# ---------------------------------------------------------------------------------------------------------------
+# Staging
+# ---------------------------------------------------------------------------------------------------------------
+
+def strip(root, patterns):
+    """
+    Delete files under root whose path (relative, with forward slashes) matches one of the patterns.
+    Returns the number of bytes removed.
+    """
+    removed = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(directory, name)
+            relative = os.path.relpath(path, root).replace(os.sep, '/')
+            if any(fnmatch.fnmatch(relative, pattern) or fnmatch.fnmatch('/' + relative, pattern) for pattern in patterns):
+                removed += os.path.getsize(path)
+                os.remove(path)
+    return removed
+
+
+def precompile(root, interpreter):
+    """
+    Write unchecked-hash .pyc files for every module under root with the target interpreter.
+    """
+    script = (
+        "import compileall, py_compile, sys; "
+        "ok = compileall.compile_dir(sys.argv[1], quiet=1, ddir='', "
+        "invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH); sys.exit(0 if ok else 1)"
+    )
+    # A fixed hash seed keeps set / frozenset constants in the same order, so the .pyc bytes are reproducible.
+    subprocess.run([interpreter, '-c', script, root], check=True, env=dict(os.environ, PYTHONHASHSEED='0'))
+
+
+def stage_layer(spec, runtime, staging):
+    """
+    Install (or unpack) a layer's packages into staging/python. Returns how they were obtained.
+    """
+    target = os.path.join(staging, 'python')
+    command = [
+        sys.executable, '-m', 'pip', 'install', '--quiet', '--disable-pip-version-check', '--no-compile', '--no-deps',
+        '--target', target, '--platform', PLATFORM, '--implementation', 'cp',
+        '--python-version', runtime.replace('python', ''), '--only-binary=:all:'
+    ] + spec['requirements']
+    if subprocess.run(command, capture_output=True, text=True).returncode == 0:
+        return 'pip'
+
+    fallback = spec.get('fallback_zip')
+    if not fallback:
+        raise RuntimeError("pip install failed and the layer has no fallback_zip")
+    shutil.rmtree(target, ignore_errors=True)
+    with zipfile.ZipFile(os.path.join(HERE, fallback)) as z:
+        z.extractall(staging) # The committed layer zips already hold python/...
+    return f"repacked {os.path.basename(fallback)} (pip unavailable)"
+
+
+def check_imports(root, modules, interpreter, no_site=False):
+    """
+    Import modules with only root on the path. Raises RuntimeError with the import error if that fails.
+    """
+    env = dict(os.environ, PYTHONPATH=root, **IMPORT_CHECK_ENV)
+    command = [interpreter] + (['-S'] if no_site else []) + ['-c', '; '.join(f"import {module}" for module in modules)]
+    result = subprocess.run(command, cwd=tempfile.gettempdir(), env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Import check failed for {', '.join(modules)}:\n{result.stderr.strip().splitlines()[-1]}")
+
+
+def has_extensions(root):
+    return any(name.endswith(('.so', '.pyd')) for _, _, files in os.walk(root) for name in files)
+
+
+# ---------------------------------------------------------------------------------------------------------------
+# Output
+# ---------------------------------------------------------------------------------------------------------------
+
+def write_zip(root, zip_path, build_hash):
+    """
+    Zip everything under root reproducibly: sorted entries, fixed timestamps and permissions, no directory entries.
+    """
+    entries = []
+    for directory, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(directory, name)
+            entries.append((os.path.relpath(path, root).replace(os.sep, '/'), path))
+
+    tmp = zip_path + '.tmp'
+    with zipfile.ZipFile(tmp, 'w', zipfile.ZIP_DEFLATED, compresslevel=9) as z:
+        for name, path in sorted(entries):
+            info = zipfile.ZipInfo(name, FIXED_DATE)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = (0o755 if os.access(path, os.X_OK) else 0o644) << 16 # Lambda needs world-readable files.
+            info.create_system = 3 # Unix, so the permissions above are honoured.
+            with open(path, 'rb') as f:
+                z.writestr(info, f.read(), compresslevel=9)
+        z.comment = HASH_PREFIX + build_hash.encode('ascii')
+    os.replace(tmp, zip_path)
+    return len(entries)
+
+
+def build_artifact(name, kind, spec, manifest, interpreter, output_dir, force=False):
+    """
+    Build one function or layer zip. Returns a one-line report.
+    """
+    runtime = manifest['runtime']
+    patterns = manifest['strip'] + spec.get('strip', [])
+    zip_path = os.path.join(output_dir, name + '.zip')
+    pyc = runtime if interpreter else 'sources only'
+
+    if kind == 'function':
+        files = [(file_name, os.path.join(HERE, file_name)) for file_name in module_closure(spec['handler'])]
+    else:
+        fallback = spec.get('fallback_zip')
+        files = [('fallback', os.path.join(HERE, fallback))] if fallback else []
+    build_hash = inputs_hash({'kind': kind, 'spec': spec, 'strip': patterns, 'runtime': runtime, 'pyc': bool(interpreter)}, files)
+
+    if not force and stored_hash(zip_path) == build_hash:
+        return f"{name:<16} unchanged, skipped"
+
+    with tempfile.TemporaryDirectory() as staging:
+        if kind == 'function':
+            for file_name, path in files:
+                shutil.copy2(path, os.path.join(staging, file_name))
+            check_imports(staging, [spec['handler']], interpreter or sys.executable, no_site=True)
+            source = f"{len(files)} modules"
+        else:
+            source = stage_layer(spec, runtime, staging)
+        removed = strip(staging, patterns)
+        if kind == 'layer' and spec.get('verify'):
+            layer_root = os.path.join(staging, 'python')
+            if interpreter or not has_extensions(layer_root):
+                check_imports(layer_root, spec['verify'], interpreter or sys.executable)
+        if interpreter:
+            precompile(staging, interpreter)
+        count = write_zip(staging, zip_path, build_hash)
+
+    size = os.path.getsize(zip_path)
+    return (f"{name:<16} {count:>5} files {size / 1024:>9,.1f} KB  {source}; stripped {removed / 1024:,.0f} KB; "
+            f"pyc: {pyc}")
+
+
+def build(names=None, force=False, python=None, manifest_path=MANIFEST):
+    """
+    Build the named artifacts (default: all). Returns the report lines.
+    """
+    manifest = load_manifest(manifest_path)
+    output_dir = os.path.normpath(os.path.join(HERE, manifest['output_dir']))
+    os.makedirs(output_dir, exist_ok=True)
+    interpreter = find_interpreter(manifest['runtime'], python)
+
+    artifacts = [(name, 'layer', spec) for name, spec in manifest['layers'].items()]
+    artifacts += [(name, 'function', spec) for name, spec in manifest['functions'].items()]
+    unknown = set(names or []) - {name for name, _, _ in artifacts}
+    if unknown:
+        raise KeyError(f"Not in the manifest: {', '.join(sorted(unknown))}")
+
+    report = []
+    if interpreter is None:
+        report.append(f"warning: no {manifest['runtime']} interpreter found, building without .pyc files (use --python)")
+    for name, kind, spec in artifacts:
+        if not names or name in names:
+            report.append(build_artifact(name, kind, spec, manifest, interpreter, output_dir, force))
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the Lambda function and layer zips from build_manifest.json")
+    parser.add_argument('names', nargs='*', help="Artifacts to build (default: all)")
+    parser.add_argument('--force', action='store_true', help="Rebuild even if the inputs haven't changed")
+    parser.add_argument('--python', help="Interpreter of the target runtime, used to precompile .pyc files")
+    parser.add_argument('--manifest', default=MANIFEST)
+    args = parser.parse_args()
+
+    for line in build(args.names, args.force, args.python, args.manifest):
+        print(line)
@@ -0,0 +1,191 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import tracing # Remaining time of the invocation, see tracing.remaining()
+
+'''
+CoinMarketCap HTTP client.
+
+A bare requests.get() opens a new connection (and does a new TLS handshake) on every call and waits forever
+if the upstream hangs. This module keeps one pooled, keep-alive Session at module level, so warm invocations
+reuse the open connection, and adds the usual protections for a paid, occasionally flaky upstream:
+
+- Timeouts: (connect, read) seconds, cut down to what is left of the invocation (tracing.remaining(), minus
+  DEADLINE_MARGIN to answer from the cache). When too little is left for another attempt we give up with a
+  Timeout ourselves instead of letting Lambda kill the function mid-call: a killed invocation never records its
+  failure, so the breaker below would never open however slow the upstream gets.
+- Retries with full jitter: sleep a random time between 0 and base * 2**attempt before trying again.
+- Retry budget: every request earns a fraction of a retry token and every retry spends a whole one.
+  When the upstream is struggling we stop multiplying the load on it with retries.
+- Circuit breaker: after FAILURE_THRESHOLD consecutive failures the circuit opens and calls fail
+  immediately for RESET_TIMEOUT seconds (the caller serves cached prices instead). After that one trial
+  call is let through; success closes the circuit, failure opens it again.
+'''
+
+CMC_URL = os.environ.get('CMC_URL', "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest") # Overridden by local_api.py to point at a stub.
+CMC_MAP_URL = os.environ.get('CMC_MAP_URL', CMC_URL.rsplit('/quotes/', 1)[0] + '/map') # Symbol listing, same host.
+
+CONNECT_TIMEOUT = float(os.environ.get('CMC_CONNECT_TIMEOUT', '2'))
+READ_TIMEOUT = float(os.environ.get('CMC_READ_TIMEOUT', '5'))
+MAX_ATTEMPTS = int(os.environ.get('CMC_MAX_ATTEMPTS', '3'))
+DEADLINE_MARGIN = float(os.environ.get('CMC_DEADLINE_MARGIN', '1')) # Seconds of the invocation kept back for answering without upstream.
+MIN_ATTEMPT_TIME = 0.2 # Seconds; with less than this left, another attempt isn't worth starting.
+BACKOFF_BASE = 0.1 # Seconds
+BACKOFF_CAP = 2.0
+RETRY_RATIO = 0.2 # Each request earns 0.2 retry tokens, i.e. retries add at most ~20% extra load.
+RETRY_BUDGET_MAX = 10.0
+FAILURE_THRESHOLD = int(os.environ.get('CMC_BREAKER_THRESHOLD', '5'))
+RESET_TIMEOUT = float(os.environ.get('CMC_BREAKER_RESET', '30'))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.RequestException):
+    """
+    Raised without calling the upstream while the circuit breaker is open.
+    """
+
+
+def _new_session():
+    """
+    Build a Session with a small keep-alive connection pool.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=10) # One host, a few threads at most.
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+session = _new_session() # Module level so the open connection survives across warm invocations.
+
+_lock = threading.Lock()
+_retry_tokens = RETRY_BUDGET_MAX
+_breaker = {'failures': 0, 'opened_at': None, 'trial_in_flight': False}
+
+
+def _allow_request():
+    """
+    Ask the circuit breaker whether we may call the upstream right now.
+    """
+    with _lock:
+        if _breaker['opened_at'] is None:
+            return True
+        if time.monotonic() - _breaker['opened_at'] < RESET_TIMEOUT or _breaker['trial_in_flight']:
+            return False
+        _breaker['trial_in_flight'] = True # Half-open: let exactly one trial call through.
+        return True
+
+
+def _record(success):
+    """
+    Feed the result of a call into the circuit breaker.
+    """
+    with _lock:
+        _breaker['trial_in_flight'] = False
+        if success:
+            _breaker.update(failures=0, opened_at=None)
+            return
+        _breaker['failures'] += 1
+        if _breaker['failures'] >= FAILURE_THRESHOLD or _breaker['opened_at'] is not None:
+            _breaker['opened_at'] = time.monotonic()
+
+
+def _earn_retry_token():
+    """
+    Add this request's share of a retry token to the budget.
+    """
+    global _retry_tokens
+    with _lock:
+        _retry_tokens = min(RETRY_BUDGET_MAX, _retry_tokens + RETRY_RATIO)
+
+
+def _spend_retry_token():
+    """
+    Take one retry token from the budget. Returns False when the budget is empty.
+    """
+    global _retry_tokens
+    with _lock:
+        if _retry_tokens < 1:
+            return False
+        _retry_tokens -= 1
+        return True
+
+
+def _budget():
+    """
+    Seconds left for upstream calls in this invocation, or None when there is no deadline (background refresh, local run).
+    """
+    remaining = tracing.remaining()
+    return None if remaining is None else remaining - DEADLINE_MARGIN
+
+
+def get_quotes(symbols, api_key, url=CMC_URL):
+    """
+    Fetch the latest USD quotes for a comma separated symbols string and return the decoded JSON.
+    """
+    return _call(url, {'symbol': symbols, 'convert': 'USD'}, api_key)
+
+
+def get_listing(api_key, limit=5000, url=CMC_MAP_URL):
+    """
+    Fetch the active cryptocurrencies, best ranked first, and return the decoded JSON
+    ({"data": [{"id": 1, "rank": 1, "symbol": "BTC", ...}, ...]}).
+    """
+    params = {'listing_status': 'active', 'sort': 'cmc_rank', 'limit': limit, 'aux': 'is_active'} # aux: leave out platform and history fields.
+    return _call(url, params, api_key)
+
+
+def _call(url, params, api_key):
+    """
+    GET an endpoint through the breaker, the retry budget and the pooled session. Returns the decoded JSON.
+    """
+    if not _allow_request():
+        raise CircuitOpenError("CoinMarketCap circuit breaker is open, skipping upstream call")
+
+    _earn_retry_token()
+    headers = {'X-CMC_PRO_API_KEY': api_key, 'Accept': 'application/json'}
+
+    attempt = 0
+    while True:
+        attempt += 1
+        budget = _budget()
+        if budget is not None and budget < MIN_ATTEMPT_TIME:
+            _record(False) # Counts like any other timeout, so a hanging upstream still opens the breaker.
+            raise requests.Timeout(f"No time left in the invocation for CoinMarketCap attempt {attempt}")
+        timeout = (CONNECT_TIMEOUT, READ_TIMEOUT) if budget is None else (min(CONNECT_TIMEOUT, budget), min(READ_TIMEOUT, budget))
+        try:
+            response = session.get(url, headers=headers, params=params, timeout=timeout)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+            status = e.response.status_code if getattr(e, 'response', None) is not None else None
+            retryable = status is None or status in RETRYABLE_STATUS # A 401 or 400 won't get better by retrying.
+            if retryable and attempt < MAX_ATTEMPTS and _spend_retry_token():
+                pause = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)) # Full jitter
+                budget = _budget()
+                time.sleep(pause if budget is None else max(0, min(pause, budget - MIN_ATTEMPT_TIME)))
+                continue
+            _record(not retryable) # Only upstream trouble trips the breaker, not our own bad requests.
+            raise
+        except Exception:
+            _record(False) # E.g. a body that isn't JSON.
+            raise
+        _record(True)
+        return data
+
+
+def reset():
+    """
+    Reset the breaker, retry budget and connection pool (used by local runners between scenarios).
+    """
+    global session, _retry_tokens
+    with _lock:
+        _retry_tokens = RETRY_BUDGET_MAX
+        _breaker.update(failures=0, opened_at=None, trial_in_flight=False)
+    session = _new_session()
@@ -1,17 +1,45 @@
 import json
-import requests
-import boto3
-
-
-ssm = boto3.client('ssm') # Initializing the ssm client with boto3
+import os
+import sys
+
+import aws_clients # Lazy, shared boto3 clients, see aws_clients.py
+import tracing # Per-invocation stage timings and one EMF metrics line, see tracing.py
+import price_cache # In-memory + optional DynamoDB TTL cache for prices, see price_cache.py
+import price_history # Hour-bucketed price time series and OHLC range queries, see price_history.py
+import symbol_registry # Canonical, capped, allow-listed symbols, see symbol_registry.py
+import price_stream # Server-Sent Events: a snapshot, then only the changed prices, see price_stream.py
+import param_cache # Shared, TTL-cached SSM parameters, see param_cache.py
+import api_response # Shared CORS headers, JSON encoding and error responses, see api_response.py
+
+
+# Cache settings, all in seconds. See price_cache.py for how fresh / stale / stale-if-error entries are served.
+cache_ttl = float(os.environ.get('PRICE_CACHE_TTL', '60'))
+cache_stale_ttl = float(os.environ.get('PRICE_CACHE_STALE_TTL', '300'))
+cache_stale_if_error = float(os.environ.get('PRICE_CACHE_STALE_IF_ERROR', '3600'))
+cache_table_name = os.environ.get('PRICE_CACHE_TABLE') # Optional shared cache table (partition key "cache_key"), shared by all containers.
+cache_table = aws_clients.lazy_table(cache_table_name) # Only built when the in-memory cache misses.
+history_table_name = os.environ.get('PRICE_HISTORY_TABLE') # Optional time-series table (partition key "series_id"). Unset disables history.
+history_table = aws_clients.lazy_table(history_table_name)
+
+# Scheduled pre-warming (see prewarm_handler). With PRICE_CACHE_ONLY=true the request path never calls CoinMarketCap.
+prewarm_symbols = os.environ.get('PRICE_PREWARM_SYMBOLS', 'BTC,ETH,BNB,LTC,DOGE,NEO,ADA,SOL,XRP,TRX') # Same list as frontend/index.js
+cache_only = os.environ.get('PRICE_CACHE_ONLY', 'false').lower() == 'true'
+
+# Symbol allow-list. SYMBOL_ALLOW_LIST (e.g. "BTC,ETH") replaces the upstream listing with a fixed list.
+allow_list = os.environ.get('SYMBOL_ALLOW_LIST')
+registry_ttl = float(os.environ.get('SYMBOL_REGISTRY_TTL', '21600')) # Seconds between refreshes of the upstream listing.
+registry_size = int(os.environ.get('SYMBOL_REGISTRY_SIZE', '5000')) # Best ranked coins taken from the listing.
+max_symbols = int(os.environ.get('MAX_SYMBOLS_PER_REQUEST', '50'))
+
+# Stream mode (?stream=1): how long EventSource waits before reconnecting for the next update, in milliseconds.
+stream_retry_ms = int(os.environ.get('PRICE_STREAM_RETRY_MS', str(int(cache_ttl * 1000))))
 
 def get_parameter(param_name):
     """
     Retrieve parameter from AWS Systems Manager Parameter Store.
     """
     try:
-        response = ssm.get_parameter(Name=param_name, WithDecryption=True) # WithDecryption=True: If the parameter is encrypted (e.g., stored as a "SecureString"), this flag ensures the value is decrypted before returning it. 
-        return response['Parameter']['Value'] # Extracts and returns the actual value of the parameter (e.g., "my-secret-value").
+        return param_cache.get_parameter(param_name) # Cached across warm invocations. param_cache calls SSM with WithDecryption=True, so "SecureString" parameters come back decrypted.
     except Exception as e:
         print(f"Error retrieving parameter {param_name}: {str(e)}")
         raise e # raise e re-raises the exception e that was caught in the except block. It propagates the exception to higher-level code, so it can handle it or terminate the program. 
@@ -70,13 +98,202 @@ def get_parameter(param_name):
         Alert: Database is currently unavailable.
 '''
 
+def fetch_prices(symbols):
+    """
+    Fetch the latest USD prices for a comma separated symbols string from CoinMarketCap.
+    """
+    import cmc_client # Pooled keep-alive session, timeouts, retries and circuit breaker for CoinMarketCap. Imported on the first cache miss: it loads `requests`, which cache hits never need.
+
+    try:
+        api_key = get_parameter('/lambda/market_cap_api_token')
+    except Exception as e:
+        raise RuntimeError(f"Failed to retrieve API key: {str(e)}") from e
+
+    with tracing.stage('upstream_http'):
+        data = cmc_client.get_quotes(symbols, api_key)
+
+    '''
+    cmc_client.get_quotes sends the GET request through a module-level requests.Session, so warm invocations reuse
+    the open keep-alive connection instead of paying a new TLS handshake every time.
+
+    params: {'symbol': symbols, 'convert': 'USD'} filters the response to the requested cryptocurrencies.
+    headers: the 'X-CMC_PRO_API_KEY' header is specific to the CoinMarketCap API and carries our API key.
+
+    Every call has a connect and read timeout, retries transient failures (timeouts, 429, 5xx) with jittered backoff,
+    and stops calling the upstream for a while once it keeps failing (circuit breaker).
+    Any failure is raised as a requests.RequestException, which lets price_cache serve stale prices instead.
+
+    response.json(): Converts the JSON response from the API into a Python dictionary for easier processing.
+    '''
+
+    # Parse the required information
+    return {
+        symbol: data['data'][symbol]['quote']['USD']['price']
+        for symbol in symbols.split(',') if symbol in data['data'] # Example: "BTC,ETH" -> ["BTC", "ETH"], Splits the symbols string (e.g., "BTC,ETH") into a list of individual symbols
+    }
+
+    '''
+    data['data']: Access the main data object in the response.
+
+    [symbol]: Fetch details for the specific cryptocurrency (e.g., "BTC" or "ETH").
+
+    ['quote']['USD']['price']: Access the price in USD.
+
+    Example:
+
+    data = {
+        "data": {
+            "BTC": {
+                "quote": {
+                    "USD": {
+                        "price": 30000.45
+                    }
+                }
+            },
+            "ETH": {
+                "quote": {
+                    "USD": {
+                        "price": 2000.15
+                    }
+                }
+            }
+        }
+    }
+    symbols = "BTC,ETH,LTC"
+
+    Iterates over each symbol in the list generated by symbols.split(',').
+    For each symbol:
+    Checks if the symbol exists in data['data'].
+    If it does:
+    Uses symbol as the key.
+    Retrieves the price for that symbol (data['data'][symbol]['quote']['USD']['price']) as the value.
+
+    if symbol in data['data']
+
+    This ensures the code only tries to access prices for symbols that actually exist in data['data'].
+    Without this check, trying to access a nonexistent key (e.g., data['data']['LTC']) would raise a KeyError.
+
+    Splits the symbols string into individual cryptocurrency symbols.
+    Iterates over the list of symbols.
+    Checks if each symbol exists in data['data'].
+    If the symbol exists:
+    Adds it to the prices dictionary with its price in USD.
+    If any unexpected error occurs, the try block ensures the program doesn’t crash and allows for graceful handling.
+
+    The symbol: part specifies what will be the key in the dictionary being created. Without it, Python would not know how to structure the key-value pairs.
+
+    '''
+
+def fetch_listing():
+    """
+    Fetch the symbols of the best ranked active cryptocurrencies from CoinMarketCap (for the symbol registry).
+    """
+    import cmc_client
+
+    api_key = get_parameter('/lambda/market_cap_api_token')
+    with tracing.stage('upstream_http'):
+        data = cmc_client.get_listing(api_key, registry_size)
+    return [entry['symbol'] for entry in data['data'] if entry.get('symbol')]
+
+registry = symbol_registry.SymbolRegistry(
+    None if allow_list else fetch_listing, ttl=registry_ttl, seed=allow_list or prewarm_symbols,
+    table=cache_table, max_symbols=max_symbols
+)
+
+def resolve_symbols(symbols):
+    """
+    Split a requested symbols string into (known, unknown) canonical lists. Raises symbol_registry.TooManySymbols.
+    """
+    return registry.resolve(symbols, allow_upstream=not cache_only) # Cache-only mode never calls upstream on the request path.
+
+def fetch_and_record(symbols, wait=False):
+    """
+    Fetch prices upstream and append them to the price history, so every paid quote is kept.
+    The history writes only wait for DynamoDB with wait=True (the pre-warmer); requests don't wait for them.
+    """
+    prices = fetch_prices(symbols)
+    if history_table is not None:
+        try:
+            with tracing.stage('history_write'):
+                price_history.append(history_table, prices, wait=wait)
+        except Exception as e:
+            print(f"Failed to record price history: {str(e)}") # Never fail a price request because of the history store.
+    return prices
+
+def is_http_error(error):
+    """
+    True if error is a requests.RequestException, without importing requests just to check.
+    """
+    requests = sys.modules.get('requests') # Not loaded means no upstream call was made, so it can't be one of its errors.
+    return requests is not None and isinstance(error, requests.RequestException)
+
+def lookup_prices(symbols):
+    """
+    Return (prices, cache outcome) for a canonical symbols string ("BTC,ETH", see resolve_symbols) through the shared
+    price cache.
+    """
+    return price_cache.get_prices(
+        symbols, fetch_and_record,
+        ttl=cache_ttl, stale_ttl=cache_stale_ttl, stale_if_error=cache_stale_if_error, table=cache_table,
+        cache_only=cache_only
+    )
+
+def history_response(query_params, event):
+    """
+    Answer ?history=BTC&range=24h&resolution=5m with OHLC candles from the price history.
+    """
+    if history_table is None:
+        return api_response.error(404, "Price history is not enabled")
+
+    symbol = query_params['history'].strip().upper()
+    range_text = query_params.get('range', '24h')
+    resolution_text = query_params.get('resolution', '5m')
+    try:
+        with tracing.stage('history_query'):
+            candles = price_history.query(aws_clients.resource('dynamodb'), history_table_name, symbol, range_text, resolution_text)
+    except ValueError as e:
+        return api_response.error(400, str(e))
+    except Exception as e:
+        return api_response.error(500, f"History query failed: {str(e)}")
+
+    return api_response.respond(
+        200, {'symbol': symbol, 'range': range_text, 'resolution': resolution_text, 'candles': candles},
+        cache_control='public, max-age=60', event=event # Candles only change once a minute or so.
+    )
+
+def stream_response(prices, event):
+    """
+    Answer an EventSource (re)connect: the prices as a snapshot, or as a diff against the client's Last-Event-ID.
+    """
+    kind, text = price_stream.update(price_stream.last_event_id(event), prices)
+    tracing.outcome('stream', kind or 'unchanged')
+    body = f"retry: {stream_retry_ms}\n\n" + (text or ": no change\n\n") # A comment line keeps the body a valid event stream.
+    return api_response.respond(
+        200, body, headers={'Content-Type': 'text/event-stream'}, cache_control=api_response.NO_STORE # Depends on Last-Event-ID.
+    )
+
+def failure(status_code, message, streaming, headers=None):
+    """
+    Error response for either mode. EventSource gives up for good on a non-200 answer, so streams get an
+    "unavailable" event with a 200 instead and keep reconnecting.
+    """
+    if not streaming:
+        return api_response.error(status_code, message, headers=headers)
+    body = price_stream.format_event({'error': message, 'status': status_code}, 'unavailable', retry_ms=stream_retry_ms)
+    return api_response.respond(200, body, headers={'Content-Type': 'text/event-stream'}, cache_control=api_response.NO_STORE)
+
+@tracing.traced # Timings, cache outcome and cold start go out as one metrics line; the raw event is only logged for a sample.
 def lambda_handler(event, context):
-    print("Event object:", json.dumps(event))  # Debug log
+    if event.get('httpMethod') == 'OPTIONS':
+        return api_response.preflight()
 
     # Extract query parameters     
     # # Extract the symbols to fetch (BTC, ETH, etc.)
     query_params = event.get('queryStringParameters') or {}
+    if query_params.get('history'):
+        return history_response(query_params, event) # Range query mode: OHLC candles instead of the latest prices.
     symbols = query_params.get('symbols', None)
+    streaming = price_stream.wants_stream(event) # Live ticker mode, see stream_response()
 
     # Fallback to parsing JSON body if no query parameters
     if not symbols:
@@ -132,128 +349,90 @@ def lambda_handler(event, context):
 
     '''
 
-    # Proceed with the rest of the code
-    url = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
+    # Canonicalize, cap and allow-list the symbols before any cache or network I/O.
+    if not isinstance(symbols, str):
+        return failure(400, "symbols must be a comma separated string", streaming)
     try:
-        api_key = get_parameter('/lambda/market_cap_api_token')
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type,Authorization'
-            },
-            'body': json.dumps({'error': f"Failed to retrieve API key: {str(e)}"})
-        }
-
-    # Request parameters
-    params = {'symbol': symbols, 'convert': 'USD'}
-    headers = {'X-CMC_PRO_API_KEY': api_key} 
-    # a dictionary that stores HTTP headers, which are metadata sent along with an HTTP request. 
-    # Headers typically include details such as the type of content, authorization credentials, and other information required by the server.
-    # 'X-CMC_PRO_API_KEY' - A custom HTTP header. In this case, is specific to the CoinMarketCap API, and the X-CMC_PRO_API_KEY header is used to pass an API key for authentication.
+        wanted, unknown = resolve_symbols(symbols)
+    except symbol_registry.TooManySymbols as e:
+        return failure(400, str(e), streaming)
+    if not wanted:
+        return failure(400, f"Unknown symbols: {','.join(unknown) or symbols}", streaming)
+    if unknown:
+        tracing.count('unknown_symbols', len(unknown))
+
+    # Serve from the cache when we can, otherwise fetch_and_record() calls CoinMarketCap.
     try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status() # Raise an error for HTTP issues 
-        data = response.json()
-    except requests.RequestException as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type,Authorization'
-            },
-            'body': json.dumps({'error': f"HTTP request failed: {str(e)}"})
-        }
-    
-        '''
-        requests.get: Sends an HTTP GET request to the specified API endpoint (url).
-
-        headers=headers: Includes authentication and metadata required by the API (e.g., the X-CMC_PRO_API_KEY header).
-
-        params=params: Contains additional parameters to pass with the API request, such as filtering data (e.g., specific cryptocurrencies, price data).
-
-        response.json(): Converts the JSON response from the API into a Python dictionary for easier processing.
-        '''
-
-    # Parse the required information
-    try:
-        prices = {
-            symbol: data['data'][symbol]['quote']['USD']['price']
-            for symbol in symbols.split(',') if symbol in data['data'] # Example: "BTC,ETH" -> ["BTC", "ETH"], Splits the symbols string (e.g., "BTC,ETH") into a list of individual symbols
-        }
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type,Authorization'
-            },
-            'body': json.dumps({'prices': prices}) # Uses json.dumps to convert the prices dictionary into a JSON string for returning.  
-        }
+        prices, outcome = lookup_prices(','.join(wanted))
     except KeyError as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type,Authorization'
-            },
-            'body': json.dumps({'error': f"Data parsing failed: {str(e)}"})
-        }
-    
-            
-        '''
-        data['data']: Access the main data object in the response.
-
-        [symbol]: Fetch details for the specific cryptocurrency (e.g., "BTC" or "ETH").
-
-        ['quote']['USD']['price']: Access the price in USD.
-
-        Example:
-
-        data = {
-            "data": {
-                "BTC": {
-                    "quote": {
-                        "USD": {
-                            "price": 30000.45
-                        }
-                    }
-                },
-                "ETH": {
-                    "quote": {
-                        "USD": {
-                            "price": 2000.15
-                        }
-                    }
-                }
-            }
-        }
-        symbols = "BTC,ETH,LTC"
-
-        Iterates over each symbol in the list generated by symbols.split(',').
-        For each symbol:
-        Checks if the symbol exists in data['data'].
-        If it does:
-        Uses symbol as the key.
-        Retrieves the price for that symbol (data['data'][symbol]['quote']['USD']['price']) as the value.
-
-        if symbol in data['data']
+        return failure(500, f"Data parsing failed: {str(e)}", streaming)
+    except Exception as e:
+        if is_http_error(e):
+            return failure(500, f"HTTP request failed: {str(e)}", streaming)
+        return failure(500, str(e), streaming)
+
+    tracing.outcome('cache', outcome)
+
+    if cache_only and not prices:
+        # Nothing cached yet (the pre-warmer hasn't run) or none of the symbols are in the pre-warmed set.
+        return failure(503, "Prices are not available yet", streaming, headers={'Retry-After': '60'})
+
+    if streaming:
+        return stream_response(prices, event)
+
+    # CloudFront and browsers may reuse the answer for the cache TTL, and show it a little longer while they revalidate.
+    # An unchanged body (same prices) comes back as an empty 304 thanks to the ETag.
+    cache_control = f"public, max-age={int(cache_ttl)}, stale-while-revalidate={int(cache_stale_ttl)}"
+    body = {'prices': prices}
+    if unknown:
+        body['unknown'] = unknown # Not looked up: not in the symbol registry.
+    return api_response.respond(
+        200, body, # api_response.encode converts the prices dictionary into a JSON string for returning.
+        headers=price_cache.stats_headers(outcome), # X-Cache plus the container's hit / miss / stale ratios.
+        cache_control=cache_control, event=event
+    )
+
+@tracing.traced
+def prewarm_handler(event, context):
+    """
+    Scheduled entry point (EventBridge rule, e.g. rate(1 minute)): fetch the whole symbol universe in one
+    upstream call and publish it to the price cache and the price history.
+    """
+    registry.index(wait=True) # Keeps the shared listing fresh, so cache-only containers never need the upstream for it.
+    prices = price_cache.publish(
+        prewarm_symbols, lambda symbols: fetch_and_record(symbols, wait=True),
+        ttl=cache_ttl, stale_ttl=cache_stale_ttl, stale_if_error=cache_stale_if_error, table=cache_table
+    )
+    print(json.dumps({'prewarmed': sorted(prices), 'missing': sorted(set(price_cache.normalize_symbols(prewarm_symbols)) - set(prices))}))
+    return {'prewarmed': len(prices)}
 
-        This ensures the code only tries to access prices for symbols that actually exist in data['data'].
-        Without this check, trying to access a nonexistent key (e.g., data['data']['LTC']) would raise a KeyError.
+'''
+Why a pre-warmer?
 
-        Splits the symbols string into individual cryptocurrency symbols.
-        Iterates over the list of symbols.
-        Checks if each symbol exists in data['data'].
-        If the symbol exists:
-        Adds it to the prices dictionary with its price in USD.
-        If any unexpected error occurs, the try block ensures the program doesn’t crash and allows for graceful handling.
+Even with the cache, the first visitor after the TTL runs out waits for the full CoinMarketCap round trip.
+If a schedule refreshes the cache a little more often than the TTL (e.g. every minute with PRICE_CACHE_TTL=90),
+the entries never expire on the request path. Set PRICE_CACHE_ONLY=true and lambda_handler becomes a pure
+cache read that never touches the upstream; upstream spend is then one call per schedule tick, no matter the traffic.
 
-        The symbol: part specifies what will be the key in the dictionary being created. Without it, Python would not know how to structure the key-value pairs.
+The handler name for the schedule is crypto_api.prewarm_handler.
+'''
 
-        '''
-        
+if __name__ == '__main__':
+    # Local runner for the pre-warmer, no EventBridge needed:
+    #   python crypto_api.py --interval 60 --iterations 3
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Run crypto_api.prewarm_handler on a fixed interval")
+    parser.add_argument('--interval', type=float, default=60, help="Seconds between runs")
+    parser.add_argument('--iterations', type=int, default=1, help="Number of runs (0 = forever)")
+    args = parser.parse_args()
+
+    run = 0
+    while args.iterations == 0 or run < args.iterations:
+        started = time.perf_counter()
+        result = prewarm_handler({'source': 'local.scheduler'}, None)
+        print(f"Run {run + 1}: {result} in {(time.perf_counter() - started) * 1000:.1f} ms")
+        run += 1
+        if args.iterations == 0 or run < args.iterations:
+            time.sleep(args.interval)
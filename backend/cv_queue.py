@@ -0,0 +1,284 @@
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+
+import aws_clients # Lazy, shared boto3 clients, see aws_clients.py
+
+'''
+Queue for CV-email requests, so the HTTP handler can answer 202 right away and a worker sends the emails.
+
+Three interchangeable queues, all with the same small interface:
+
+    send(message, dedupe_id)          -> enqueue a dict
+    receive(max_messages)             -> [(handle, message), ...]
+    ack(handle)                       -> the message was handled, remove it
+    retry(handle, message, delay)     -> put it back (with its updated attempt count), visible again after the delay
+
+SQSQueue    - production. The worker is normally an SQS event source mapping (see SES_lambda.worker_handler),
+              but the queue can also be drained by polling.
+MemoryQueue - in-process, for local runs and tests.
+FileQueue   - one JSON file per message in a directory, survives restarts of a local worker.
+
+drain() pulls batches from any of them and paces the sends to a fixed rate, so a burst of requests turns into
+a steady trickle SES accepts instead of a burst of throttling errors.
+'''
+
+
+class MemoryQueue:
+    """
+    In-process queue. Messages live only as long as the Python process.
+    """
+
+    def __init__(self):
+        self._ready = deque()
+        self._delayed = [] # (visible_at, message)
+        self._inflight = {} # handle -> message
+        self._seen = set() # dedupe IDs already accepted
+        self._lock = threading.Lock()
+
+    def send(self, message, dedupe_id=None):
+        with self._lock:
+            if dedupe_id is not None:
+                if dedupe_id in self._seen:
+                    return False
+                self._seen.add(dedupe_id)
+            self._ready.append(message)
+            return True
+
+    def receive(self, max_messages=10):
+        now = time.monotonic()
+        with self._lock:
+            due = [entry for entry in self._delayed if entry[0] <= now]
+            self._delayed = [entry for entry in self._delayed if entry[0] > now]
+            self._ready.extend(message for _, message in due)
+            batch = []
+            while self._ready and len(batch) < max_messages:
+                batch.append((uuid.uuid4().hex, self._ready.popleft()))
+            self._inflight.update(batch)
+            return batch
+
+    def ack(self, handle):
+        with self._lock:
+            self._inflight.pop(handle, None)
+
+    def retry(self, handle, message, delay_seconds=0):
+        with self._lock:
+            self._inflight.pop(handle, None)
+            self._delayed.append((time.monotonic() + delay_seconds, message))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._ready) + len(self._delayed)
+
+
+class FileQueue:
+    """
+    Directory-backed queue: <dir>/<visible_at>-<id>.json files, claimed by renaming them to .work.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def send(self, message, dedupe_id=None):
+        name = dedupe_id or uuid.uuid4().hex
+        marker = self._path(f"{name}.seen")
+        if dedupe_id is not None:
+            try:
+                with open(marker, 'x'): # 'x' fails if the file exists, an atomic "seen before?" check.
+                    pass
+            except FileExistsError:
+                return False
+        self._write(message, name, time.time())
+        return True
+
+    def _write(self, message, name, visible_at):
+        tmp = self._path(f"{name}.tmp")
+        with open(tmp, 'w') as f:
+            json.dump(message, f)
+        os.replace(tmp, self._path(f"{visible_at:017.6f}-{name}.json")) # Sorting file names sorts by visibility time.
+
+    def receive(self, max_messages=10):
+        now = time.time()
+        batch = []
+        for name in sorted(os.listdir(self.directory)):
+            if len(batch) >= max_messages or not name.endswith('.json'):
+                continue
+            if float(name.split('-', 1)[0]) > now:
+                break
+            work = self._path(name[:-len('.json')] + '.work')
+            try:
+                os.rename(self._path(name), work) # Only one worker wins the rename.
+            except FileNotFoundError:
+                continue
+            with open(work) as f:
+                batch.append((work, json.load(f)))
+        return batch
+
+    def ack(self, handle):
+        os.remove(handle)
+
+    def retry(self, handle, message, delay_seconds=0):
+        name = os.path.basename(handle)[:-len('.work')].split('-', 1)[1]
+        self._write(message, name, time.time() + delay_seconds)
+        os.remove(handle)
+
+    def __len__(self):
+        return sum(1 for name in os.listdir(self.directory) if name.endswith('.json'))
+
+
+class SQSQueue:
+    """
+    Amazon SQS queue. A FIFO queue (URL ending in .fifo) also dedupes on the SQS side for 5 minutes.
+    """
+
+    def __init__(self, queue_url, client=None):
+        self.queue_url = queue_url
+        self.fifo = queue_url.endswith('.fifo')
+        self._client = client
+
+    @property
+    def client(self):
+        # Built on first use, so a handler that creates the queue at import time doesn't pay for boto3 until it sends.
+        if self._client is None:
+            self._client = aws_clients.client('sqs')
+        return self._client
+
+    def send(self, message, dedupe_id=None):
+        params = {'QueueUrl': self.queue_url, 'MessageBody': json.dumps(message)}
+        if self.fifo:
+            params['MessageGroupId'] = 'cv-email'
+            params['MessageDeduplicationId'] = dedupe_id or uuid.uuid4().hex
+        self.client.send_message(**params)
+        return True
+
+    def receive(self, max_messages=10):
+        response = self.client.receive_message(
+            QueueUrl=self.queue_url, MaxNumberOfMessages=min(max_messages, 10), WaitTimeSeconds=1,
+            AttributeNames=['ApproximateReceiveCount']
+        )
+        return [(message['ReceiptHandle'], from_sqs_record(message)) for message in response.get('Messages', [])]
+
+    def ack(self, handle):
+        self.client.delete_message(QueueUrl=self.queue_url, ReceiptHandle=handle)
+
+    def retry(self, handle, message, delay_seconds=0):
+        # Making the message visible again after the delay is SQS's way of "retry later".
+        # The body can't be changed in place, the attempt count comes back as ApproximateReceiveCount instead.
+        self.client.change_message_visibility(
+            QueueUrl=self.queue_url, ReceiptHandle=handle, VisibilityTimeout=int(delay_seconds)
+        )
+
+
+def from_sqs_record(record):
+    """
+    Decode an SQS message (from receive_message or a Lambda SQS event record) and set its attempt count.
+    """
+    message = json.loads(record.get('Body', record.get('body', '{}')))
+    attributes = record.get('Attributes') or record.get('attributes') or {}
+    message['attempt'] = int(attributes.get('ApproximateReceiveCount', 1)) - 1 # Earlier deliveries that failed.
+    return message
+
+
+def queue_from_env():
+    """
+    Build the queue configured by CV_QUEUE: an SQS queue URL, "memory", or "file:<directory>".
+
+    There is no default. A Lambda container's memory or /tmp goes away with the container, and the API function
+    that enqueues is never the function that drains, so under Lambda (AWS_LAMBDA_FUNCTION_NAME is set) only an SQS
+    URL is accepted. Anything else raises ValueError when the handler module is imported, i.e. the deployment fails
+    loudly instead of answering 202 for emails nobody will send.
+    """
+    setting = os.environ.get('CV_QUEUE', '').strip()
+    if setting.startswith('https://'):
+        return SQSQueue(setting)
+    if os.environ.get('AWS_LAMBDA_FUNCTION_NAME'):
+        raise ValueError(f"CV_QUEUE must be an SQS queue URL under Lambda, got {setting!r}")
+    if setting.startswith('file:'):
+        return FileQueue(setting[len('file:'):])
+    if setting == 'memory':
+        return MemoryQueue()
+    raise ValueError(f"CV_QUEUE must be an SQS queue URL, \"memory\" or \"file:<directory>\", got {setting!r}")
+
+
+def backoff_delay(attempt, base=2.0, cap=300.0):
+    """
+    Full-jitter exponential backoff in seconds for the given (1-based) attempt.
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class Pacer:
+    """
+    Spaces calls at least 1 / rate seconds apart.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_at = 0.0
+
+    def wait(self):
+        now = time.monotonic()
+        if now < self.next_at:
+            time.sleep(self.next_at - now)
+            now = self.next_at
+        self.next_at = now + self.interval
+
+
+def process(message, send, pacer, max_attempts):
+    """
+    Send one message with pacing. Returns None on success, or the retry delay in seconds.
+    Raises once max_attempts is reached so the caller can drop (or dead-letter) the message.
+    """
+    pacer.wait()
+    try:
+        send(message)
+        return None
+    except Exception:
+        attempt = message.get('attempt', 0) + 1
+        if attempt >= max_attempts:
+            raise
+        message['attempt'] = attempt
+        return backoff_delay(attempt)
+
+
+def drain(queue, send, rate=1.0, batch_size=10, max_attempts=5, max_batches=None, deadline=None):
+    """
+    Pull batches from a queue and call send(message) for each, at most `rate` sends per second.
+
+    Failed sends are put back with exponential backoff; after max_attempts the message is dropped and logged.
+    Stops when the queue is empty, after max_batches, or when time.monotonic() passes `deadline`.
+    Returns {'sent': n, 'retried': n, 'failed': n}.
+    """
+    pacer = Pacer(rate)
+    counts = {'sent': 0, 'retried': 0, 'failed': 0}
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        batch = queue.receive(batch_size)
+        if not batch:
+            break
+        batches += 1
+        for handle, message in batch:
+            try:
+                delay = process(message, send, pacer, max_attempts)
+            except Exception as e:
+                print(f"Dropping CV email request after {max_attempts} attempts: {str(e)}")
+                queue.ack(handle)
+                counts['failed'] += 1
+                continue
+            if delay is None:
+                queue.ack(handle)
+                counts['sent'] += 1
+            else:
+                queue.retry(handle, message, delay)
+                counts['retried'] += 1
+    return counts
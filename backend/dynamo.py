@@ -0,0 +1,50 @@
+import random
+import time
+
+'''
+Shared DynamoDB request helpers.
+
+get_items() reads any number of keys with batch_get_item: 100 keys per call (the API limit), and the keys DynamoDB
+hands back as UnprocessedKeys (it does that when a partition is throttled) are asked for again after an
+exponentially growing, jittered pause. Retrying at once would only hit the same throttled partition again.
+
+conditional_check_failed() tells a lost conditional write apart from a real error by its error code, so the
+modules doing optimistic writes don't need to import botocore just to name ClientError.
+'''
+
+MAX_BATCH_KEYS = 100 # batch_get_item accepts at most 100 keys per call.
+MAX_ATTEMPTS = 6 # Calls per batch of keys before giving up on the unprocessed ones.
+BACKOFF_BASE = 0.05 # Seconds; the pause before retry n is random between 0 and min(BACKOFF_CAP, BACKOFF_BASE * 2**n).
+BACKOFF_CAP = 1.0
+
+
+def get_items(dynamodb, table_name, keys, projection=None, consistent=False):
+    """
+    Yield the items for `keys` (key dicts) of one table. Keys that don't exist are simply not yielded.
+    dynamodb is a boto3 resource or low-level client, keys and items are in its format (plain or typed values).
+    Raises RuntimeError when keys are still unprocessed after MAX_ATTEMPTS calls.
+    """
+    for start in range(0, len(keys), MAX_BATCH_KEYS):
+        request = {'Keys': keys[start:start + MAX_BATCH_KEYS], 'ConsistentRead': consistent}
+        if projection:
+            request['ProjectionExpression'] = projection
+        pending = {table_name: request}
+
+        for attempt in range(MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+            response = dynamodb.batch_get_item(RequestItems=pending)
+            yield from response.get('Responses', {}).get(table_name, [])
+            pending = response.get('UnprocessedKeys')
+            if not pending:
+                break
+        else:
+            raise RuntimeError(f"{len(pending[table_name]['Keys'])} keys of {table_name} still unprocessed after {MAX_ATTEMPTS} attempts")
+
+
+def conditional_check_failed(error):
+    """
+    True if error is DynamoDB's ConditionalCheckFailedException (someone else wrote first).
+    """
+    response = getattr(error, 'response', None) or {}
+    return response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException'
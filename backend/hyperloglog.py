@@ -0,0 +1,154 @@
+import hashlib # Stable 64-bit hashes of visitor IDs (Python's built-in hash() is randomized per process).
+import math
+
+'''
+HyperLogLog sketch for counting distinct visitors in constant memory.
+
+Every visitor ID is hashed to 64 bits. The first `precision` bits pick one of m = 2**precision registers,
+and the register keeps the longest run of leading zeros (+1) seen in the remaining bits.
+Lots of distinct visitors -> some hash eventually has a long run of zeros -> registers grow.
+The estimate is derived from the harmonic mean of all registers.
+
+With precision=12 we have 4096 one-byte registers (4 KB) and a standard error of about 1.04 / sqrt(4096) = 1.6%,
+whether the site has 10 visitors or 10 million.
+
+Two sketches with the same precision merge by taking the max of each register, which is how days are
+combined into weekly and monthly estimates.
+
+The estimate uses the improved estimator from Otmar Ertl, "New cardinality estimation algorithms for HyperLogLog
+sketches" (2017). It works on the histogram of register values, and its sigma / tau terms correct for empty and
+saturated registers. The classic formula (harmonic mean, then linear counting below 2.5 * m) is biased by 2-3% around
+that switch, at ~10,000 visitors for precision 12. This one has no switch and no bias table, and stays within the
+standard error over the whole range.
+'''
+
+DEFAULT_PRECISION = 12
+
+
+def new_registers(precision=DEFAULT_PRECISION):
+    """
+    Return an empty register array (all zeros) for the given precision.
+    """
+    return bytearray(1 << precision)
+
+
+def precision_of(registers):
+    """
+    Work out the precision from the register array length (m = 2**precision).
+    """
+    return len(registers).bit_length() - 1
+
+
+def hash_visitor(visitor_id):
+    """
+    Hash a visitor ID to a 64-bit integer.
+    """
+    digest = hashlib.blake2b(visitor_id.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def position(visitor_id, precision=DEFAULT_PRECISION):
+    """
+    Return (register index, rank) for a visitor ID.
+    """
+    value = hash_visitor(visitor_id)
+    index = value >> (64 - precision) # Top `precision` bits choose the register.
+    remaining_bits = 64 - precision
+    rest = value & ((1 << remaining_bits) - 1)
+    rank = remaining_bits - rest.bit_length() + 1 # Leading zeros in the remaining bits, plus one.
+    return index, rank
+
+
+def add(registers, visitor_id):
+    """
+    Add a visitor to the sketch in place. Returns True if a register changed (i.e. the sketch needs saving).
+    """
+    index, rank = position(visitor_id, precision_of(registers))
+    if registers[index] >= rank:
+        return False
+    registers[index] = rank
+    return True
+
+
+def merge(*sketches):
+    """
+    Merge register arrays of the same precision into a new one by taking the per-register max.
+    """
+    sketches = [sketch for sketch in sketches if sketch]
+    if not sketches:
+        return new_registers()
+    if len({len(sketch) for sketch in sketches}) != 1:
+        raise ValueError("Cannot merge HyperLogLog sketches with different precisions")
+    return bytearray(map(max, *sketches)) if len(sketches) > 1 else bytearray(sketches[0])
+
+
+def _sigma(x):
+    """
+    sigma(x) = x + sum(x^(2^k) * 2^(k-1)) for k >= 1, the correction for empty registers (Ertl 2017).
+    """
+    if x == 1:
+        return math.inf
+    y, z = 1.0, x
+    while True:
+        x *= x
+        previous, z = z, z + x * y
+        y += y
+        if z == previous:
+            return z
+
+
+def _tau(x):
+    """
+    tau(x) = (1 - x - sum((1 - x^(2^-k))^2 * 2^-k) for k >= 1) / 3, the correction for saturated registers.
+    """
+    if x == 0 or x == 1:
+        return 0.0
+    y, z = 1.0, 1 - x
+    while True:
+        x = math.sqrt(x)
+        y *= 0.5
+        previous, z = z, z - (1 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+
+def estimate(registers):
+    """
+    Return the estimated number of distinct visitors in the sketch.
+    """
+    m = len(registers)
+    q = 64 - precision_of(registers) # Ranks go from 0 (empty) to q + 1.
+    counts = [0] * (q + 2)
+    for register in registers:
+        counts[register] += 1
+
+    z = m * _tau(1 - counts[q + 1] / m)
+    for rank in range(q, 0, -1):
+        z = 0.5 * (z + counts[rank])
+    z += m * _sigma(counts[0] / m)
+    return int(round(m * m / (2 * math.log(2) * z))) # alpha_inf * m^2 / z
+
+
+if __name__ == '__main__':
+    # Accuracy and throughput benchmark: python hyperloglog.py
+    import time
+
+    for true_count in (100, 10_000, 100_000, 1_000_000):
+        registers = new_registers()
+        start = time.perf_counter()
+        for i in range(true_count):
+            add(registers, f"visitor-{i}")
+        elapsed = time.perf_counter() - start
+        result = estimate(registers)
+        error = abs(result - true_count) / true_count * 100
+        print(f"{true_count:>9} visitors -> estimate {result:>9} ({error:5.2f}% error), "
+              f"{true_count / elapsed:,.0f} adds/s, {len(registers)} bytes")
+
+    days = [new_registers() for _ in range(7)]
+    for day, registers in enumerate(days):
+        for i in range(day * 5_000, day * 5_000 + 20_000): # Overlapping visitors between days.
+            add(registers, f"visitor-{i}")
+    start = time.perf_counter()
+    week = merge(*days)
+    elapsed = time.perf_counter() - start
+    print(f"7-day merge: estimate {estimate(week)} (true 50000), merged in {elapsed * 1000:.2f} ms")
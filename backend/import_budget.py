@@ -0,0 +1,112 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+'''
+Cold-import budget check for the Lambda handler modules.
+
+Everything a handler module does at import time is paid on every cold start, before the first request is even
+looked at. This script imports each handler in a fresh Python process with `python -X importtime` (the same thing
+Lambda does on a cold start), adds up the time, and exits with status 1 if any handler goes over its budget,
+so it can run as a CI step:
+
+    python import_budget.py                      # all handlers, each on its own budget (BUDGETS)
+    python import_budget.py --budget-ms 40 -v    # one budget for all, show the slowest imports
+    python import_budget.py crypto_api           # one module
+
+It also fails if importing a handler loads one of the FORBIDDEN modules (boto3, botocore, requests, numpy):
+those must only be imported on the request paths that use them (see aws_clients.py).
+
+bootstrap imports both lambda_function and crypto_api (it runs their request paths), so its budget is the two
+of theirs together rather than the single-handler default.
+
+Timings vary between machines and runs, so each module is imported --runs times and the fastest run counts.
+'''
+
+HANDLERS = ['lambda_function', 'crypto_api', 'SES_lambda', 'bootstrap']
+FORBIDDEN = ['boto3', 'botocore', 'requests', 'numpy']
+DEFAULT_BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', '50'))
+BUDGETS = {'bootstrap': 2 * DEFAULT_BUDGET_MS} # Handlers that get more than the default, in milliseconds.
+
+# The handlers read these at import time; dummy values are enough to import them.
+DUMMY_ENV = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'DYNAMODB_TABLE': 'ViewerCountTable',
+    'SENDER_EMAIL': 'sender@example.com',
+    'CLOUDFRONT_URL': 'https://example.cloudfront.net/cv.pdf'
+}
+
+# import time: self [us] | cumulative | imported package
+LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def measure(module):
+    """
+    Import module in a fresh interpreter. Returns (total_ms, [(cumulative_ms, name), ...] for its direct imports, set of loaded top-level packages).
+    """
+    env = dict(DUMMY_ENV, **os.environ)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+
+    total_ms, children, loaded = 0.0, [], set()
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        cumulative_ms, depth, name = int(match.group(2)) / 1000, len(match.group(3)), match.group(4)
+        loaded.add(name.split('.')[0])
+        if depth == 1: # Top-level import. Children are printed before their parent, so everything since the last one belongs to it.
+            if name == module:
+                total_ms = cumulative_ms
+                break
+            children = []
+        elif depth == 3: # Imported directly by a top-level module.
+            children.append((cumulative_ms, name))
+    return total_ms, sorted(children, reverse=True), loaded
+
+
+def budget(module):
+    """
+    The import budget for module in milliseconds.
+    """
+    return BUDGETS.get(module, DEFAULT_BUDGET_MS)
+
+
+def check(module, budget_ms, runs):
+    """
+    Measure module `runs` times. Returns (best total_ms, its direct imports, problems); problems is empty when it passes.
+    """
+    best = min((measure(module) for _ in range(runs)), key=lambda measured: measured[0])
+    total_ms, children, loaded = best
+    problems = []
+    if total_ms > budget_ms:
+        problems.append(f"{total_ms:.1f} ms is over the {budget_ms:.0f} ms budget")
+    for name in FORBIDDEN:
+        if name in loaded:
+            problems.append(f"imports {name} at import time")
+    return total_ms, children, problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fail if a handler module's cold import is over budget")
+    parser.add_argument('modules', nargs='*', default=HANDLERS, help="Modules to check (default: all handlers)")
+    parser.add_argument('--budget-ms', type=float, help="Budget for every module in milliseconds (default: BUDGETS, else IMPORT_BUDGET_MS)")
+    parser.add_argument('--runs', type=int, default=3, help="Imports per module, the fastest one counts")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Show the slowest direct imports")
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        total_ms, children, problems = check(module, args.budget_ms or budget(module), args.runs)
+        print(f"{'FAIL' if problems else 'ok':>4}  {module:<18} {total_ms:8.1f} ms  {'; '.join(problems)}")
+        if args.verbose:
+            for cumulative_ms, name in children[:5]:
+                print(f"{'':24} {cumulative_ms:8.1f} ms  {name}")
+        failed = failed or bool(problems)
+    sys.exit(1 if failed else 0)
@@ -1,129 +1,243 @@
-import boto3 # The AWS SDK for Python. It allows the Lambda function to interact with AWS services like DynamoDB in our case.
 import os # Used to access environment variables (e.g., DYNAMODB_TABLE). 
-import json # Used for handling JSON data, which is the standard format for event inputs and responses in Lambda. 
+import threading
+import time
+
+import aws_clients # Lazy boto3 (the AWS SDK for Python): clients are only built when a request needs them, see aws_clients.py
+import api_response # Shared CORS headers, JSON encoding and error responses, see api_response.py
+import tracing # Per-invocation stage timings and one EMF metrics line, see tracing.py
+import view_counter # Atomic (and optionally sharded) increments, see view_counter.py
+import unique_visitors # HyperLogLog distinct-visitor counting, see unique_visitors.py
+import page_counters # Per-page / per-section counters and the most viewed pages, see page_counters.py
 
-dynamodb = boto3.resource('dynamodb') # Creates a connection to DynamoDB using the default credentials and region configured for the Lambda function.
 table_name = os.environ['DYNAMODB_TABLE'] # Fetches the name of the DynamoDB table (ViewerCountTable) from the environment variable defined in main.tf lambda function resource.
 # Best approach instead of passing the name of the table through an event. We do it through the lambda resource created. 
-table = dynamodb.Table(table_name) # Creates a reference (table) to the ViewerCountTable for performing operations like get_item and put_item.
+counter_shards = int(os.environ.get('COUNTER_SHARDS', '1')) # Number of shard items the counter is spread over. 1 keeps the single "page_views" item.
+buffer_size = int(os.environ.get('VIEW_BUFFER_SIZE', '1')) # Views to collect in memory before one DynamoDB write. 1 disables buffering.
+buffer_max_age = float(os.environ.get('VIEW_BUFFER_MAX_AGE', '30')) # Seconds after which the buffer is written on the next view.
+count_unique = os.environ.get('UNIQUE_VISITORS', 'false').lower() == 'true' # Also keep a per-day HyperLogLog sketch of distinct visitors.
+read_ttl = float(os.environ.get('VIEW_READ_TTL', '10')) # Seconds a GET may answer from memory (and browsers may cache the answer).
+dedupe_window = int(os.environ.get('VIEW_DEDUPE_WINDOW', '1800')) # A visitor is counted at most once per window (seconds). 0 counts every POST.
+max_paths = int(os.environ.get('MAX_PATHS_PER_REQUEST', '100')) # Pages (plus sections) one GET may ask for: 100 is one batch_get_item.
+top_size = int(os.environ.get('TOP_PAGES_SIZE', '100')) # Pages and sections kept in the most viewed aggregate item.
+top_interval = float(os.environ.get('TOP_PAGES_INTERVAL', '60')) # Seconds between a container's merges into that item.
+
+primary_key = "page_views" # The counter item (shards are "page_views#1", ...)
+
+_read_cache = {} # window days -> {'body': response body, 'expires': monotonic seconds}
+_read_lock = threading.Lock()
+
+'''
+Two paths, one module:
+
+    GET  /viewer-count   read only: the total, served from memory for VIEW_READ_TTL seconds, then one
+                         eventually consistent read. Needs no write capacity at all. Page refreshes, crawlers and
+                         health checks can call it as often as they like without changing the count.
+    POST /viewer-count   counts a view (also done by GET /bootstrap), unless this visitor was already counted
+                         in the last VIEW_DEDUPE_WINDOW seconds:
+                           1. the visitor's fingerprint (IP + user agent) seen by this container -> repeat, no call
+                           2. one conditional put of a "seen#<hash>" item (view_counter.first_visit) -> counted or repeat
+                         A repeat gets the (cached) total back with "counted": false.
+
+There is no dedupe cookie: the API is on another origin than the page and answers with
+Access-Control-Allow-Origin: *, so browsers never send it credentials and a cookie would never come back.
+The seen# items carry expires_at, which DynamoDB TTL deletes after the window.
+
+With ?path=/blog/post-1 the POST also counts that page and its section (see page_counters.py) and is deduped per
+visitor *and page*, so reading a second page counts it.
+
+    GET /viewer-count?paths=/,/blog/post-1&sections=/blog   {"pages": {"/": 812, "/blog/post-1": 40}, "sections": {"/blog": 95}}
+    GET /viewer-count?top=10                                  {"top": [{"path": "/", "views": 812}, ...], "by": "page", ...}
+    GET /viewer-count?top=10&by=section                       the same for sections
+'''
+
+def window_days(event):
+    """
+    Distinct visitors are reported for today, or for the last 7 / 30 days with ?window=week or ?window=month.
+    """
+    window = ((event.get('queryStringParameters') or {}).get('window') or 'day').lower()
+    return unique_visitors.WINDOWS.get(window, 1)
+
+def read_count(event):
+    """
+    Return the read-only body ({"view_count": ...}), from memory if it is younger than VIEW_READ_TTL.
+    """
+    days = window_days(event) if count_unique else 1
+    with _read_lock:
+        cached = _read_cache.get(days)
+        if cached and cached['expires'] > time.monotonic():
+            tracing.outcome('count_cache', 'HIT')
+            return dict(cached['body'])
+
+    dynamodb = aws_clients.resource('dynamodb')
+    with tracing.stage('dynamodb'):
+        # Eventually consistent: half the read cost, and a view from the last second or so doesn't matter here.
+        body = {'view_count': view_counter.read_total(dynamodb, table_name, primary_key, shards=counter_shards, consistent=False)}
+    if count_unique:
+        with tracing.stage('unique_visitors'):
+            body['unique_visitors'] = unique_visitors.estimate_range(dynamodb, table_name, unique_visitors.today_utc(), days)
+        body['unique_window_days'] = days
+
+    tracing.outcome('count_cache', 'MISS')
+    with _read_lock:
+        _read_cache[days] = {'body': dict(body), 'expires': time.monotonic() + read_ttl}
+    return body
+
+def remember_total(view_count):
+    """
+    Update the cached total after an increment, so this container's reads never go backwards.
+    """
+    with _read_lock:
+        for cached in _read_cache.values():
+            cached['body']['view_count'] = max(cached['body']['view_count'], view_count)
+
+def page_path(event):
+    """
+    The normalized ?path= of the page being viewed, or None. Raises page_counters.InvalidPath.
+    """
+    path = (event.get('queryStringParameters') or {}).get('path')
+    return page_counters.normalize_path(path) if path else None
+
+def is_repeat_visit(event, path=None):
+    """
+    True if this visitor was already counted (for this page) within the dedupe window, by its fingerprint.
+    """
+    if dedupe_window <= 0:
+        return False
+    fingerprint = unique_visitors.visitor_id(event) + (f"|{path}" if path else '')
+    with tracing.stage('dedupe'):
+        return not view_counter.first_visit(aws_clients.table(table_name), fingerprint, dedupe_window)
+
+def add_view(dynamodb, counter_id, shards=1):
+    """
+    Add one view to the site total and return its new (or, when buffering, estimated) value.
+    Only the total goes through the buffer: one buffer per page would multiply the loss bound by the number of pages.
+    """
+    if buffer_size > 1:
+        # Write-behind mode: the returned count is an estimate, see view_counter.buffered_increment for the loss bound.
+        return view_counter.buffered_increment(
+            dynamodb, table_name, counter_id, shards=shards,
+            max_pending=buffer_size, max_age=buffer_max_age
+        )
+    return view_counter.increment(dynamodb, table_name, counter_id, shards=shards)
+
+def count_view(event):
+    """
+    Count one page view (plus the visitor, if enabled) and return the response body. Raises on DynamoDB errors.
+    A visitor already counted within the dedupe window gets the current total with "counted": false instead.
+    Also used by the combined /bootstrap handler, see bootstrap.py.
+    """
+    path = page_path(event)
+    if is_repeat_visit(event, path):
+        tracing.outcome('dedupe', 'REPEAT')
+        body = read_count(event)
+        body.update(message='View already counted', counted=False)
+        if path:
+            section = page_counters.section_of(path)
+            pages, sections = page_counters.read_counts(
+                aws_clients.resource('dynamodb'), table_name, [path], [section] if section else [], ttl=read_ttl
+            )
+            body.update(path=path, path_views=pages[path])
+            if section:
+                body['section_views'] = sections[section]
+        return body
+    if dedupe_window > 0:
+        tracing.outcome('dedupe', 'FIRST')
 
+    # Increment viewer count
+    dynamodb = aws_clients.resource('dynamodb') # Built on the first real request (not at import, not for preflights), then reused by warm invocations.
+
+    with tracing.stage('dynamodb'):
+        new_count = add_view(dynamodb, primary_key, shards=counter_shards)
+        if path:
+            # Page and section counters aren't sharded (one page gets a fraction of the site's traffic) or buffered (see add_view).
+            path_views, section_views = page_counters.record_view(
+                path, lambda key: view_counter.increment(dynamodb, table_name, key), ttl=read_ttl
+            )
+
+    '''
+    One update_item call with "ADD view_count :inc" replaces the old get_item + put_item pair.
+    DynamoDB applies the ADD atomically on the server, so two concurrent invocations both get counted
+    (with read-then-write, both could read 10 and both write 11).
+    ReturnValues='UPDATED_NEW' hands us the new count in the same round trip.
+
+    With COUNTER_SHARDS > 1 the increment lands on one of N shard items and the total is the sum of all shards,
+    so a burst of traffic no longer hammers a single partition key.
+
+    The count comes back as a Decimal (DynamoDB represents every number as Decimal), view_counter converts it to int
+    so json.dumps() can serialize it.
+    '''
+
+    remember_total(new_count)
+    body = {'message': 'View count updated', 'view_count': new_count, 'counted': True}
+    if path:
+        body.update(path=path, path_views=path_views)
+        if section_views is not None:
+            body['section_views'] = section_views
+        page_counters.maybe_merge(aws_clients.table(table_name), top_size, top_interval)
+
+    if count_unique:
+        days = window_days(event)
+        today = unique_visitors.today_utc()
+        visitor = unique_visitors.visitor_id(event)
+        try:
+            with tracing.stage('unique_visitors'):
+                visitors = unique_visitors.record_visitor(aws_clients.table(table_name), visitor, today)
+                if days > 1:
+                    visitors = unique_visitors.estimate_range(dynamodb, table_name, today, days)
+            body.update(unique_visitors=visitors, unique_window_days=days)
+        except Exception as e:
+            # The view and its seen# item are already written, so a 500 here would make a retry a "repeat" that is
+            # never counted. Answer with the view and leave the visitor estimate out instead.
+            tracing.count('unique_visitor_errors')
+            print(f"Failed to record unique visitor: {str(e)}")
+
+    return body
+
+def read_pages(query):
+    """
+    Return the body for GET ?paths=, ?sections= and/or ?top=. Raises ValueError for a bad query.
+    """
+    body = {}
+    if query.get('top'):
+        try:
+            limit = int(query['top'])
+        except ValueError:
+            limit = 0
+        by = query.get('by') or page_counters.PAGE_PREFIX
+        if not 1 <= limit <= top_size or by not in (page_counters.PAGE_PREFIX, page_counters.SECTION_PREFIX):
+            raise ValueError(f"top must be 1-{top_size} and by page or section")
+        body.update(page_counters.read_top(aws_clients.table(table_name), limit, by, ttl=read_ttl))
+
+    paths = page_counters.parse_paths(query.get('paths') or '', max_paths)
+    sections = page_counters.parse_paths(query.get('sections') or '', max_paths - len(paths), sections=True)
+    if paths or sections:
+        pages, section_counts = page_counters.read_counts(aws_clients.resource('dynamodb'), table_name, paths, sections, ttl=read_ttl)
+        if paths:
+            body['pages'] = pages
+        if sections:
+            body['sections'] = section_counts
+    return body
+
+@tracing.traced
 def lambda_handler(event, context):
-    # Define the primary key
-    primary_key = "page_views" 
+    method = event.get('httpMethod')
+    if method == 'OPTIONS':
+        return api_response.preflight(api_response.GET_POST_HEADERS)
 
-    # Increment viewer count
     try:
-        # Get the current viewer count
-        response = table.get_item(Key={'counter_id': primary_key})
-
-        '''
-        Example of a response: 
-        {
-        "Item": {
-            "counter_id": "page_views",
-            "view_count": 124
-          }
-        }
-
-        DynamoDB retrieves the entire item by default once the primary key is provided.
-        '''
-
-        if 'Item' in response and 'view_count' in response['Item']:
-            current_count = int(response['Item']['view_count'])
-        else:
-            current_count = 0
-
-        '''
-        We need to use int() before response['Item']['view_count'] because DynamoDB represents numeric values as Decimal objects, not as native Python integers or floats. 
-        Always convert numeric values retrieved from DynamoDB to int (or float if decimal precision is required) to avoid issues. 
-        Decimals are used for all numeric values in DynamoDB and are not directly compatible with int or float. 
-
-        Ensure Compatibility with JSON Serialization: When you return the current_count as part of the response body, it needs to be JSON-serializable. 
-        Native Python types (e.g., int, float) work with json.dumps(), but Decimal objects do not.
-
-        Ensure Correct Arithmetic Operations: While Decimal supports arithmetic, converting to int ensures consistency in cases where you expect whole numbers.
-
-        Ensure Correct Arithmetic Operations: While Decimal supports arithmetic, converting to int ensures consistency in cases where you expect whole numbers.
-
-        x = Decimal('0.1')
-        y = Decimal('0.2')
-        print(x + y)  # 0.3 (exact)     
-
-        int
-        x = 1
-        y = 2
-        print(x + y)  # 3
-
-        With float (similar to Decimal but less precise):
-        x = 0.1
-        y = 0.2
-        print(x + y)  # 0.30000000000000004 (imprecision)
-
-        Decimal is designed for precision but is slower.
-        int is faster and simpler but cannot handle fractions.
-
-        DynamoDB uses Decimal for all numeric data to avoid:
-
-        Precision Errors: Ensures fractional or high-precision values are stored and retrieved exactly.
-        Flexibility: Handles both whole numbers and decimals seamlessly.    
-        '''
-
-        # Increment the count
-        new_count = current_count + 1 # Increment the count for this lambda invocation. 
-
-        # Update the count in DynamoDB
-        table.put_item(Item={'counter_id': primary_key, 'view_count': new_count}) # Puts the new count back to the table
-        
-        '''
-        Why Do We Need to Specify Both Keys for put_item?
-        put_item creates or replaces an entire item in a DynamoDB table.
-        When you use put_item, you must specify:
-        Primary Key (e.g., counter_id): Uniquely identifies the item.
-        Attributes (e.g., view_count): All the attributes of the item you want to store.
-
-        Item: Represents the full row (or item) to be stored in the table.
-        DynamoDB does not "merge" new attributes into an existing item. 
-        If you only specify the primary key in put_item, the item will replace the existing one, potentially deleting all other attributes.
-        
-        If the item contained: 
-        {
-        "counter_id": "page_views",
-        "view_count": 10,
-        "extra_attribute": "example"
-        }
-
-        And we run: table.put_item(Item={'counter_id': 'page_views', 'view_count': 20})
-
-        We'll get: 
-
-        {
-        "counter_id": "page_views",
-        "view_count": 20
-        }
-
-        The extra_attribute is removed because put_item replaces the entire item.
-        
-        put_ite	replaces the entire item, so all attributes need to be explicitly specified.
-        '''
-
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type,Authorization'
-            },
-            'body': json.dumps({'message': 'View count updated', 'view_count': new_count})
-        }
+        if method == 'POST':
+            body = count_view(event)
+            return api_response.respond(200, body, api_response.GET_POST_HEADERS, cache_control=api_response.NO_STORE) # Counts a view, never serve it from a cache.
+
+        query = event.get('queryStringParameters') or {}
+        body = read_pages(query) if any(query.get(name) for name in ('paths', 'sections', 'top')) else read_count(event)
+        return api_response.respond(
+            200, body, api_response.GET_POST_HEADERS, cache_control=f"public, max-age={int(read_ttl)}", event=event # Unchanged totals come back as a 304.
+        )
     
+    except ValueError as e: # page_counters.InvalidPath, or a bad ?top=
+        return api_response.error(400, str(e), api_response.GET_POST_HEADERS)
+
     except Exception as e:
         
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET,OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type,Authorization'
-            },
-            'body': json.dumps({'error': str(e)})
-        }
+        return api_response.error(500, str(e), api_response.GET_POST_HEADERS)
@@ -0,0 +1,482 @@
+import argparse
+import contextlib
+import http.client
+import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+'''
+Local Lambda + API Gateway emulator and load generator, so the handlers can be measured without deploying.
+
+HTTP requests are turned into API Gateway (REST, Lambda proxy) events and passed to the same lambda_handler
+functions API Gateway would call. DynamoDB, SSM, SES and CoinMarketCap are replaced by the stubs in local_stubs.py,
+which add a realistic network delay per call (--no-latency turns it off to see pure Python cost).
+
+    python local_api.py serve --port 3000
+        Serve /viewer-count, /crypto_api, /send-cv and /bootstrap on http://127.0.0.1:3000 (point frontend/index.js at it).
+
+    python local_api.py bench --requests 2000 --concurrency 16
+        Warm-container load test: every route in the mix is invoked in-process from a thread pool. Reports
+        throughput and p50/p95/p99 latency per route, plus how many upstream calls the stubs saw.
+        --route "GET /crypto_api?symbols=BTC,SOL"   (repeatable) replaces the default route mix
+        --url http://127.0.0.1:3000                 sends the requests over HTTP to a running `serve` instead
+        --json                                      machine-readable output, to diff against a saved baseline
+
+    python local_api.py pageload --loads 500 --network-ms 40
+        Page-load test: the two requests frontend/index.js used to send on load (/viewer-count and /crypto_api,
+        in parallel like the browser's fetches) against the one /bootstrap request. Reports p50/p95/p99 per flow
+        and the Lambda invocations each one costs. --network-ms adds a client <-> API Gateway round trip to every
+        request; --url works like in bench (a fresh connection per request, like a first visit).
+        The default --concurrency 1 matches one Lambda container; with more, all simulated containers share
+        bootstrap's one thread pool, which Lambda never does.
+
+    python local_api.py cold --samples 10
+        Cold-start test: every sample is a brand-new Python process (a new Lambda container). Reports the
+        init time (importing the handler), the first invocation and a following warm invocation per route.
+        The stubs never import boto3, so "first" leaves out building real SDK clients (see aws_clients.py).
+
+Note that bench runs all threads against one warm "container" (one process, shared module-level caches), while
+Lambda gives every concurrent request its own container. Cache hit ratios here are therefore an upper bound.
+'''
+
+ROUTES = {
+    '/viewer-count': 'lambda_function',
+    '/crypto_api': 'crypto_api',
+    '/send-cv': 'SES_lambda',
+    '/bootstrap': 'bootstrap'
+}
+STAGE = '/prod' # API Gateway stage prefix, accepted and stripped so the frontend URLs work unchanged.
+
+PAGE_SYMBOLS = 'BTC,ETH,BNB,LTC,DOGE,NEO,ADA,SOL,XRP,TRX' # frontend/index.js
+
+# What a page load sends, before and after /bootstrap.
+PAGE_FLOWS = {
+    'two-call': ['POST /viewer-count?path=/', f"GET /crypto_api?symbols={PAGE_SYMBOLS}"],
+    'bootstrap': [f"GET /bootstrap?symbols={PAGE_SYMBOLS}&path=/"]
+}
+
+DEFAULT_MIX = [
+    'GET /viewer-count',
+    'POST /viewer-count?path=/',
+    'GET /viewer-count?paths=/,/blog/post-1&sections=/blog',
+    'GET /viewer-count?top=10',
+    'GET /crypto_api?symbols=BTC,ETH,BNB,LTC,DOGE,NEO,ADA,SOL,XRP,TRX',
+    'OPTIONS /send-cv',
+    'POST /send-cv {"email": "visitor@example.com"}'
+]
+
+
+class LocalContext:
+    """
+    The bits of the Lambda context object the handlers use.
+    """
+
+    def __init__(self, function_name, timeout_seconds=30):
+        self.function_name = function_name
+        self.aws_request_id = str(uuid.uuid4())
+        self.memory_limit_in_mb = 128
+        self._deadline = time.monotonic() + timeout_seconds
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+def make_event(method, path, query=None, body=None, headers=None, source_ip='127.0.0.1'):
+    """
+    Build an API Gateway REST API proxy event (the shape lambda_handler receives).
+    """
+    headers = dict(headers or {})
+    headers.setdefault('User-Agent', 'local-api')
+    return {
+        'resource': path,
+        'path': path,
+        'httpMethod': method,
+        'headers': headers,
+        'queryStringParameters': dict(query) if query else None, # API Gateway sends null, not {}, without a query string.
+        'pathParameters': None,
+        'body': body or None,
+        'isBase64Encoded': False,
+        'requestContext': {
+            'stage': 'local',
+            'requestId': str(uuid.uuid4()),
+            'requestTimeEpoch': int(time.time() * 1000),
+            'identity': {'sourceIp': source_ip, 'userAgent': headers['User-Agent']}
+        }
+    }
+
+
+def parse_route(spec):
+    """
+    Parse 'METHOD /path?query [body]' into (method, path, query dict, body).
+    """
+    parts = spec.split(None, 2)
+    method, target = parts[0].upper(), parts[1]
+    url = urlparse(target)
+    return method, url.path, dict(parse_qsl(url.query)), parts[2] if len(parts) > 2 else None
+
+
+def handler_for(path):
+    """
+    Return the lambda_handler serving a path (handler modules are imported on first use, i.e. the cold start).
+    """
+    if path.startswith(STAGE + '/'):
+        path = path[len(STAGE):]
+    module = ROUTES.get(path)
+    if module is None:
+        return None
+    return importlib.import_module(module).lambda_handler
+
+
+def invoke(method, path, query=None, body=None, headers=None, source_ip='127.0.0.1'):
+    """
+    Invoke the handler for a request in-process. Returns the Lambda proxy response.
+    """
+    handler = handler_for(path)
+    if handler is None:
+        return {'statusCode': 404, 'headers': {}, 'body': json.dumps({'message': 'Missing Authentication Token'})} # What API Gateway says.
+    return handler(make_event(method, path, query, body, headers, source_ip), LocalContext(handler.__module__))
+
+
+# ---------------------------------------------------------------------------------------------------------------
+# serve
+# ---------------------------------------------------------------------------------------------------------------
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP front end: request -> proxy event -> lambda_handler -> HTTP response.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    quiet = False
+    disable_nagle_algorithm = True # Headers and body are separate writes; with Nagle every response waits ~40 ms for a delayed ACK.
+
+    def _handle(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8') if length else None
+        response = invoke(
+            self.command, url.path, dict(parse_qsl(url.query)), body, dict(self.headers.items()),
+            self.headers.get('X-Forwarded-For', self.client_address[0]) # Lets the load generator pose as many visitors.
+        )
+        payload = (response.get('body') or '').encode('utf-8')
+        self.send_response(response['statusCode'])
+        for name, value in (response.get('headers') or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_OPTIONS = _handle
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            sys.stderr.write(f"{self.command} {self.path} -> {args[1] if len(args) > 1 else ''}\n")
+
+
+def serve(port, quiet=False):
+    RequestHandler.quiet = quiet
+    server = ThreadingHTTPServer(('127.0.0.1', port), RequestHandler)
+    print(f"Serving {', '.join(ROUTES)} on http://127.0.0.1:{port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+# ---------------------------------------------------------------------------------------------------------------
+# bench
+# ---------------------------------------------------------------------------------------------------------------
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(routes, latencies, statuses, elapsed):
+    """
+    Build the per-route report: requests, errors, req/s and latency percentiles in milliseconds.
+    """
+    report = {}
+    for route in dict.fromkeys(routes):
+        values = sorted(latencies[route])
+        report[route] = {
+            'requests': len(values),
+            'errors': sum(count for status, count in statuses[route].items() if status >= 400),
+            'statuses': dict(sorted(statuses[route].items())),
+            'rps': round(len(values) / elapsed, 1),
+            'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+            'max_ms': round(values[-1] * 1000, 2)
+        }
+    return report
+
+
+def http_sender(base_url):
+    """
+    Return send(method, path, query, body, source_ip) -> status that talks HTTP to a running emulator.
+    Every thread keeps its own keep-alive connection.
+    """
+    url = urlparse(base_url)
+    local = threading.local()
+
+    def send(method, path, query, body, source_ip):
+        if not hasattr(local, 'connection'):
+            local.connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+        target = path + ('?' + '&'.join(f"{key}={value}" for key, value in query.items()) if query else '')
+        local.connection.request(method, target, body=body, headers={'X-Forwarded-For': source_ip})
+        response = local.connection.getresponse()
+        response.read()
+        return response.status
+
+    return send
+
+
+def bench(routes, requests_total, concurrency, visitors=1000, base_url=None):
+    """
+    Fire requests_total requests (routes mixed round robin) from `concurrency` threads. Returns (report, elapsed).
+    """
+    parsed = [parse_route(spec) for spec in routes]
+    latencies, statuses = defaultdict(list), defaultdict(lambda: defaultdict(int))
+    lock = threading.Lock()
+
+    if base_url:
+        send = http_sender(base_url)
+    else:
+        for _, path, _, _ in parsed:
+            handler_for(path) # Import every handler first, so the measurement is warm-container only.
+
+        def send(method, path, query, body, source_ip):
+            return invoke(method, path, query, body, source_ip=source_ip)['statusCode']
+
+    def one(number):
+        spec, (method, path, query, body) = routes[number % len(routes)], parsed[number % len(parsed)]
+        source_ip = f"10.0.{number % visitors // 256}.{number % visitors % 256}" # Spread over distinct visitors.
+        started = time.perf_counter()
+        try:
+            status = send(method, path, query, body, source_ip)
+        except Exception:
+            status = 599 # Transport error (only possible over HTTP).
+        took = time.perf_counter() - started
+        with lock:
+            latencies[spec].append(took)
+            statuses[spec][status] += 1
+
+    started = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull): # Handlers still print (that costs time too), we just don't show it.
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, range(requests_total)))
+    elapsed = time.perf_counter() - started
+    return summarize(routes, latencies, statuses, elapsed), elapsed
+
+
+def print_report(report, elapsed, stubs=None):
+    total = sum(route['requests'] for route in report.values())
+    print(f"{total} requests in {elapsed:.2f} s = {total / elapsed:,.1f} req/s\n")
+    print(f"{'route':<52} {'req':>6} {'err':>5} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)")
+    for route, row in report.items():
+        print(f"{route[:52]:<52} {row['requests']:>6} {row['errors']:>5} {row['rps']:>8} "
+              f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} {row['max_ms']:>8}")
+    if stubs:
+        print(f"\nupstream: {stubs['cmc'].calls} CoinMarketCap calls, {stubs['ssm'].calls} SSM calls, "
+              f"{stubs['dynamodb'].writes} DynamoDB writes, {len(stubs['ses'].sent)} emails sent")
+
+
+# ---------------------------------------------------------------------------------------------------------------
+# pageload
+# ---------------------------------------------------------------------------------------------------------------
+
+def pageload(loads, concurrency, network_ms=0, base_url=None, flows=PAGE_FLOWS):
+    """
+    Time `loads` page loads per flow, `concurrency` at a time. The requests of one page load are sent in parallel
+    and the load is done when the last one answers. Returns {flow: report}.
+    """
+    if base_url:
+        url = urlparse(base_url)
+
+        def send(method, path, query, body, source_ip):
+            connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30) # New visitor, new connection.
+            try:
+                target = path + ('?' + '&'.join(f"{key}={value}" for key, value in query.items()) if query else '')
+                connection.request(method, target, body=body, headers={'X-Forwarded-For': source_ip})
+                response = connection.getresponse()
+                response.read()
+                return response.status
+            finally:
+                connection.close()
+    else:
+        def send(method, path, query, body, source_ip):
+            return invoke(method, path, query, body, source_ip=source_ip)['statusCode']
+
+    widest = max(len(specs) for specs in flows.values())
+    report = {}
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), \
+            ThreadPoolExecutor(max_workers=concurrency * widest) as requests_pool, \
+            ThreadPoolExecutor(max_workers=concurrency) as loads_pool:
+
+        def one_request(spec, source_ip):
+            method, path, query, body = parse_route(spec)
+            time.sleep(network_ms / 1000) # Client <-> API Gateway round trip.
+            try:
+                return send(method, path, query, body, source_ip)
+            except Exception:
+                return 599
+
+        def one_load(specs, number, subnet):
+            # Every load is a new visitor, and every flow has its own range (10.1.x.y, 10.2.x.y, ...): with shared
+            # addresses the second flow would only ever take the dedupe "already counted" path.
+            source_ip = f"10.{subnet}.{number // 256 % 256}.{number % 256}"
+            started = time.perf_counter()
+            statuses = [future.result() for future in [requests_pool.submit(one_request, spec, source_ip) for spec in specs]]
+            return time.perf_counter() - started, statuses
+
+        for subnet, (name, specs) in enumerate(flows.items(), 1):
+            # Warm up imports and caches, with visitors the measured loads don't reuse.
+            list(loads_pool.map(lambda number: one_load(specs, number, subnet), range(loads, loads + concurrency)))
+            started = time.perf_counter()
+            results = list(loads_pool.map(lambda number: one_load(specs, number, subnet), range(loads)))
+            elapsed = time.perf_counter() - started
+            values = sorted(took for took, _ in results)
+            report[name] = {
+                'loads': loads,
+                'requests_per_load': len(specs),
+                'failed_loads': sum(1 for _, statuses in results if any(status >= 400 for status in statuses)),
+                'loads_per_s': round(loads / elapsed, 1),
+                'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+                'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+                'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+                'max_ms': round(values[-1] * 1000, 2)
+            }
+    return report
+
+
+def print_pageload(report):
+    print(f"{'flow':<12} {'loads':>6} {'invocations':>12} {'failed':>7} {'loads/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)")
+    for name, row in report.items():
+        print(f"{name:<12} {row['loads']:>6} {row['loads'] * row['requests_per_load']:>12} {row['failed_loads']:>7} "
+              f"{row['loads_per_s']:>8} {row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} {row['max_ms']:>8}")
+
+
+# ---------------------------------------------------------------------------------------------------------------
+# cold
+# ---------------------------------------------------------------------------------------------------------------
+
+def cold_sample(spec, latency):
+    """
+    Runs inside a fresh process: time the handler import (Lambda init), the first and a second invocation.
+    """
+    import local_stubs
+
+    local_stubs.install(latency=latency) # Stub setup (key generation, servers) is not part of the measurement.
+    method, path, query, body = parse_route(spec)
+    with contextlib.redirect_stdout(sys.stderr): # stdout carries the result.
+        started = time.perf_counter()
+        handler_for(path)
+        init = time.perf_counter() - started
+        started = time.perf_counter()
+        first = invoke(method, path, query, body)
+        first_took = time.perf_counter() - started
+        started = time.perf_counter()
+        invoke(method, path, query, body)
+        warm_took = time.perf_counter() - started
+    return {'init_ms': init * 1000, 'first_ms': first_took * 1000, 'warm_ms': warm_took * 1000, 'status': first['statusCode']}
+
+
+def cold(routes, samples, latency):
+    """
+    Measure `samples` cold starts per route, each in its own interpreter. Returns {route: {metric: median ms}}.
+    """
+    report = {}
+    for spec in routes:
+        rows = []
+        for _ in range(samples):
+            command = [sys.executable, os.path.abspath(__file__), '_sample', spec] + ([] if latency else ['--no-latency'])
+            output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+            rows.append(json.loads(output.strip().splitlines()[-1]))
+        report[spec] = {
+            metric: round(sorted(row[metric] for row in rows)[len(rows) // 2], 2)
+            for metric in ('init_ms', 'first_ms', 'warm_ms')
+        }
+        report[spec]['statuses'] = sorted({row['status'] for row in rows})
+    return report
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__))) # Handler modules live next to this file.
+
+    parser = argparse.ArgumentParser(description="Local API Gateway + Lambda emulator and load generator")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help="Serve the API on localhost")
+    serve_parser.add_argument('--port', type=int, default=3000)
+    serve_parser.add_argument('--quiet', action='store_true', help="Don't log every request")
+
+    bench_parser = commands.add_parser('bench', help="Warm-container load test")
+    bench_parser.add_argument('--requests', type=int, default=1000)
+    bench_parser.add_argument('--concurrency', type=int, default=8)
+    bench_parser.add_argument('--visitors', type=int, default=1000, help="Distinct source IPs to spread requests over")
+    bench_parser.add_argument('--route', action='append', help="'METHOD /path?query [body]', repeatable")
+    bench_parser.add_argument('--url', help="Benchmark a running `serve` over HTTP instead of in-process")
+    bench_parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    pageload_parser = commands.add_parser('pageload', help="Two-call page load vs /bootstrap")
+    pageload_parser.add_argument('--loads', type=int, default=500)
+    pageload_parser.add_argument('--concurrency', type=int, default=1)
+    pageload_parser.add_argument('--network-ms', type=float, default=0, help="Client <-> API Gateway round trip added to every request")
+    pageload_parser.add_argument('--url', help="Send the requests over HTTP to a running `serve` instead of in-process")
+    pageload_parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    cold_parser = commands.add_parser('cold', help="Cold-start test, one fresh process per sample")
+    cold_parser.add_argument('--samples', type=int, default=5)
+    cold_parser.add_argument('--route', action='append', help="'METHOD /path?query [body]', repeatable")
+    cold_parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    sample_parser = commands.add_parser('_sample') # Internal: one cold-start sample, used by `cold`.
+    sample_parser.add_argument('route')
+
+    for sub in (serve_parser, bench_parser, pageload_parser, cold_parser, sample_parser):
+        sub.add_argument('--no-latency', action='store_true', help="Stubs answer instantly (pure Python cost)")
+    args = parser.parse_args()
+
+    if args.command == '_sample':
+        print(json.dumps(cold_sample(args.route, not args.no_latency)))
+    elif args.command == 'cold':
+        report = cold(args.route or DEFAULT_MIX, args.samples, not args.no_latency)
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print(f"{'route (median of ' + str(args.samples) + ')':<52} {'init':>8} {'first':>8} {'warm':>8}  (ms)")
+            for route, row in report.items():
+                print(f"{route[:52]:<52} {row['init_ms']:>8} {row['first_ms']:>8} {row['warm_ms']:>8}  status {row['statuses']}")
+    else:
+        import local_stubs
+
+        stubs = local_stubs.install(latency=not args.no_latency)
+        if args.command == 'serve':
+            serve(args.port, args.quiet)
+        elif args.command == 'pageload':
+            report = pageload(args.loads, args.concurrency, args.network_ms, args.url)
+            if args.json:
+                print(json.dumps(report, indent=2))
+            else:
+                print_pageload(report)
+        else:
+            report, elapsed = bench(args.route or DEFAULT_MIX, args.requests, args.concurrency, args.visitors, args.url)
+            if args.json:
+                print(json.dumps({'elapsed_s': round(elapsed, 3), 'routes': report}, indent=2))
+            else:
+                print_report(report, elapsed, None if args.url else stubs)
@@ -0,0 +1,361 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import sys
+import time
+from urllib.parse import parse_qsl, urlparse
+
+'''
+Local stand-in for a long-lived price stream server (asyncio), and a fan-out load test with thousands of clients.
+
+On Lambda behind API Gateway every EventSource reconnect is one invocation (see crypto_api.stream_response).
+A host that can keep connections open (a container, or Lambda response streaming behind a function URL) would
+instead hold every viewer's connection and push events as they happen. This is that host, in one process:
+
+    python local_stream.py serve --port 3001
+        GET http://127.0.0.1:3001/crypto_api?symbols=BTC,ETH&stream=1 streams events (curl -N, or an EventSource).
+
+    python local_stream.py bench --clients 2000 --duration 10
+        Starts the server and `--clients` simulated EventSource clients in the same event loop, then reports
+        connected clients, fan-out latency (broadcast -> client received, p50/p95/p99), bytes per snapshot / diff,
+        and how many CoinMarketCap calls were made for all of them.
+
+How the fan-out works:
+- Clients asking for the same symbol list share a Channel. Each Channel has one poller that reads the prices through
+  crypto_api.lookup_prices (the same shared price cache the Lambda uses) every --interval seconds, so the number of
+  cache reads and upstream calls depends on the number of symbol lists, not on the number of viewers.
+- A changed price set is encoded once (price_stream.update gives the diff) and the same bytes are written to every
+  client. Nothing is sent while prices don't change, apart from a comment line every HEARTBEAT seconds that keeps
+  proxies from closing idle connections.
+- A new or reconnecting client gets a snapshot, or a diff against its Last-Event-ID.
+- A client that doesn't read (its socket buffer keeps growing past MAX_CLIENT_BUFFER) is disconnected instead of
+  holding memory for everybody; EventSource reconnects and catches up with one diff.
+
+DynamoDB, SSM and CoinMarketCap are the stubs from local_stubs.py. --ttl sets PRICE_CACHE_TTL, so the prices (and
+with them the events) change every few seconds instead of every minute.
+'''
+
+HEARTBEAT = 15 # seconds between keep-alive comments on an idle stream
+MAX_CLIENT_BUFFER = 256 * 1024 # bytes queued for one client before we drop it
+STREAM_PATHS = ('/crypto_api', '/prod/crypto_api')
+
+RESPONSE_HEAD = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: text/event-stream\r\n"
+    b"Cache-Control: no-store\r\n"
+    b"Access-Control-Allow-Origin: *\r\n"
+    b"Connection: keep-alive\r\n\r\n"
+)
+
+
+class Channel:
+    """
+    One symbol list: its current prices, the connected clients and the poller that feeds them.
+    """
+
+    def __init__(self, symbols, interval, on_broadcast=None):
+        self.symbols = symbols
+        self.interval = interval
+        self.on_broadcast = on_broadcast # callback(channel, kind, event_id, payload) for the benchmark
+        self.clients = set() # StreamWriters
+        self.prices = None
+        self.version = None
+        self.ready = asyncio.Event() # Set once the first prices are in.
+        self.dropped = 0
+        self.task = asyncio.ensure_future(self.poll())
+
+    async def poll(self):
+        import crypto_api
+        import price_stream
+
+        loop = asyncio.get_running_loop()
+        last_write = time.monotonic()
+        while True:
+            try:
+                # The cache read may block (stubbed network latency, upstream fetch), keep it off the event loop.
+                prices, _ = await loop.run_in_executor(None, crypto_api.lookup_prices, self.symbols)
+            except Exception as e:
+                print(f"Price lookup for {self.symbols} failed: {str(e)}", file=sys.stderr)
+                prices = None
+
+            if prices is not None:
+                kind, text = price_stream.update(self.version, prices)
+                self.prices = prices
+                if kind is not None:
+                    previous_version, self.version = self.version, price_stream.version(prices)
+                    if previous_version is not None: # The first prices are sent to each client as it connects.
+                        self.broadcast(text.encode('utf-8'), kind)
+                        last_write = time.monotonic()
+                self.ready.set()
+
+            if time.monotonic() - last_write >= HEARTBEAT:
+                self.broadcast(b": ping\n\n", None)
+                last_write = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def broadcast(self, payload, kind):
+        """
+        Write the same bytes to every client; drop the ones that stopped reading.
+        """
+        if kind is not None and self.on_broadcast:
+            self.on_broadcast(self, kind, self.version, payload)
+        for writer in list(self.clients):
+            if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+                self.clients.discard(writer)
+                self.dropped += 1
+                writer.transport.abort()
+                continue
+            writer.write(payload)
+
+    def close(self):
+        self.task.cancel()
+        for writer in self.clients:
+            writer.transport.abort()
+
+
+class StreamServer:
+    """
+    Minimal HTTP/1.1 server that only speaks the price event stream.
+    """
+
+    def __init__(self, interval=1.0, on_broadcast=None):
+        self.interval = interval
+        self.on_broadcast = on_broadcast
+        self.channels = {} # cache key ("BTC,ETH") -> Channel
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=0, backlog=4096):
+        self.server = await asyncio.start_server(self.handle, host, port, backlog=backlog)
+        return self.server.sockets[0].getsockname()[1]
+
+    def channel(self, symbols):
+        """
+        Return the Channel for a symbols string, or None if none of the symbols are known.
+        """
+        import crypto_api
+
+        known, _ = crypto_api.resolve_symbols(symbols) # Canonical and allow-listed, like the Lambda. Raises TooManySymbols.
+        if not known:
+            return None
+        key = ','.join(known)
+        if key not in self.channels:
+            self.channels[key] = Channel(key, self.interval, self.on_broadcast)
+        return self.channels[key]
+
+    async def handle(self, reader, writer):
+        import crypto_api
+        import price_stream
+
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) # Small events go out immediately.
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+
+        lines = head.decode('latin-1').split("\r\n")
+        method, target = lines[0].split(' ')[:2]
+        headers = dict(line.split(':', 1) for line in lines[1:] if ':' in line)
+        headers = {name.strip(): value.strip() for name, value in headers.items()}
+        url = urlparse(target)
+        query = dict(parse_qsl(url.query))
+
+        if method == 'OPTIONS':
+            writer.write(
+                b"HTTP/1.1 204 No Content\r\nAccess-Control-Allow-Origin: *\r\n"
+                b"Access-Control-Allow-Headers: Last-Event-ID\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+            )
+            await writer.drain()
+            writer.close()
+            return
+        if method != 'GET' or url.path not in STREAM_PATHS:
+            writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            writer.close()
+            return
+
+        try:
+            channel = self.channel(query.get('symbols') or 'BTC,ETH')
+        except ValueError:
+            channel = None
+        if channel is None:
+            writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            writer.close()
+            return
+        await channel.ready.wait()
+        event = {'headers': headers, 'queryStringParameters': query}
+        _, text = price_stream.update(price_stream.last_event_id(event), channel.prices)
+        writer.write(RESPONSE_HEAD + f"retry: {crypto_api.stream_retry_ms}\n\n".encode('utf-8') + text.encode('utf-8'))
+        channel.clients.add(writer)
+        try:
+            while await reader.read(1024): # Nothing more is expected; an empty read means the client went away.
+                pass
+        except ConnectionError:
+            pass
+        finally:
+            channel.clients.discard(writer)
+            writer.close()
+
+    async def close(self):
+        for channel in self.channels.values():
+            channel.close()
+        self.server.close()
+        await self.server.wait_closed()
+
+
+# ---------------------------------------------------------------------------------------------------------------
+# serve
+# ---------------------------------------------------------------------------------------------------------------
+
+async def serve(port, interval):
+    server = StreamServer(interval)
+    await server.start(port=port)
+    print(f"Streaming prices on http://127.0.0.1:{port}/crypto_api?symbols=BTC,ETH&stream=1 (Ctrl+C to stop)")
+    while True:
+        await asyncio.sleep(10)
+        connected = sum(len(channel.clients) for channel in server.channels.values())
+        print(f"{connected} clients on {len(server.channels)} channels", file=sys.stderr)
+
+
+# ---------------------------------------------------------------------------------------------------------------
+# bench
+# ---------------------------------------------------------------------------------------------------------------
+
+async def client(port, symbols, received, stop):
+    """
+    One simulated EventSource: reads events until stop is set, recording (event id, arrival time) for each.
+    """
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"GET /crypto_api?symbols={symbols}&stream=1 HTTP/1.1\r\nHost: local\r\nAccept: text/event-stream\r\n\r\n".encode('latin-1'))
+    await reader.readuntil(b"\r\n\r\n") # Response head
+    try:
+        while not stop.is_set():
+            block = await reader.readuntil(b"\n\n")
+            arrived = time.perf_counter()
+            for line in block.split(b"\n"):
+                if line.startswith(b"id: "):
+                    received.append((line[4:].decode('ascii'), arrived))
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def bench(clients, duration, interval, symbol_lists, connect_concurrency=200):
+    """
+    Connect `clients` streaming clients (spread over symbol_lists), let them listen for `duration` seconds
+    and measure how quickly each broadcast reached every client. Returns the report dict.
+    """
+    broadcasts = {} # event id -> (kind, sent at, payload bytes)
+
+    def on_broadcast(channel, kind, event_id, payload):
+        broadcasts[event_id] = (kind, time.perf_counter(), len(payload))
+
+    server = StreamServer(interval, on_broadcast)
+    port = await server.start(backlog=max(4096, clients))
+    stop = asyncio.Event()
+    received = [[] for _ in range(clients)]
+    gate = asyncio.Semaphore(connect_concurrency) # Don't overflow the listen backlog while connecting.
+
+    async def connect(number):
+        async with gate:
+            task = asyncio.ensure_future(client(port, symbol_lists[number % len(symbol_lists)], received[number], stop))
+            await asyncio.sleep(0) # Let it send its request before the next one starts.
+        return task
+
+    started = time.perf_counter()
+    tasks = await asyncio.gather(*(connect(number) for number in range(clients)))
+    while sum(len(channel.clients) for channel in server.channels.values()) < clients and time.perf_counter() - started < 30:
+        await asyncio.sleep(0.05)
+    connect_time = time.perf_counter() - started
+    connected = sum(len(channel.clients) for channel in server.channels.values())
+
+    await asyncio.sleep(duration)
+    stop.set()
+    dropped = sum(channel.dropped for channel in server.channels.values())
+    await server.close()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Fan-out latency: for every broadcast event a client got, arrival time - broadcast time.
+    latencies, spreads = [], {}
+    for events in received:
+        for event_id, arrived in events[1:]: # The first event is the client's own snapshot on connect.
+            if event_id in broadcasts:
+                took = arrived - broadcasts[event_id][1]
+                latencies.append(took)
+                spreads[event_id] = max(spreads.get(event_id, 0), took)
+    latencies.sort()
+
+    from local_api import percentile
+
+    sizes = {}
+    for kind, _, size in broadcasts.values():
+        sizes.setdefault(kind, []).append(size)
+    return {
+        'clients': clients,
+        'connected': connected,
+        'connect_s': round(connect_time, 2),
+        'channels': len(server.channels),
+        'broadcasts': len(broadcasts),
+        'deliveries': len(latencies),
+        'dropped': dropped,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'all_clients_ms': round(max(spreads.values(), default=0) * 1000, 2), # Slowest broadcast to reach its last client.
+        'bytes': {kind: round(sum(values) / len(values)) for kind, values in sizes.items()}
+    }
+
+
+def print_report(report, stubs):
+    print(f"{report['connected']}/{report['clients']} clients connected in {report['connect_s']} s "
+          f"on {report['channels']} channel(s), {report['dropped']} dropped")
+    print(f"{report['broadcasts']} broadcasts, {report['deliveries']} deliveries")
+    print(f"fan-out latency (ms): p50 {report['p50_ms']}  p95 {report['p95_ms']}  p99 {report['p99_ms']}  "
+          f"last client {report['all_clients_ms']}")
+    print(f"average event size (bytes): {report['bytes']}")
+    print(f"upstream: {stubs['cmc'].calls} CoinMarketCap calls for {report['clients']} clients")
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__))) # Handler modules live next to this file.
+
+    parser = argparse.ArgumentParser(description="Local asyncio price stream server and fan-out load test")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help="Serve the price stream on localhost")
+    serve_parser.add_argument('--port', type=int, default=3001)
+
+    bench_parser = commands.add_parser('bench', help="Fan-out load test with simulated clients")
+    bench_parser.add_argument('--clients', type=int, default=1000)
+    bench_parser.add_argument('--duration', type=float, default=10, help="Seconds to listen after connecting")
+    bench_parser.add_argument('--symbols', action='append', help="Symbol list per channel, repeatable (default: the frontend's list)")
+    bench_parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    for sub in (serve_parser, bench_parser):
+        sub.add_argument('--interval', type=float, default=1, help="Seconds between cache reads per channel")
+        sub.add_argument('--ttl', type=float, default=3, help="Price cache TTL (PRICE_CACHE_TTL) in seconds")
+        sub.add_argument('--no-latency', action='store_true', help="Stubs answer instantly (pure Python cost)")
+    args = parser.parse_args()
+
+    os.environ.setdefault('PRICE_CACHE_TTL', str(args.ttl)) # Read when crypto_api is imported.
+    import local_stubs
+
+    stubs = local_stubs.install(latency=not args.no_latency)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull if args.command == 'bench' else sys.stdout):
+        if args.command == 'serve':
+            with contextlib.suppress(KeyboardInterrupt):
+                asyncio.run(serve(args.port, args.interval))
+            sys.exit(0)
+        lists = args.symbols or ['BTC,ETH,BNB,LTC,DOGE,NEO,ADA,SOL,XRP,TRX']
+        report = asyncio.run(bench(args.clients, args.duration, args.interval, lists))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, stubs)
@@ -0,0 +1,550 @@
+import copy
+import json
+import os
+import random
+import re
+import threading
+import time
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+'''
+In-memory stand-ins for the AWS services and the CoinMarketCap API, for local runs and benchmarks (see local_api.py).
+
+    StubDynamoDB - resource + low-level client: get/put/update/delete_item, batch_get_item, batch_writer,
+                   condition and update expressions (the subset this backend uses), StubClientError on failed
+                   conditions (shaped like botocore's ClientError, so the stubs run without botocore installed).
+    StubSSM      - get_parameters, with a generated CloudFront key pair.
+    StubSES      - send_email, keeps the sent messages.
+    StubCMC      - a real HTTP server on 127.0.0.1 that answers /v1/cryptocurrency/quotes/latest,
+                   so cmc_client's session, timeouts and retries run unchanged.
+
+Every stub sleeps for a configurable latency per call, so the numbers look like a deployed function talking to
+real services over the network rather than like dict lookups. install() wires everything up through aws_clients.
+'''
+
+# Round-trip time per call in seconds, roughly what a Lambda in the same region sees.
+LATENCY = {
+    'dynamodb': 0.005,
+    'ssm': 0.015,
+    'ses': 0.060,
+    'cmc': 0.150
+}
+
+# Table name environment variable -> partition key, for every table the handlers can use.
+TABLE_KEYS = {
+    'DYNAMODB_TABLE': 'counter_id',
+    'PRICE_CACHE_TABLE': 'cache_key',
+    'PRICE_HISTORY_TABLE': 'series_id',
+    'RATE_LIMIT_TABLE': 'limit_key'
+}
+
+SYMBOLS = ['BTC', 'ETH', 'BNB', 'LTC', 'DOGE', 'NEO', 'ADA', 'SOL', 'XRP', 'TRX', 'DOT', 'AVAX', 'LINK', 'MATIC']
+
+
+class StubClientError(Exception):
+    """
+    Stand-in for botocore's ClientError: the same .response['Error']['Code'] and .operation_name the handlers
+    look at (see dynamo.conditional_check_failed).
+    """
+
+    def __init__(self, response, operation_name):
+        error = response['Error']
+        super().__init__(f"An error occurred ({error['Code']}) when calling the {operation_name} operation: {error['Message']}")
+        self.response, self.operation_name = response, operation_name
+
+
+def _client_error(code, operation):
+    """
+    Build the error DynamoDB would raise.
+    """
+    return StubClientError({'Error': {'Code': code, 'Message': f"{code} (local stub)"}}, operation)
+
+
+def _sleep(service):
+    delay = LATENCY.get(service, 0)
+    if delay:
+        time.sleep(delay)
+
+
+# ---------------------------------------------------------------------------------------------------------------
+# DynamoDB expressions
+# ---------------------------------------------------------------------------------------------------------------
+
+def _split_top(text, separator):
+    """
+    Split text on a separator that is not inside parentheses.
+    """
+    parts, depth, current = [], 0, ''
+    for char in text:
+        depth += (char == '(') - (char == ')')
+        if char == separator and depth == 0:
+            parts.append(current.strip())
+            current = ''
+        else:
+            current += char
+    parts.append(current.strip())
+    return parts
+
+
+class Expressions:
+    """
+    Evaluates the condition and update expressions of one request against an item.
+    """
+
+    def __init__(self, names=None, values=None):
+        self.names = names or {}
+        self.values = values or {}
+
+    def name(self, token):
+        return self.names.get(token, token)
+
+    def operand(self, item, text):
+        text = text.strip()
+        if text.startswith(':'):
+            return self.values[text]
+        match = re.fullmatch(r'if_not_exists\((.+?),(.+)\)', text)
+        if match:
+            current = item.get(self.name(match.group(1).strip()))
+            return current if current is not None else self.operand(item, match.group(2))
+        match = re.fullmatch(r'list_append\((.+)\)', text)
+        if match:
+            first, second = _split_top(match.group(1), ',')
+            return list(self.operand(item, first)) + list(self.operand(item, second))
+        for operator in ('+', '-'):
+            parts = _split_top(text, operator)
+            if len(parts) == 2:
+                left, right = self.operand(item, parts[0]), self.operand(item, parts[1])
+                return left + right if operator == '+' else left - right
+        return item.get(self.name(text))
+
+    def condition(self, item, text):
+        """
+        True if the condition holds. Supports OR / AND (no parentheses), attribute_(not_)exists and comparisons.
+        """
+        if not text:
+            return True
+        return any(
+            all(self._clause(item, clause) for clause in re.split(r'\s+AND\s+', alternative))
+            for alternative in re.split(r'\s+OR\s+', text)
+        )
+
+    def _clause(self, item, clause):
+        clause = clause.strip()
+        match = re.fullmatch(r'attribute_(not_)?exists\((.+)\)', clause)
+        if match:
+            exists = self.name(match.group(2).strip()) in item
+            return not exists if match.group(1) else exists
+        match = re.fullmatch(r'(.+?)\s*(<>|<=|>=|=|<|>)\s*(.+)', clause)
+        left, operator, right = match.group(1), match.group(2), match.group(3)
+        left, right = self.operand(item, left), self.operand(item, right)
+        if left is None or right is None:
+            return operator == '<>' and left != right
+        return {
+            '=': left == right, '<>': left != right, '<': left < right,
+            '<=': left <= right, '>': left > right, '>=': left >= right
+        }[operator]
+
+    def update(self, item, text):
+        """
+        Apply an update expression (SET / ADD / REMOVE clauses) to item in place. Returns the names it changed.
+        """
+        changed = []
+        for verb, body in re.findall(r'(SET|ADD|REMOVE)\s+(.+?)(?=\s+(?:SET|ADD|REMOVE)\s+|$)', text.strip()):
+            for action in _split_top(body, ','):
+                if verb == 'SET':
+                    target, value = action.split('=', 1)
+                    target = self.name(target.strip())
+                    item[target] = self.operand(item, value)
+                elif verb == 'ADD':
+                    target, value = action.split(None, 1)
+                    target = self.name(target)
+                    item[target] = item.get(target, 0) + self.values[value.strip()]
+                else:
+                    target = self.name(action)
+                    item.pop(target, None)
+                changed.append(target)
+        return changed
+
+
+def _plain(value):
+    """
+    Convert numbers to Decimal the way boto3 does, refusing floats like boto3 does.
+    """
+    if isinstance(value, float):
+        raise TypeError("Float types are not supported. Use Decimal types instead.")
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, list):
+        return [_plain(entry) for entry in value]
+    if isinstance(value, dict):
+        return {key: _plain(entry) for key, entry in value.items()}
+    return value
+
+
+def _typed(value):
+    """
+    Plain Python value -> low-level DynamoDB attribute value ({'S': ...}, {'N': ...}, ...).
+    """
+    if isinstance(value, bool):
+        return {'BOOL': value}
+    if value is None:
+        return {'NULL': True}
+    if isinstance(value, (int, Decimal)):
+        return {'N': str(value)}
+    if isinstance(value, (bytes, bytearray)):
+        return {'B': bytes(value)}
+    if isinstance(value, list):
+        return {'L': [_typed(entry) for entry in value]}
+    if isinstance(value, dict):
+        return {'M': {key: _typed(entry) for key, entry in value.items()}}
+    return {'S': str(value)}
+
+
+def _untyped(value):
+    """
+    Low-level DynamoDB attribute value -> plain Python value.
+    """
+    (kind, data), = value.items()
+    if kind == 'N':
+        return Decimal(data)
+    if kind == 'L':
+        return [_untyped(entry) for entry in data]
+    if kind == 'M':
+        return {key: _untyped(entry) for key, entry in data.items()}
+    if kind == 'NULL':
+        return None
+    return data
+
+
+class Binary(bytes):
+    """
+    boto3 hands binary attributes back wrapped in an object with a .value; bytes with .value behaves the same.
+    """
+
+    @property
+    def value(self):
+        return bytes(self)
+
+
+def _stored(value):
+    value = _plain(value)
+    return Binary(value) if isinstance(value, (bytes, bytearray)) else value
+
+
+class StubTable:
+    """
+    One DynamoDB table: a dict of items keyed by the partition key.
+    """
+
+    def __init__(self, db, name, key):
+        self.db, self.name, self.key = db, name, key
+        self.items = {}
+        self.meta = db.meta
+
+    def _key(self, Key):
+        return Key[self.key]
+
+    def get_item(self, Key, ConsistentRead=False, ProjectionExpression=None, ExpressionAttributeNames=None):
+        _sleep('dynamodb')
+        with self.db.lock:
+            item = self.items.get(self._key(Key))
+            if item is None:
+                return {}
+            return {'Item': _project(copy.deepcopy(item), ProjectionExpression, ExpressionAttributeNames)}
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None):
+        _sleep('dynamodb')
+        expressions = Expressions(ExpressionAttributeNames, _plain(ExpressionAttributeValues))
+        with self.db.lock:
+            current = self.items.get(self._key(Item), {})
+            if not expressions.condition(current, ConditionExpression):
+                raise _client_error('ConditionalCheckFailedException', 'PutItem')
+            self.items[self._key(Item)] = {name: _stored(value) for name, value in Item.items()}
+            self.db.writes += 1
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues='NONE'):
+        _sleep('dynamodb')
+        expressions = Expressions(ExpressionAttributeNames, _plain(ExpressionAttributeValues))
+        with self.db.lock:
+            current = self.items.get(self._key(Key), {})
+            if not expressions.condition(current, ConditionExpression):
+                raise _client_error('ConditionalCheckFailedException', 'UpdateItem')
+            item = dict(current, **_plain(Key))
+            changed = expressions.update(item, UpdateExpression)
+            self.items[self._key(Key)] = item
+            self.db.writes += 1
+            if ReturnValues == 'ALL_NEW':
+                return {'Attributes': copy.deepcopy(item)}
+            if ReturnValues == 'UPDATED_NEW':
+                return {'Attributes': {name: copy.deepcopy(item[name]) for name in changed if name in item}}
+            return {}
+
+    def delete_item(self, Key):
+        _sleep('dynamodb')
+        with self.db.lock:
+            self.items.pop(self._key(Key), None)
+            self.db.writes += 1
+        return {}
+
+    def batch_writer(self):
+        return _BatchWriter(self)
+
+
+class _BatchWriter:
+    """
+    Collects puts and applies them when the `with` block ends (one round trip, like BatchWriteItem).
+    """
+
+    def __init__(self, table):
+        self.table, self.items = table, []
+
+    def put_item(self, Item):
+        self.items.append(Item)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        _sleep('dynamodb')
+        with self.table.db.lock:
+            for item in self.items:
+                self.table.items[self.table._key(item)] = {name: _stored(value) for name, value in item.items()}
+                self.table.db.writes += 1
+        return False
+
+
+def _project(item, projection, names=None):
+    if not projection:
+        return item
+    names = names or {}
+    wanted = {names.get(name.strip(), name.strip()) for name in projection.split(',')}
+    return {name: value for name, value in item.items() if name in wanted}
+
+
+class _LowLevelClient:
+    """
+    The low-level client behind resource.meta.client: same data, typed attribute values.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def batch_get_item(self, RequestItems):
+        plain = {
+            name: dict(request, Keys=[{key: _untyped(value) for key, value in keys.items()} for keys in request['Keys']])
+            for name, request in RequestItems.items()
+        }
+        response = self.db.batch_get_item(plain)
+        response['Responses'] = {
+            name: [{key: _typed(value) for key, value in item.items()} for item in items]
+            for name, items in response['Responses'].items()
+        }
+        return response
+
+
+class StubDynamoDB:
+    """
+    Stands in for boto3.resource('dynamodb'). Tables must be created first (like the real thing).
+    """
+
+    def __init__(self):
+        self.tables = {}
+        self.lock = threading.RLock()
+        self.writes = 0
+        self.meta = type('Meta', (), {})()
+        self.meta.client = _LowLevelClient(self)
+
+    def create_table(self, name, key):
+        self.tables[name] = StubTable(self, name, key)
+        return self.tables[name]
+
+    def Table(self, name):
+        if name not in self.tables:
+            raise _client_error('ResourceNotFoundException', 'DescribeTable')
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems):
+        _sleep('dynamodb')
+        responses = {}
+        with self.lock:
+            for name, request in RequestItems.items():
+                table = self.Table(name)
+                responses[name] = [
+                    _project(copy.deepcopy(table.items[keys[table.key]]), request.get('ProjectionExpression'),
+                             request.get('ExpressionAttributeNames'))
+                    for keys in request['Keys'] if keys[table.key] in table.items
+                ]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+
+# ---------------------------------------------------------------------------------------------------------------
+# SSM and SES
+# ---------------------------------------------------------------------------------------------------------------
+
+def _private_key_pem():
+    """
+    Generate a throwaway 2048-bit RSA key in PEM form, with whichever RSA package is installed.
+    """
+    try:
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        return key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL, serialization.NoEncryption()
+        ).decode('utf-8')
+    except ImportError:
+        import rsa
+
+        return rsa.newkeys(2048)[1].save_pkcs1().decode('utf-8')
+
+
+class StubSSM:
+    """
+    Stands in for boto3.client('ssm') with the parameters the handlers read.
+    """
+
+    def __init__(self, parameters=None):
+        self.parameters = parameters if parameters is not None else {
+            '/lambda/market_cap_api_token': 'local-api-token',
+            '/cloudfront/key_pair_id': 'KLOCALSTUBKEYPAIR',
+            '/cloudfront/private_key': _private_key_pem()
+        }
+        self.calls = 0
+
+    def get_parameters(self, Names, WithDecryption=False):
+        _sleep('ssm')
+        self.calls += 1
+        return {
+            'Parameters': [{'Name': name, 'Value': self.parameters[name]} for name in Names if name in self.parameters],
+            'InvalidParameters': [name for name in Names if name not in self.parameters]
+        }
+
+    def get_parameter(self, Name, WithDecryption=False):
+        response = self.get_parameters([Name], WithDecryption)
+        if response['InvalidParameters']:
+            raise _client_error('ParameterNotFound', 'GetParameter')
+        return {'Parameter': response['Parameters'][0]}
+
+
+class StubSES:
+    """
+    Stands in for boto3.client('ses'). Sent messages are kept in .sent.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send_email(self, Source, Destination, Message, **kwargs):
+        _sleep('ses')
+        with self._lock:
+            self.sent.append({'from': Source, 'to': Destination['ToAddresses'], 'subject': Message['Subject']['Data']})
+            return {'MessageId': f"local-{len(self.sent)}"}
+
+
+# ---------------------------------------------------------------------------------------------------------------
+# CoinMarketCap
+# ---------------------------------------------------------------------------------------------------------------
+
+class StubCMC:
+    """
+    Local HTTP server that answers CoinMarketCap quote requests (randomly drifting prices) and the symbol listing.
+    """
+
+    def __init__(self, symbols=SYMBOLS, port=0):
+        self.prices = {symbol: random.uniform(0.1, 50000) for symbol in symbols}
+        self.calls = 0
+        self.faults = [] # Queued faults, one per request: an HTTP status (int) to fail with, or a delay (float seconds).
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # Keep-alive, like the real API.
+            disable_nagle_algorithm = True # Headers and body are separate writes; with Nagle every response waits ~40 ms for a delayed ACK.
+
+            def do_GET(self):
+                _sleep('cmc')
+                stub.calls += 1
+                fault = stub.faults.pop(0) if stub.faults else None
+                if isinstance(fault, float):
+                    time.sleep(fault) # Hangs before answering, like an overloaded upstream.
+                elif isinstance(fault, int):
+                    body = json.dumps({'status': {'error_code': fault, 'error_message': 'stub fault'}}).encode('utf-8')
+                    self.send_response(fault)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                url = urlparse(self.path)
+                if url.path.endswith('/map'): # Symbol listing (see symbol_registry.py)
+                    body = json.dumps({'data': stub.listing()}).encode('utf-8')
+                else:
+                    requested = parse_qs(url.query).get('symbol', [''])[0].split(',')
+                    body = json.dumps({'data': stub.quotes(requested)}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1/cryptocurrency/quotes/latest"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def quotes(self, symbols):
+        data = {}
+        for symbol in symbols:
+            if symbol in self.prices:
+                self.prices[symbol] *= random.uniform(0.999, 1.001)
+                data[symbol] = {'symbol': symbol, 'quote': {'USD': {'price': self.prices[symbol]}}}
+        return data
+
+    def listing(self):
+        return [{'id': number + 1, 'rank': number + 1, 'symbol': symbol, 'is_active': 1} for number, symbol in enumerate(self.prices)]
+
+    def close(self):
+        self.server.shutdown()
+
+
+# ---------------------------------------------------------------------------------------------------------------
+
+def install(latency=True):
+    """
+    Replace DynamoDB, SSM and SES with stubs and start a stub CoinMarketCap. Call before importing a handler.
+    Returns the stubs: {'dynamodb', 'ssm', 'ses', 'cmc'}.
+    """
+    import aws_clients
+
+    if not latency:
+        LATENCY.clear()
+
+    # The handlers read these at import time.
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    os.environ.setdefault('DYNAMODB_TABLE', 'ViewerCountTable')
+    os.environ.setdefault('SENDER_EMAIL', 'cv@example.com')
+    os.environ.setdefault('CLOUDFRONT_URL', 'https://dlocal.cloudfront.net/cv.pdf')
+
+    cmc = StubCMC()
+    os.environ['CMC_URL'] = cmc.url
+
+    dynamodb = StubDynamoDB()
+    for variable, key in TABLE_KEYS.items():
+        if os.environ.get(variable):
+            dynamodb.create_table(os.environ[variable], key)
+
+    stubs = {'dynamodb': dynamodb, 'ssm': StubSSM(), 'ses': StubSES(), 'cmc': cmc}
+    aws_clients.override('dynamodb', resource=dynamodb)
+    aws_clients.override('ssm', client=stubs['ssm'])
+    aws_clients.override('ses', client=stubs['ses'])
+    return stubs
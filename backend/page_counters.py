@@ -0,0 +1,264 @@
+import heapq
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import dynamo # Conditional write checks, see dynamo.py
+import tracing # Per-invocation stage timings, see tracing.py
+import view_counter # Atomic increments and batched reads, see view_counter.py
+
+'''
+Per-page and per-section view counters, next to the site-wide "page_views" counter.
+
+A view of /blog/post-1 (POST /viewer-count?path=/blog/post-1) adds one to three items:
+
+    page_views             -> the site total, as before (sharded with COUNTER_SHARDS)
+    page#/blog/post-1      -> this page
+    section#/blog          -> every page under /blog, /blog itself included ("/" has no section, its section
+                              would be the whole site)
+
+Every counter is its own item, so a write is one update_item no matter how many pages the site has, and reading
+any set of pages is one batch_get_item per 100 counters (read_counts), never a scan. Counts read from DynamoDB are
+kept in memory (an LRU of MAX_CACHED counters) for the read TTL, and every increment refreshes its own entry.
+
+Most viewed pages: a query over all page counters would need a scan, so the ranking is kept in one aggregate item
+("#top_pages") instead, holding the best `size` pages and sections with their counts. Nobody has to visit every
+counter to maintain it:
+
+    every increment returns the counter's new value -> remembered as a candidate in this container
+    every `interval` seconds (checked on the next view) -> the container merges its candidates into the aggregate:
+        read it, keep the highest count per page, keep the best `size`, conditional put on the version it read
+        (a concurrent update from another container makes the put fail, and we merge again on the new copy)
+
+Counts only ever grow, so any page that belongs in the top `size` is reported by the next container that counts a
+view of it. A top-N read (read_top) is one get_item, cached like the other reads. The ranking lags by up to
+`interval` seconds plus the read TTL, and views still in a container that is recycled before its next merge only
+show up in the ranking with that page's next view.
+'''
+
+PAGE_PREFIX = 'page'
+SECTION_PREFIX = 'section'
+TOP_KEY = '#top_pages' # Can't collide with a counter: those start with a letter.
+SEGMENT_PATTERN = re.compile(r'^[A-Za-z0-9._~%+-]+$') # Unreserved URL characters plus percent-encoding.
+MAX_PATH_LENGTH = 200
+MAX_CACHED = 10000 # Counters kept in memory, ~1 MB at most.
+MAX_CANDIDATES = 2000 # Candidates kept between merges; the lowest half is dropped when it overflows.
+MERGE_ATTEMPTS = 3
+
+_counts = OrderedDict() # counter key -> (count, monotonic seconds it expires), least recently used first
+_candidates = {} # counter key -> latest count this container saw, not merged into the aggregate yet
+_top = {} # the parsed aggregate item and when it expires
+_merged_at = time.monotonic() # A container merges after its first `interval`, not on its first view.
+_lock = threading.Lock()
+
+
+class InvalidPath(ValueError):
+    """
+    Raised for a path we don't keep a counter for, or too many paths in one request.
+    """
+
+
+def normalize_path(path):
+    """
+    Turn a page path into the form its counter is keyed on: "/blog//post-1/?a=1" -> "/blog/post-1".
+    """
+    path = str(path).split('?', 1)[0].split('#', 1)[0].strip()
+    if not path.startswith('/') or len(path) > MAX_PATH_LENGTH:
+        raise InvalidPath(f"Invalid path: {path[:MAX_PATH_LENGTH]!r}")
+    segments = [segment for segment in path.split('/') if segment]
+    if segments and segments[-1] in ('index.html', 'index.htm'):
+        segments.pop() # /blog/index.html is the same page as /blog
+    for segment in segments:
+        if segment in ('.', '..') or not SEGMENT_PATTERN.match(segment):
+            raise InvalidPath(f"Invalid path: {path!r}")
+    return '/' + '/'.join(segments)
+
+
+def section_of(path):
+    """
+    Return the section of a normalized path ("/blog/post-1" -> "/blog"), or None for "/".
+    """
+    return None if path == '/' else '/' + path.split('/')[1]
+
+
+def page_key(path):
+    return f"{PAGE_PREFIX}#{path}"
+
+
+def section_key(section):
+    return f"{SECTION_PREFIX}#{section}"
+
+
+def parse_paths(text, max_paths, sections=False):
+    """
+    Split a comma separated list of paths (or sections) into unique normalized ones. Raises InvalidPath.
+    """
+    paths = list(dict.fromkeys(normalize_path(path) for path in str(text).split(',') if path.strip()))
+    if len(paths) > max_paths:
+        raise InvalidPath(f"Too many paths: {len(paths)} requested, at most {max_paths} allowed")
+    if sections:
+        for path in paths:
+            if section_of(path) != path:
+                raise InvalidPath(f"Not a section: {path!r} (sections are one level deep, like /blog)")
+    return paths
+
+
+def _remember(key, count, expires):
+    """
+    Cache a counter value. Caller must hold _lock.
+    """
+    _counts[key] = (count, expires)
+    _counts.move_to_end(key)
+    while len(_counts) > MAX_CACHED:
+        _counts.popitem(last=False)
+
+
+def read_counts(dynamodb, table_name, paths=(), sections=(), ttl=10.0):
+    """
+    Return ({path: views}, {section: views}). Counters younger than ttl come from memory, the rest from
+    eventually consistent batch_get_item calls. A counter that doesn't exist yet reads as 0.
+    """
+    keys = [page_key(path) for path in paths] + [section_key(section) for section in sections]
+    now = time.monotonic()
+    counts, missing = {}, []
+    with _lock:
+        for key in keys:
+            cached = _counts.get(key)
+            if cached and cached[1] > now:
+                counts[key] = cached[0]
+                _counts.move_to_end(key)
+            else:
+                missing.append(key)
+
+    tracing.outcome('page_cache', 'MISS' if len(missing) == len(keys) else 'PARTIAL' if missing else 'HIT')
+    if missing:
+        with tracing.stage('dynamodb'):
+            counts.update(view_counter.read_counts(dynamodb, table_name, missing, consistent=False))
+        with _lock:
+            for key in missing:
+                _remember(key, counts[key], now + ttl)
+
+    return (
+        {path: counts[page_key(path)] for path in paths},
+        {section: counts[section_key(section)] for section in sections}
+    )
+
+
+def record_view(path, add, ttl=10.0):
+    """
+    Count one view of a normalized path: add(counter_key) -> new count is called for the page and its section.
+    Returns (page views, section views or None).
+    """
+    section = section_of(path)
+    page_views = add(page_key(path))
+    section_views = add(section_key(section)) if section else None
+
+    expires = time.monotonic() + ttl
+    with _lock:
+        for key, count in ((page_key(path), page_views), (section_key(section), section_views)):
+            if count is None:
+                continue
+            _remember(key, count, expires)
+            _candidates[key] = count
+        if len(_candidates) > MAX_CANDIDATES:
+            for key, _ in heapq.nsmallest(len(_candidates) // 2, _candidates.items(), key=lambda entry: entry[1]):
+                del _candidates[key]
+    return page_views, section_views
+
+
+def merge_top(current, candidates, prefix, size):
+    """
+    Merge [[name, count], ...] with the candidate counters of one kind and return the best `size`, highest first.
+    """
+    counts = {name: int(count) for name, count in current}
+    for key, count in candidates.items():
+        kind, _, name = key.partition('#')
+        if kind == prefix:
+            counts[name] = max(counts.get(name, 0), count)
+    return [[name, count] for name, count in heapq.nsmallest(size, counts.items(), key=lambda entry: (-entry[1], entry[0]))]
+
+
+def merge_candidates(table, size):
+    """
+    Merge this container's candidates into the aggregate item. Returns True once it is written.
+    On failure the candidates are kept for the next attempt.
+    """
+    global _candidates
+
+    with _lock:
+        candidates, _candidates = _candidates, {}
+    if not candidates:
+        return False
+
+    try:
+        for _ in range(MERGE_ATTEMPTS):
+            item = table.get_item(Key={'counter_id': TOP_KEY}, ConsistentRead=True).get('Item') or {}
+            version = int(item.get('version', 0))
+            try:
+                table.put_item(
+                    Item={
+                        'counter_id': TOP_KEY,
+                        'pages': json.dumps(merge_top(json.loads(item.get('pages', '[]')), candidates, PAGE_PREFIX, size), separators=(',', ':')),
+                        'sections': json.dumps(merge_top(json.loads(item.get('sections', '[]')), candidates, SECTION_PREFIX, size), separators=(',', ':')),
+                        'version': version + 1,
+                        'updated_at': int(time.time())
+                    },
+                    ConditionExpression='attribute_not_exists(counter_id) OR #version = :version', # Optimistic lock on the copy we merged into.
+                    ExpressionAttributeNames={'#version': 'version'},
+                    ExpressionAttributeValues={':version': version}
+                )
+                return True
+            except Exception as e:
+                if not dynamo.conditional_check_failed(e):
+                    raise
+        raise RuntimeError(f"lost the race for {TOP_KEY} {MERGE_ATTEMPTS} times")
+    except Exception:
+        with _lock:
+            for key, count in candidates.items():
+                _candidates[key] = max(_candidates.get(key, 0), count)
+        raise
+
+
+def maybe_merge(table, size, interval):
+    """
+    Merge the candidates if the last merge of this container is more than `interval` seconds ago. Never raises.
+    """
+    global _merged_at
+    now = time.monotonic()
+    with _lock:
+        if now - _merged_at < interval or not _candidates:
+            return
+        _merged_at = now
+    try:
+        with tracing.stage('top_pages'):
+            merge_candidates(table, size)
+    except Exception as e:
+        print(f"Top pages merge failed, keeping {len(_candidates)} candidates: {str(e)}")
+
+
+def read_top(table, limit, by=PAGE_PREFIX, ttl=10.0):
+    """
+    Return the `limit` most viewed pages (or sections, by="section") from the aggregate item, cached for ttl seconds.
+    """
+    global _top
+    now = time.monotonic()
+    with _lock:
+        top = _top if _top and _top['expires'] > now else None
+    if top is None:
+        with tracing.stage('dynamodb'):
+            item = table.get_item(Key={'counter_id': TOP_KEY}).get('Item') or {}
+        top = {
+            PAGE_PREFIX: json.loads(item.get('pages', '[]')),
+            SECTION_PREFIX: json.loads(item.get('sections', '[]')),
+            'updated_at': int(item['updated_at']) if 'updated_at' in item else None,
+            'expires': now + ttl
+        }
+        with _lock:
+            _top = top
+    return {
+        'top': [{'path': name, 'views': count} for name, count in top[by][:limit]],
+        'by': by,
+        'updated_at': top['updated_at']
+    }
@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+
+import aws_clients # Lazy, shared boto3 clients, see aws_clients.py
+import tracing # Per-invocation stage timings, see tracing.py
+
+'''
+Shared SSM Parameter Store cache for all handlers.
+
+Parameters (API tokens, the CloudFront private key, ...) hardly ever change, but calling get_parameter on every
+request costs an SSM round trip each time. Values are kept at module level for PARAM_CACHE_TTL seconds,
+so warm invocations don't call SSM at all, and cache misses are loaded with a single batched
+get_parameters call (up to 10 names per call) instead of one call per name.
+
+get_parsed() goes one step further and keeps the *parsed* form of a value (e.g. an rsa.PrivateKey), so
+expensive parsing like loading a PEM key only runs again when the underlying value actually changes.
+
+invalidate() drops cached values, e.g. after rotating a secret.
+
+The SSM client itself is only built on the first cache miss (aws_clients), so a warm cache never needs it.
+'''
+
+DEFAULT_TTL = float(os.environ.get('PARAM_CACHE_TTL', '300'))
+MAX_NAMES_PER_CALL = 10 # SSM get_parameters accepts at most 10 names.
+
+_values = {} # name -> {'value': str, 'fetched_at': monotonic seconds}
+_parsed = {} # (name, parser) -> (raw value it was parsed from, parsed object)
+_lock = threading.Lock()
+
+
+def get_parameters(names, ttl=DEFAULT_TTL):
+    """
+    Return {name: value} for the given parameter names, fetching only missing or expired ones from SSM.
+    """
+    now = time.monotonic()
+    with _lock:
+        result = {name: _values[name]['value'] for name in names if name in _values and now - _values[name]['fetched_at'] <= ttl}
+    missing = [name for name in dict.fromkeys(names) if name not in result]
+
+    for start in range(0, len(missing), MAX_NAMES_PER_CALL):
+        chunk = missing[start:start + MAX_NAMES_PER_CALL]
+        with tracing.stage('ssm'):
+            response = aws_clients.client('ssm').get_parameters(Names=chunk, WithDecryption=True) # WithDecryption=True decrypts SecureString parameters.
+        if response.get('InvalidParameters'):
+            raise KeyError(f"Parameters not found: {', '.join(response['InvalidParameters'])}")
+        with _lock:
+            for parameter in response['Parameters']:
+                _values[parameter['Name']] = {'value': parameter['Value'], 'fetched_at': now}
+                result[parameter['Name']] = parameter['Value']
+    return result
+
+
+def get_parameter(name, ttl=DEFAULT_TTL):
+    """
+    Return the value of one parameter (cached).
+    """
+    return get_parameters([name], ttl)[name]
+
+
+def get_parsed(name, parse, ttl=DEFAULT_TTL):
+    """
+    Return parse(value) for a parameter, re-running parse only when the value changes.
+    """
+    value = get_parameter(name, ttl)
+    key = (name, parse)
+    with _lock:
+        cached = _parsed.get(key)
+        if cached and cached[0] == value:
+            return cached[1]
+    parsed = parse(value)
+    with _lock:
+        _parsed[key] = (value, parsed)
+    return parsed
+
+
+def invalidate(name=None):
+    """
+    Forget one cached parameter (and its parsed forms), or everything when name is None.
+    """
+    with _lock:
+        if name is None:
+            _values.clear()
+            _parsed.clear()
+            return
+        _values.pop(name, None)
+        for key in [key for key in _parsed if key[0] == name]:
+            del _parsed[key]
@@ -0,0 +1,241 @@
+import json
+import threading
+import time
+from concurrent.futures import Future
+
+import dynamo # Batched reads, see dynamo.py
+import tracing # Per-invocation stage timings, see tracing.py
+
+'''
+Two-tier, per-symbol TTL cache for crypto prices.
+
+Tier 1 is a plain dict at module level. Lambda keeps the module loaded between warm invocations of the same container,
+so repeat requests to that container never leave the process.
+Tier 2 is an optional DynamoDB table shared by every container (set PRICE_CACHE_TABLE to enable it).
+The shared tier is only ever an optimization: if it can't be read we go on with memory and upstream, and if it can't
+be written the prices are still served from memory. Either failure is logged and counted ("price_cache_errors"),
+never turned into an error response for a request the upstream answered.
+
+Prices are cached per symbol, not per request string. "BTC,ETH" and "BTC,ETH,SOL" share the BTC and ETH entries,
+and a request only sends the symbols we don't have to CoinMarketCap, all in one batched call.
+
+Every entry remembers when it was fetched, and its age decides what we do with it:
+
+    age <= ttl                      -> fresh, serve it (HIT)
+    ttl < age <= ttl + stale_ttl    -> serve it anyway and refresh in the background (STALE)
+    older / missing                 -> fetch upstream and wait for it (MISS)
+    upstream fails, age <= stale_if_error -> serve the old prices rather than an error (STALE-ERROR)
+
+Symbols the upstream doesn't know are cached too (with price None), so they don't cost an API credit on every request.
+
+Concurrent misses for the same symbol inside one container are coalesced: the first caller fetches,
+everyone else waits on its Future instead of sending their own upstream request.
+
+Lambda freezes the process as soon as the handler returns, so a background refresh that doesn't finish in time
+simply carries on when the container is thawed for its next invocation.
+'''
+
+HIT, MISS, STALE, STALE_ERROR = 'HIT', 'MISS', 'STALE', 'STALE-ERROR'
+
+_memory = {} # symbol -> {'price': float or None, 'fetched_at': epoch seconds}
+_inflight = {} # symbol -> Future of the upstream fetch currently loading it
+_lock = threading.Lock()
+_stats = {HIT: 0, MISS: 0, STALE: 0, STALE_ERROR: 0} # Per-container outcome counters, reported in the response headers.
+
+
+def normalize_symbols(symbols):
+    """
+    Turn a symbols string ("eth, BTC,btc") into a sorted list of unique upper-case symbols (["BTC", "ETH"]).
+    """
+    return sorted({symbol.strip().upper() for symbol in symbols.split(',') if symbol.strip()})
+
+
+def cache_key(symbols):
+    """
+    Normalize a symbols string into a stable key ("BTC,ETH").
+    """
+    return ','.join(normalize_symbols(symbols))
+
+
+def _read(symbols, table, ttl):
+    """
+    Look up entries in memory first, then fetch whatever is missing or expired from the shared table in one batch.
+    """
+    now = time.time()
+    entries = {symbol: _memory[symbol] for symbol in symbols if symbol in _memory}
+    missing = [symbol for symbol in symbols if symbol not in entries or now - entries[symbol]['fetched_at'] > ttl]
+    if not missing or table is None:
+        return entries
+
+    try:
+        client = table.meta.client # The low-level client has batch_get_item, the Table resource doesn't.
+        with tracing.stage('dynamodb'):
+            items = list(dynamo.get_items(client, table.name, [{'cache_key': {'S': symbol}} for symbol in missing]))
+    except Exception as e:
+        _shared_tier_failed('read', missing, e)
+        return entries
+    for item in items:
+        # Low-level responses are typed: {'S': 'text'} for strings, {'N': '123.4'} for numbers.
+        symbol = item['cache_key']['S']
+        entry = {'price': json.loads(item['price']['S']), 'fetched_at': float(item['fetched_at']['N'])}
+        if symbol not in entries or entry['fetched_at'] > entries[symbol]['fetched_at']: # Another container (or the pre-warmer) has newer prices.
+            entries[symbol] = _memory[symbol] = entry
+    return entries
+
+
+def _write(symbols, prices, table, expire_after):
+    """
+    Store freshly fetched prices in memory and, if configured, in the shared table.
+    """
+    now = time.time()
+    entries = {symbol: {'price': prices.get(symbol), 'fetched_at': now} for symbol in symbols}
+    _memory.update(entries)
+    if table is not None:
+        try:
+            with tracing.stage('dynamodb'), table.batch_writer() as batch: # Groups the puts into BatchWriteItem calls of up to 25 items.
+                for symbol, entry in entries.items():
+                    batch.put_item(Item={
+                        'cache_key': symbol,
+                        'price': json.dumps(entry['price']), # Stored as a JSON string, DynamoDB would otherwise turn every float into a Decimal.
+                        'fetched_at': str(now),
+                        'expires_at': int(now + expire_after) # Attribute used by DynamoDB TTL to clean up old entries.
+                    })
+        except Exception as e:
+            _shared_tier_failed('write', symbols, e) # Other containers fetch these themselves until a write succeeds.
+    return entries
+
+
+def _shared_tier_failed(action, symbols, error):
+    """
+    Log and count a failed read or write of the shared table. The caller carries on without it.
+    """
+    tracing.count('price_cache_errors')
+    print(f"Shared price cache {action} of {','.join(symbols)} failed: {str(error)}")
+
+
+def _fetch_coalesced(symbols, fetch, table, expire_after):
+    """
+    Fetch symbols upstream in one batched call, joining any fetch already in flight for some of them.
+    """
+    waiting = {}
+    mine = []
+    with _lock:
+        for symbol in symbols:
+            if symbol in _inflight:
+                waiting[symbol] = _inflight[symbol]
+            else:
+                mine.append(symbol)
+        if mine:
+            future = Future()
+            for symbol in mine:
+                _inflight[symbol] = future
+
+    entries = {}
+    if mine:
+        try:
+            entries = _write(mine, fetch(','.join(mine)), table, expire_after)
+            future.set_result(entries)
+        except Exception as e:
+            future.set_exception(e) # Callers waiting on us see the same error.
+            raise
+        finally:
+            with _lock:
+                for symbol in mine:
+                    if _inflight.get(symbol) is future:
+                        del _inflight[symbol]
+
+    for symbol, other in waiting.items():
+        entries[symbol] = other.result()[symbol]
+    return entries
+
+
+def _refresh(symbols, fetch, table, expire_after):
+    """
+    Background revalidation of stale symbols. Errors only get logged, the stale entries stay in place.
+    """
+    try:
+        _fetch_coalesced(symbols, fetch, table, expire_after)
+    except Exception as e:
+        print(f"Background refresh of {','.join(symbols)} failed: {str(e)}")
+
+
+def get_prices(symbols, fetch, ttl=60, stale_ttl=300, stale_if_error=3600, table=None, cache_only=False):
+    """
+    Return (prices, outcome) for a symbols string, calling fetch() only for the symbols the cache can't answer.
+
+    With cache_only=True nothing is ever fetched: the pre-warmer keeps the cache filled, and symbols that aren't
+    cached (or are older than stale_if_error) are simply left out of the result.
+    """
+    wanted = normalize_symbols(symbols)
+    entries = _read(wanted, table, ttl)
+    now = time.time()
+    expire_after = ttl + max(stale_ttl, stale_if_error)
+
+    fresh, stale, missing = [], [], []
+    for symbol in wanted:
+        entry = entries.get(symbol)
+        age = now - entry['fetched_at'] if entry else None
+        if entry and age <= ttl:
+            fresh.append(symbol)
+        elif entry and age <= ttl + stale_ttl:
+            stale.append(symbol)
+        else:
+            missing.append(symbol)
+
+    if cache_only:
+        usable = [symbol for symbol in wanted if symbol in entries and now - entries[symbol]['fetched_at'] <= stale_if_error]
+        prices = {symbol: entries[symbol]['price'] for symbol in usable if entries[symbol]['price'] is not None}
+        return prices, _count(HIT if len(fresh) == len(wanted) else STALE)
+
+    outcome = HIT
+    if stale:
+        with _lock:
+            stale_to_refresh = [symbol for symbol in stale if symbol not in _inflight]
+        if stale_to_refresh:
+            threading.Thread(target=_refresh, args=(stale_to_refresh, fetch, table, expire_after), daemon=True).start()
+        outcome = STALE
+
+    if missing:
+        try:
+            entries.update(_fetch_coalesced(missing, fetch, table, expire_after))
+            outcome = MISS
+        except Exception:
+            if not all(symbol in entries and now - entries[symbol]['fetched_at'] <= stale_if_error for symbol in missing):
+                raise
+            outcome = STALE_ERROR
+
+    prices = {symbol: entries[symbol]['price'] for symbol in wanted if entries[symbol]['price'] is not None}
+    return prices, _count(outcome)
+
+
+def publish(symbols, fetch, ttl=60, stale_ttl=300, stale_if_error=3600, table=None):
+    """
+    Fetch symbols upstream in one batched call and store them in every cache tier, whatever their current age.
+    Used by the scheduled pre-warmer. Returns {symbol: price}.
+    """
+    expire_after = ttl + max(stale_ttl, stale_if_error)
+    entries = _fetch_coalesced(normalize_symbols(symbols), fetch, table, expire_after)
+    return {symbol: entry['price'] for symbol, entry in entries.items() if entry['price'] is not None}
+
+
+def _count(outcome):
+    """
+    Record a cache outcome and return it.
+    """
+    with _lock:
+        _stats[outcome] += 1
+    return outcome
+
+
+def stats_headers(outcome):
+    """
+    Build response headers describing this request's cache outcome and the container's running ratios.
+    """
+    with _lock:
+        total = sum(_stats.values()) or 1
+        return {
+            'X-Cache': outcome,
+            'X-Cache-Hit-Ratio': f"{_stats[HIT] / total:.3f}",
+            'X-Cache-Miss-Ratio': f"{_stats[MISS] / total:.3f}",
+            'X-Cache-Stale-Ratio': f"{(_stats[STALE] + _stats[STALE_ERROR]) / total:.3f}"
+        }
@@ -0,0 +1,150 @@
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import dynamo # Batched reads, see dynamo.py
+
+'''
+Historical price time series, stored in DynamoDB and bucketed by symbol and hour.
+
+Every quote we fetch from CoinMarketCap is appended to the item for its symbol and UTC hour:
+
+    {"series_id": "BTC#2026-10-18T14", "ts": [1760796000, 1760796060, ...], "px": [67012.5, 67020.1, ...]}
+
+Two parallel lists keep the item compact (no attribute names repeated per point) and a single
+update_item with list_append adds a point without reading the item first.
+An hour of one-minute quotes is ~60 points, far below the 400 KB item limit.
+
+DynamoDB has no batch form of update_item, so a fetch of N symbols is N writes. They run in parallel on a small
+module-level pool, which makes them cost about one round trip. The request path doesn't even wait for that
+(wait=False): the points are queued and the response goes out. A container that Lambda freezes right after the
+response finishes those writes when it is thawed, and one that is recycled first loses them, which costs at most a
+point or two per symbol. The scheduled pre-warmer, where nobody waits on the answer, writes with wait=True.
+
+A range query reads the hour items it needs with batch_get_item and downsamples them into OHLC candles in plain
+Python: at most 7 days of one-minute points (~10000 per symbol), a single sorted pass, and no NumPy to ship.
+'''
+
+MAX_RANGE = timedelta(days=7) # 168 hour items, two batch_get_item calls.
+UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+MAX_WRITERS = 8 # Parallel update_item calls per container.
+
+_pool = None # ThreadPoolExecutor for the writes, built on the first append so importing this module stays cheap.
+_pool_lock = threading.Lock()
+
+
+def parse_duration(text):
+    """
+    Parse "30s", "5m", "24h" or "7d" into a timedelta. Raises ValueError for anything else.
+    """
+    match = re.fullmatch(r'\s*(\d+)\s*([smhd])\s*', text or '')
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Invalid duration '{text}', expected e.g. 5m, 24h or 7d")
+    return timedelta(seconds=int(match.group(1)) * UNITS[match.group(2)])
+
+
+def series_id(symbol, moment):
+    """
+    Return the partition key of the hour bucket that `moment` (a UTC datetime) falls in.
+    """
+    return f"{symbol}#{moment.strftime('%Y-%m-%dT%H')}"
+
+
+def _append_point(table, symbol, price, fetched_at):
+    table.update_item(
+        Key={'series_id': series_id(symbol, fetched_at)},
+        UpdateExpression='SET ts = list_append(if_not_exists(ts, :empty), :ts), px = list_append(if_not_exists(px, :empty), :px)',
+        ExpressionAttributeValues={
+            ':empty': [],
+            ':ts': [int(fetched_at.timestamp())],
+            ':px': [Decimal(str(price))] # boto3 refuses floats, DynamoDB numbers go in as Decimal.
+        }
+    )
+
+
+def _writers():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from concurrent.futures import ThreadPoolExecutor # Loads concurrent.futures.thread, only the write path needs it.
+            _pool = ThreadPoolExecutor(max_workers=MAX_WRITERS, thread_name_prefix='history')
+        return _pool
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        print(f"Failed to record price history: {str(future.exception())}")
+
+
+def append(table, prices, fetched_at=None, wait=True):
+    """
+    Append one point per symbol to its current hour bucket, all symbols in parallel.
+    With wait=True, returns once every point is written and raises the first error. With wait=False, returns at once
+    and failures are only logged.
+    """
+    fetched_at = fetched_at or datetime.now(timezone.utc)
+    pool = _writers()
+    futures = [pool.submit(_append_point, table, symbol, price, fetched_at) for symbol, price in prices.items() if price is not None]
+    for future in futures:
+        if wait:
+            future.result()
+        else:
+            future.add_done_callback(_log_failure)
+
+
+def load_points(dynamodb, table_name, symbol, start, end):
+    """
+    Return (timestamps, prices) lists for a symbol covering two UTC datetimes (whole hours, unsorted).
+    """
+    keys = []
+    hour = start.replace(minute=0, second=0, microsecond=0)
+    while hour <= end:
+        keys.append(series_id(symbol, hour))
+        hour += timedelta(hours=1)
+
+    timestamps, prices = [], []
+    for item in dynamo.get_items(dynamodb, table_name, [{'series_id': key} for key in keys]):
+        timestamps.extend(int(value) for value in item.get('ts', []))
+        prices.extend(float(value) for value in item.get('px', []))
+    return timestamps, prices
+
+
+def ohlc(timestamps, prices, start, end, resolution):
+    """
+    Downsample points into OHLC candles of `resolution` between start and end.
+    """
+    start_ts, end_ts, step = int(start.timestamp()), int(end.timestamp()), int(resolution.total_seconds())
+    origin = start_ts - start_ts % step # Align candles to round times (e.g. :00, :05, :10 for 5m).
+    points = sorted(
+        ((int(t), float(p)) for t, p in zip(timestamps, prices) if start_ts <= t <= end_ts),
+        key=lambda point: point[0] # Hour items come back from DynamoDB in no particular order; stable for equal times.
+    )
+
+    candles = []
+    for t, price in points:
+        candle_start = origin + (t - origin) // step * step
+        if candles and candles[-1]['t'] == candle_start:
+            candle = candles[-1]
+            candle['high'] = max(candle['high'], price)
+            candle['low'] = min(candle['low'], price)
+            candle['close'] = price
+        else:
+            candles.append({'t': candle_start, 'open': price, 'high': price, 'low': price, 'close': price})
+    return candles
+
+
+def query(dynamodb, table_name, symbol, range_text='24h', resolution_text='5m', now=None):
+    """
+    Return the OHLC candles for the last `range_text` of a symbol at `resolution_text` resolution.
+    """
+    span, resolution = parse_duration(range_text), parse_duration(resolution_text)
+    if span > MAX_RANGE:
+        raise ValueError(f"Range can be at most {MAX_RANGE.days} days")
+    if resolution > span:
+        raise ValueError("Resolution can't be larger than the range")
+
+    end = now or datetime.now(timezone.utc)
+    start = end - span
+    timestamps, prices = load_points(dynamodb, table_name, symbol, start, end)
+    return ohlc(timestamps, prices, start, end, resolution)
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+'''
+Server-Sent Events (SSE) encoding of price updates: a full snapshot first, then only the symbols that changed.
+
+A browser opens the stream with
+    new EventSource(".../crypto_api?symbols=BTC,ETH&stream=1")
+and receives text like
+
+    retry: 15000
+    id: 3f1c2a9e0b7d4c11
+    event: snapshot
+    data: {"prices":{"BTC":67012.5,"ETH":2401.1},"ts":1760796000}
+
+    id: 9a02b6c4e1f35d70
+    event: diff
+    data: {"changed":{"BTC":67020.1},"removed":[],"ts":1760796015}
+
+Every event carries an id: the version of the full price set it brings the client to (a hash of the prices).
+EventSource remembers the last id and sends it back as the Last-Event-ID header when it reconnects, so the server
+knows which prices the client already has and only sends the difference. An unchanged price set sends no event.
+
+The versions we handed out are kept in a small in-memory table (per container). A client whose version isn't in it
+(a different container, or too old) simply gets a fresh snapshot, which is always correct.
+
+On Lambda behind API Gateway (REST) the response is buffered, so one invocation answers one reconnect: the body is
+a short event stream and "retry" tells EventSource when to reconnect. A long-lived host (see local_stream.py) keeps
+the connection open and pushes the same events to every client as they happen. Either way the prices come from
+price_cache, so the upstream cost doesn't grow with the number of viewers.
+'''
+
+SNAPSHOT, DIFF = 'snapshot', 'diff'
+MAX_VERSIONS = 256 # Price sets remembered for diffs. A few per symbol list and refresh is plenty.
+
+_versions = OrderedDict() # version -> {symbol: price}, oldest first
+_lock = threading.Lock()
+
+
+def version(prices):
+    """
+    Short, stable id of a price set (same prices -> same id, in any container).
+    """
+    encoded = json.dumps(prices, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()[:16]
+
+
+def remember(prices):
+    """
+    Store a price set so later requests can diff against it. Returns its version.
+    """
+    key = version(prices)
+    with _lock:
+        _versions[key] = dict(prices)
+        _versions.move_to_end(key)
+        while len(_versions) > MAX_VERSIONS:
+            _versions.popitem(last=False)
+    return key
+
+
+def recall(key):
+    """
+    Return the price set for a version, or None if this container doesn't know it.
+    """
+    with _lock:
+        prices = _versions.get(key)
+        return dict(prices) if prices is not None else None
+
+
+def diff(previous, current):
+    """
+    Return the symbols whose price changed (or appeared) and the symbols that are gone.
+    """
+    changed = {symbol: price for symbol, price in current.items() if previous.get(symbol) != price}
+    removed = sorted(symbol for symbol in previous if symbol not in current)
+    return changed, removed
+
+
+def format_event(data, event=None, event_id=None, retry_ms=None):
+    """
+    Encode one SSE event. data is serialized to compact JSON on a single "data:" line.
+    """
+    lines = []
+    if retry_ms is not None:
+        lines.append(f"retry: {int(retry_ms)}")
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    lines.append('data: ' + json.dumps(data, separators=(',', ':')))
+    return '\n'.join(lines) + '\n\n'
+
+
+def update(previous_version, prices, now=None):
+    """
+    Build the event that brings a client at previous_version up to prices.
+
+    Returns (kind, event text), kind being 'snapshot', 'diff' or None when nothing changed (event text is then '').
+    """
+    now = int(now if now is not None else time.time())
+    current_version = remember(prices)
+    if previous_version == current_version:
+        return None, ''
+
+    previous = recall(previous_version) if previous_version else None
+    if previous is None:
+        return SNAPSHOT, format_event({'prices': prices, 'ts': now}, SNAPSHOT, current_version)
+
+    changed, removed = diff(previous, prices)
+    return DIFF, format_event({'changed': changed, 'removed': removed, 'ts': now}, DIFF, current_version)
+
+
+def last_event_id(event):
+    """
+    Return the version a reconnecting client already has: the Last-Event-ID header, or ?lastEventId= for clients
+    that can't set headers (EventSource polyfills).
+    """
+    headers = (event or {}).get('headers') or {}
+    for name, value in headers.items():
+        if name.lower() == 'last-event-id':
+            return value.strip() or None
+    return ((event or {}).get('queryStringParameters') or {}).get('lastEventId') or None
+
+
+def wants_stream(event):
+    """
+    True if the request asks for the event stream (?stream=1 or Accept: text/event-stream).
+    """
+    query = (event or {}).get('queryStringParameters') or {}
+    if query.get('stream', '').lower() in ('1', 'true'):
+        return True
+    headers = (event or {}).get('headers') or {}
+    return any(name.lower() == 'accept' and 'text/event-stream' in value for name, value in headers.items())
@@ -0,0 +1,106 @@
+import json
+import time
+from decimal import Decimal
+
+import dynamo # Conditional write checks, see dynamo.py
+
+'''
+Abuse protection for /send-cv: token-bucket rate limits and an idempotency window, both stored in DynamoDB.
+
+One table (partition key "limit_key", DynamoDB TTL on "expires_at") holds two kinds of items:
+
+    {"limit_key": "email#<sha256>", "tokens": 2.4, "updated_at": 1760796000.5, "expires_at": ...}   <- token bucket
+    {"limit_key": "idem#<sha256>", "status": "DONE", "response": "{...}", "expires_at": ...}         <- idempotency record
+
+Token bucket: each key holds up to `capacity` tokens and regains `refill_per_second` tokens over time.
+A request takes one token or is rejected. Buckets are updated with a conditional write on updated_at,
+so two concurrent requests can't both spend the same token. Retries happen on a conflict.
+
+Idempotency: the first request for a key claims the record (conditional put), does the expensive work and stores
+its response. Repeats within the window get the stored response back without signing or sending anything again.
+
+Keys are hashed so the table never stores email addresses or IPs in the clear.
+DynamoDB TTL deletes expired items eventually, so expires_at is also checked on read.
+'''
+
+MAX_RETRIES = 5
+IN_PROGRESS, DONE = 'IN_PROGRESS', 'DONE'
+
+
+def take_token(table, key, capacity, refill_per_second, now=None):
+    """
+    Try to take one token from the bucket for `key`. Returns (allowed, retry_after_seconds).
+    """
+    for _ in range(MAX_RETRIES):
+        now = now or time.time()
+        item = table.get_item(Key={'limit_key': key}, ConsistentRead=True).get('Item')
+        if item and float(item.get('expires_at', 0)) > now:
+            elapsed = max(0.0, now - float(item['updated_at']))
+            tokens = min(capacity, float(item['tokens']) + elapsed * refill_per_second)
+        else:
+            tokens = float(capacity) # New (or expired) bucket starts full.
+
+        if tokens < 1:
+            return False, (1 - tokens) / refill_per_second # No write needed to reject a request.
+
+        new_item = {
+            'limit_key': key,
+            'tokens': Decimal(str(round(tokens - 1, 6))), # boto3 refuses floats, numbers go in as Decimal.
+            'updated_at': Decimal(str(round(now, 6))),
+            'expires_at': int(now + capacity / refill_per_second) + 1 # A full refill later the bucket is as good as new.
+        }
+        try:
+            if item:
+                table.put_item(Item=new_item, ConditionExpression='updated_at = :seen', ExpressionAttributeValues={':seen': item['updated_at']})
+            else:
+                table.put_item(Item=new_item, ConditionExpression='attribute_not_exists(limit_key)')
+            return True, 0
+        except Exception as e:
+            if not dynamo.conditional_check_failed(e):
+                raise
+            now = None # Someone spent a token at the same time, re-read and try again.
+    return False, 1.0
+
+
+def claim(table, key, window_seconds, now=None):
+    """
+    Claim an idempotency key. Returns None if we own it now, otherwise the existing record
+    ({'status': 'IN_PROGRESS'} or {'status': 'DONE', 'response': {...}}).
+    """
+    now = now or time.time()
+    try:
+        table.put_item(
+            Item={'limit_key': key, 'status': IN_PROGRESS, 'expires_at': int(now + window_seconds)},
+            ConditionExpression='attribute_not_exists(limit_key) OR expires_at < :now',
+            ExpressionAttributeValues={':now': int(now)}
+        )
+        return None
+    except Exception as e:
+        if not dynamo.conditional_check_failed(e):
+            raise
+
+    item = table.get_item(Key={'limit_key': key}, ConsistentRead=True).get('Item') or {}
+    record = {'status': item.get('status', IN_PROGRESS)}
+    if 'response' in item:
+        record['response'] = json.loads(item['response'])
+    return record
+
+
+def complete(table, key, response, window_seconds, now=None):
+    """
+    Store the response for a claimed idempotency key, so repeats within the window get it back.
+    """
+    now = now or time.time()
+    table.put_item(Item={
+        'limit_key': key,
+        'status': DONE,
+        'response': json.dumps(response),
+        'expires_at': int(now + window_seconds)
+    })
+
+
+def release(table, key):
+    """
+    Give up a claimed idempotency key (e.g. after a failure) so the request can be retried straight away.
+    """
+    table.delete_item(Key={'limit_key': key})
@@ -0,0 +1,159 @@
+import json
+import re
+import threading
+import time
+
+import price_cache # normalize_symbols(), the same canonical form the price cache keys on
+import tracing # Per-invocation stage timings, see tracing.py
+
+'''
+Allow-list of crypto symbols, so only well-formed, known symbols ever reach the price cache and CoinMarketCap.
+
+Before, the raw ?symbols= string went straight to the cache and upstream: " btc", "BTC" and "BTC,BTC" were different
+requests, and a typo like "BTCC" still cost an API credit. Now every request goes through resolve():
+
+    "eth, BTC,btc,BTCC,%$"  ->  known ['BTC', 'ETH'], unknown ['%$', 'BTCC']
+
+- canonical: stripped, upper-cased, deduplicated and sorted (price_cache.normalize_symbols), so the same set of
+  coins is always the same cache key;
+- capped: more than max_symbols distinct symbols is rejected (TooManySymbols) before anything else happens;
+- checked against an in-memory index (a frozenset, O(1) per symbol), so unknown symbols are dropped without any
+  network I/O and upstream spend depends only on real symbols.
+
+The index is the upstream listing (CoinMarketCap /v1/cryptocurrency/map, the best ranked `size` coins) plus the
+seed symbols (the frontend's list), which are always allowed, so the site keeps working when the listing can't be
+loaded. The listing changes slowly, so it is refreshed every `ttl` seconds (default 6 hours):
+
+    never loaded          -> answer from the seed right away and load it in the background
+    older than ttl        -> keep using it and refresh in the background
+    loading failed        -> keep the seed / previous index, try again (in the background) after RETRY_AFTER seconds
+    shared table failing  -> read: load from upstream instead; write: use the loaded listing anyway
+
+No request waits for the listing: a cold container would otherwise hold its first request for a paid upstream
+call. Until the first load finishes, symbols outside the seed are reported as unknown. The pre-warmer is the one
+caller that loads in the foreground (index(wait=True)).
+
+With a shared table (the price cache table), the listing is stored there under the key "#symbols", so one container
+(or the pre-warmer) pays for the upstream call and the others read it from DynamoDB. allow_upstream=False (used with
+PRICE_CACHE_ONLY) only reads the table, the request path then never calls CoinMarketCap at all.
+
+With no loader (SYMBOL_ALLOW_LIST is set) the seed is a fixed allow-list and nothing is ever loaded.
+'''
+
+SYMBOL_PATTERN = re.compile(r'^[A-Z0-9]{1,20}$') # Anything else can't be a ticker, no need to look it up.
+TABLE_KEY = '#symbols' # Can never collide with a price entry: "#" doesn't pass SYMBOL_PATTERN.
+RETRY_AFTER = 60 # Seconds between attempts after a failed load.
+
+
+def _shared_table_failed(action, error):
+    """
+    Log and count a failed read or write of the listing in the shared table. The refresh carries on without it.
+    """
+    tracing.count('symbol_registry_errors')
+    print(f"Shared symbol listing {action} failed: {str(error)}")
+
+
+class TooManySymbols(ValueError):
+    """
+    Raised when a request asks for more distinct symbols than allowed.
+    """
+
+
+class SymbolRegistry:
+    """
+    In-memory index of the symbols we serve prices for, refreshed from the upstream listing.
+    """
+
+    def __init__(self, load=None, ttl=21600, seed='', table=None, max_symbols=50):
+        self.load = load # () -> iterable of symbols, or None for a fixed allow-list
+        self.ttl = ttl
+        self.seed = frozenset(price_cache.normalize_symbols(seed) if isinstance(seed, str) else seed)
+        self.table = table
+        self.max_symbols = max_symbols
+        self._index = self.seed
+        self._expires_at = None # epoch seconds after which the index should be refreshed, None = never loaded
+        self._refreshing = False
+        self._lock = threading.Lock() # Serializes loads
+
+    def resolve(self, symbols, allow_upstream=True):
+        """
+        Split a symbols string into (known, unknown) canonical lists. Raises TooManySymbols.
+        """
+        wanted = price_cache.normalize_symbols(symbols)
+        if len(wanted) > self.max_symbols:
+            raise TooManySymbols(f"Too many symbols: {len(wanted)} requested, at most {self.max_symbols} allowed")
+        index = self.index(allow_upstream)
+        known = [symbol for symbol in wanted if symbol in index]
+        unknown = [symbol for symbol in wanted if symbol not in index]
+        return known, unknown
+
+    def index(self, allow_upstream=True, wait=False):
+        """
+        Return the current index (frozenset), loading or refreshing the listing in the background as needed.
+        wait=True loads a missing or expired listing before returning instead.
+        """
+        if self.load is None:
+            return self._index
+        expired = self._expires_at is None or time.time() > self._expires_at
+        if expired and wait:
+            self.refresh(allow_upstream)
+        elif expired and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self.refresh, args=(allow_upstream,), daemon=True).start()
+        return self._index
+
+    def refresh(self, allow_upstream=True):
+        """
+        Load the listing (shared table first, then upstream) and swap in the new index. Never raises.
+        """
+        with self._lock:
+            try:
+                now = time.time()
+                if self._expires_at is not None and now <= self._expires_at:
+                    return # Someone else refreshed it while we waited for the lock.
+                with tracing.stage('symbol_registry'):
+                    try:
+                        symbols, loaded_at = self._read_table(fresh_only=allow_upstream)
+                    except Exception as e:
+                        _shared_table_failed('read', e)
+                        symbols, loaded_at = None, None # Load it from upstream instead, if we may.
+                    if symbols is None and allow_upstream:
+                        symbols, loaded_at = list(self.load()), now
+                        try:
+                            self._write_table(symbols, loaded_at)
+                        except Exception as e:
+                            _shared_table_failed('write', e) # We still use what we loaded; other containers load their own.
+                if symbols is None:
+                    raise RuntimeError("no listing in the shared table yet")
+                self._index = self.seed | frozenset(symbol.upper() for symbol in symbols if SYMBOL_PATTERN.match(symbol.upper()))
+                # An expired copy from the table (we may not call upstream) is used, but looked at again soon.
+                self._expires_at = loaded_at + self.ttl if now - loaded_at <= self.ttl else now + RETRY_AFTER
+            except Exception as e:
+                self._expires_at = time.time() + RETRY_AFTER
+                print(f"Symbol registry refresh failed, keeping {len(self._index)} known symbols: {str(e)}")
+            finally:
+                self._refreshing = False
+
+    def _read_table(self, fresh_only):
+        """
+        Return (symbols, loaded_at) from the shared table, or (None, None).
+        """
+        if self.table is None:
+            return None, None
+        item = self.table.get_item(Key={'cache_key': TABLE_KEY}).get('Item')
+        if not item:
+            return None, None
+        loaded_at = float(item['fetched_at'])
+        if fresh_only and time.time() - loaded_at > self.ttl:
+            return None, None
+        return json.loads(item['symbols']), loaded_at
+
+    def _write_table(self, symbols, loaded_at):
+        if self.table is None:
+            return
+        self.table.put_item(Item={
+            'cache_key': TABLE_KEY,
+            'symbols': json.dumps(sorted(set(symbols)), separators=(',', ':')), # ~30 KB for 5000 symbols, far below the 400 KB item limit.
+            'fetched_at': str(loaded_at),
+            'expires_at': int(loaded_at + 7 * self.ttl) # DynamoDB TTL; readers may use an old listing when upstream is off-limits.
+        })
@@ -0,0 +1,28 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # The backend modules live one level up.
+
+# Settings the handlers read at import time, the same stand-ins local_stubs.install() uses.
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('DYNAMODB_TABLE', 'ViewerCountTable')
+os.environ.setdefault('SENDER_EMAIL', 'cv@example.com')
+os.environ.setdefault('CLOUDFRONT_URL', 'https://dlocal.cloudfront.net/cv.pdf')
+os.environ.setdefault('METRICS_ENABLED', 'false') # No EMF line per invocation in the test output.
+
+import pytest
+
+import local_stubs
+
+TABLE = os.environ['DYNAMODB_TABLE']
+
+
+@pytest.fixture
+def dynamodb(monkeypatch):
+    """
+    A fresh in-memory DynamoDB with the viewer table. No latency unless a test sets local_stubs.LATENCY.
+    """
+    monkeypatch.setattr(local_stubs, 'LATENCY', {})
+    db = local_stubs.StubDynamoDB()
+    db.create_table(TABLE, 'counter_id')
+    return db
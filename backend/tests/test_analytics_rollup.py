@@ -0,0 +1,31 @@
+import json
+
+import pytest
+
+pytest.importorskip('numpy') # The rollup is an offline job that needs NumPy, no Lambda does.
+
+import analytics_rollup
+
+
+def emf_line(timestamp_ms, route, status=200, **properties):
+    record = dict({'_aws': {'Timestamp': timestamp_ms}, 'route': route, 'status': status, 'duration_ms': 10.0}, **properties)
+    return f"2026-10-18T10:00:00.000Z {json.dumps(record)}\n"
+
+
+def test_rolls_up_log_records_and_ignores_table_exports(tmp_path):
+    hour = 1760781600000 # 2026-10-18T10:00Z
+    export = tmp_path / 'export.log'
+    export.write_text(
+        emf_line(hour, 'GET /crypto_api', cache='HIT')
+        + emf_line(hour + 60000, 'GET /crypto_api', cache='MISS')
+        + emf_line(hour + 3600000, 'POST /viewer-count', dedupe='FIRST')
+        + 'START RequestId: 1 Version: $LATEST\n'
+        + json.dumps({'Item': {'counter_id': {'S': 'seen#abc'}, 'expires_at': {'N': '1760783400'}}}) + '\n'
+    )
+
+    result, lines = analytics_rollup.rollup([str(export)])
+    report = analytics_rollup.summarize(result.table('hour'))
+
+    assert (lines, result.records) == (5, 3)
+    assert {entry['route']: entry['requests'] for entry in report['routes']} == {'GET /crypto_api': 2, 'POST /viewer-count': 1}
+    assert {entry['cache']: entry['pct'] for entry in report['caches']} == {'HIT': 33.33, 'MISS': 33.33, '-': 33.33}
@@ -0,0 +1,50 @@
+import pytest
+
+import api_response
+
+BODY = {'view_count': 1234}
+CACHE = 'public, max-age=10'
+
+
+def get(if_none_match=None, header='If-None-Match'):
+    return api_response.respond(
+        200, BODY, api_response.GET_HEADERS, cache_control=CACHE,
+        event={'httpMethod': 'GET', 'headers': {header: if_none_match} if if_none_match else {}}
+    )
+
+
+def test_200_carries_the_etag_of_its_body():
+    response = get()
+    assert response['statusCode'] == 200
+    assert response['headers']['ETag'] == api_response.etag(response['body'])
+
+
+@pytest.mark.parametrize('header', ['If-None-Match', 'if-none-match'])
+def test_matching_etag_gets_an_empty_304_with_cache_control(header):
+    tag = get()['headers']['ETag']
+    response = get(tag, header)
+
+    assert response['statusCode'] == 304 and response['body'] == ''
+    assert response['headers']['ETag'] == tag
+    assert response['headers']['Cache-Control'] == CACHE # Lets the browser keep reusing its copy.
+    assert response['headers']['Access-Control-Allow-Origin'] == '*'
+
+
+@pytest.mark.parametrize('value', ['W/{tag}', '"other", W/{tag}', '*'])
+def test_weak_listed_and_wildcard_etags_match(value):
+    tag = get()['headers']['ETag']
+    assert get(value.format(tag=tag))['statusCode'] == 304
+
+
+def test_changed_body_is_sent_again():
+    response = get('"0123456789abcdef0123", W/"stale"')
+    assert response['statusCode'] == 200 and response['body'] == api_response.encode(BODY)
+
+
+def test_only_200s_with_the_event_are_conditional():
+    tag = get()['headers']['ETag']
+    no_event = api_response.respond(200, BODY, cache_control=CACHE)
+    failed = api_response.respond(500, BODY, event={'headers': {'If-None-Match': tag}})
+
+    assert 'ETag' not in no_event['headers']
+    assert failed['statusCode'] == 500 and failed['body'] == api_response.encode(BODY)
@@ -0,0 +1,38 @@
+import os
+import shutil
+import sys
+import zipfile
+
+import pytest
+
+import build
+
+
+def stage(handler, directory):
+    """
+    Copy the files build.py ships for a handler into directory.
+    """
+    files = build.module_closure(handler)
+    for name in files:
+        shutil.copy(os.path.join(build.HERE, name), directory)
+    return files
+
+
+def test_viewer_count_ships_every_module_it_imports(tmp_path):
+    files = stage('lambda_function', tmp_path)
+
+    assert {'lambda_function.py', 'view_counter.py', 'unique_visitors.py', 'hyperloglog.py'} <= set(files)
+    build.check_imports(str(tmp_path), ['lambda_function'], sys.executable, no_site=True) # Raises on an ImportError.
+
+
+@pytest.mark.parametrize('name', sorted(build.load_manifest()['functions']))
+def test_every_function_zip_holds_its_handler_and_the_shared_modules(name, tmp_path):
+    manifest = build.load_manifest()
+    spec = manifest['functions'][name]
+    build.build_artifact(name, 'function', spec, manifest, None, str(tmp_path), force=True)
+
+    with zipfile.ZipFile(tmp_path / f"{name}.zip") as z:
+        names = set(z.namelist())
+        z.extractall(tmp_path / 'unzipped')
+    assert {f"{spec['handler']}.py", 'api_response.py', 'tracing.py'} <= names # Every handler answers through api_response.
+    build.check_imports(str(tmp_path / 'unzipped'), [spec['handler']], sys.executable, no_site=True)
@@ -0,0 +1,109 @@
+import time
+
+import pytest
+import requests
+
+import cmc_client
+import local_stubs
+import tracing
+
+
+@pytest.fixture
+def cmc(monkeypatch):
+    """
+    A stub CoinMarketCap and a client with a fresh breaker, no backoff pauses and a short read timeout.
+    """
+    monkeypatch.setattr(local_stubs, 'LATENCY', {})
+    monkeypatch.setattr(cmc_client, 'BACKOFF_BASE', 0)
+    monkeypatch.setattr(cmc_client, 'READ_TIMEOUT', 0.3)
+    monkeypatch.setattr(cmc_client, 'MAX_ATTEMPTS', 3)
+    monkeypatch.setattr(cmc_client, 'FAILURE_THRESHOLD', 2)
+    cmc_client.reset()
+    stub = local_stubs.StubCMC(symbols=['BTC'])
+    yield stub
+    stub.close()
+    cmc_client.reset()
+
+
+def quotes(stub):
+    return cmc_client.get_quotes('BTC', 'key', url=stub.url)
+
+
+class Context:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+@pytest.mark.parametrize('status', [429, 500, 503])
+def test_retryable_status_is_retried(cmc, status):
+    cmc.faults = [status, status]
+    assert 'BTC' in quotes(cmc)['data']
+    assert cmc.calls == 3
+    assert cmc_client._breaker['failures'] == 0
+
+
+def test_client_error_is_not_retried_and_does_not_trip_the_breaker(cmc):
+    cmc.faults = [401]
+    with pytest.raises(requests.HTTPError):
+        quotes(cmc)
+    assert cmc.calls == 1
+    assert cmc_client._breaker['failures'] == 0
+
+
+def test_read_timeout_is_retried_then_counted_as_a_failure(cmc):
+    cmc.faults = [0.6, 0.6, 0.6]
+    with pytest.raises(requests.Timeout):
+        quotes(cmc)
+    assert cmc.calls == 3
+    assert cmc_client._breaker['failures'] == 1
+
+
+def test_gives_up_before_the_invocation_deadline(cmc, monkeypatch):
+    monkeypatch.setattr(cmc_client, 'READ_TIMEOUT', 5)
+    monkeypatch.setattr(cmc_client, 'DEADLINE_MARGIN', 0.5)
+    cmc.faults = [2.0, 2.0, 2.0]
+
+    @tracing.traced
+    def handler(event, context):
+        started = time.monotonic()
+        with pytest.raises(requests.Timeout):
+            quotes(cmc)
+        return time.monotonic() - started
+
+    elapsed = handler({}, Context(remaining_ms=1000)) # 0.5 s for upstream calls, not 3 x 5 s.
+    assert elapsed < 0.9
+    assert cmc_client._breaker['failures'] == 1 # The breaker still hears about it, unlike when Lambda kills the call.
+
+
+def test_breaker_opens_then_lets_one_trial_through(cmc, monkeypatch):
+    cmc.faults = [503] * 6
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            quotes(cmc)
+    assert cmc.calls == 6
+
+    with pytest.raises(cmc_client.CircuitOpenError): # Open: fails without calling upstream.
+        quotes(cmc)
+    assert cmc.calls == 6
+
+    monkeypatch.setattr(cmc_client, 'RESET_TIMEOUT', 0)
+    cmc.faults = [503] * 3
+    with pytest.raises(requests.HTTPError): # Half-open: the trial fails and the circuit opens again.
+        quotes(cmc)
+    assert cmc_client._breaker['opened_at'] is not None
+
+    assert 'BTC' in quotes(cmc)['data'] # The next trial succeeds and closes it.
+    assert cmc_client._breaker == {'failures': 0, 'opened_at': None, 'trial_in_flight': False}
+
+
+def test_half_open_admits_a_single_trial(cmc, monkeypatch):
+    monkeypatch.setattr(cmc_client, 'RESET_TIMEOUT', 0)
+    cmc_client._breaker.update(failures=2, opened_at=time.monotonic())
+
+    assert cmc_client._allow_request() # The trial
+    assert not cmc_client._allow_request() # Everyone else while it is in flight
+    cmc_client._record(True)
+    assert cmc_client._allow_request()
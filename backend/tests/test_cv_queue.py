@@ -0,0 +1,142 @@
+import json
+import time
+
+import pytest
+
+import cv_queue
+import SES_lambda
+
+
+@pytest.fixture(params=['memory', 'file'])
+def queue(request, tmp_path):
+    return cv_queue.MemoryQueue() if request.param == 'memory' else cv_queue.FileQueue(str(tmp_path / 'cv-queue'))
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    """
+    Record the attempt numbers backoff_delay is asked for, and retry right away.
+    """
+    attempts = []
+
+    def backoff_delay(attempt):
+        attempts.append(attempt)
+        return 0
+
+    monkeypatch.setattr(cv_queue, 'backoff_delay', backoff_delay)
+    return attempts
+
+
+class FlakySend:
+    """
+    A send() that fails the first `failures` calls for each email, and records when the others went out.
+    """
+
+    def __init__(self, failures=0):
+        self.failures, self.calls, self.sent = failures, {}, []
+
+    def __call__(self, message):
+        email = message['email']
+        self.calls[email] = self.calls.get(email, 0) + 1
+        if self.calls[email] <= self.failures:
+            raise RuntimeError('Throttling: Maximum sending rate exceeded.')
+        self.sent.append((time.monotonic(), email))
+
+
+@pytest.mark.parametrize('setting', [None, 'memory', 'file:/tmp/cv-queue'])
+def test_lambda_requires_an_sqs_queue(monkeypatch, setting):
+    monkeypatch.setenv('AWS_LAMBDA_FUNCTION_NAME', 'SESFunction')
+    if setting is None:
+        monkeypatch.delenv('CV_QUEUE', raising=False)
+    else:
+        monkeypatch.setenv('CV_QUEUE', setting)
+    with pytest.raises(ValueError, match='SQS queue URL'):
+        cv_queue.queue_from_env()
+
+
+def test_lambda_accepts_an_sqs_queue(monkeypatch):
+    monkeypatch.setenv('AWS_LAMBDA_FUNCTION_NAME', 'SESFunction')
+    monkeypatch.setenv('CV_QUEUE', 'https://sqs.us-east-1.amazonaws.com/123456789012/cv-requests')
+    assert isinstance(cv_queue.queue_from_env(), cv_queue.SQSQueue)
+
+
+def test_local_runs_name_the_in_process_queue_explicitly(monkeypatch):
+    monkeypatch.delenv('AWS_LAMBDA_FUNCTION_NAME', raising=False)
+    monkeypatch.delenv('CV_QUEUE', raising=False)
+    with pytest.raises(ValueError):
+        cv_queue.queue_from_env()
+    monkeypatch.setenv('CV_QUEUE', 'memory')
+    assert isinstance(cv_queue.queue_from_env(), cv_queue.MemoryQueue)
+
+
+def test_drain_paces_sends_to_the_rate(queue):
+    for n in range(4):
+        queue.send({'email': f"visitor{n}@example.com"})
+    send = FlakySend()
+
+    assert cv_queue.drain(queue, send, rate=20) == {'sent': 4, 'retried': 0, 'failed': 0}
+    times = [at for at, _ in send.sent]
+    assert all(later - earlier >= 0.045 for earlier, later in zip(times, times[1:])) # 1 / 20 s apart
+    assert len(queue) == 0
+
+
+def test_drain_retries_a_failed_send_with_backoff(queue, delays):
+    queue.send({'email': 'visitor@example.com'})
+    send = FlakySend(failures=2)
+
+    assert cv_queue.drain(queue, send, rate=0, max_attempts=5) == {'sent': 1, 'retried': 2, 'failed': 0}
+    assert delays == [1, 2] # The backoff grows with the attempt count carried in the message.
+    assert [email for _, email in send.sent] == ['visitor@example.com']
+    assert len(queue) == 0
+
+
+def test_retried_message_stays_hidden_until_its_delay_is_over(queue, monkeypatch):
+    monkeypatch.setattr(cv_queue, 'backoff_delay', lambda attempt: 60)
+    queue.send({'email': 'visitor@example.com'})
+
+    assert cv_queue.drain(queue, FlakySend(failures=1), rate=0) == {'sent': 0, 'retried': 1, 'failed': 0}
+    assert len(queue) == 1 and queue.receive() == []
+
+
+def test_drain_drops_a_message_after_max_attempts(queue, delays, capsys):
+    queue.send({'email': 'bounces@example.com'})
+    queue.send({'email': 'visitor@example.com'})
+    send = FlakySend(failures=3)
+
+    counts = cv_queue.drain(queue, send, rate=0, max_attempts=3)
+    assert counts == {'sent': 0, 'retried': 4, 'failed': 2}
+    assert send.calls == {'bounces@example.com': 3, 'visitor@example.com': 3}
+    assert len(queue) == 0
+    assert 'Dropping CV email request after 3 attempts' in capsys.readouterr().out
+
+
+def test_backoff_delay_is_jittered_below_the_exponential_cap():
+    for attempt in range(1, 12):
+        assert all(0 <= cv_queue.backoff_delay(attempt) <= min(300.0, 2.0 * 2 ** attempt) for _ in range(20))
+
+
+def sqs_record(message_id, email, receive_count=1):
+    return {
+        'messageId': message_id,
+        'receiptHandle': f"handle-{message_id}",
+        'body': json.dumps({'email': email}),
+        'attributes': {'ApproximateReceiveCount': str(receive_count)}
+    }
+
+
+def test_worker_reports_only_the_messages_to_retry(monkeypatch):
+    def deliver(message):
+        if message['email'] != 'visitor@example.com':
+            raise RuntimeError('Throttling: Maximum sending rate exceeded.')
+
+    monkeypatch.setattr(SES_lambda, 'deliver', deliver)
+    monkeypatch.setattr(SES_lambda, 'cv_request_queue', None)
+    monkeypatch.setattr(SES_lambda, 'send_rate', 0)
+    monkeypatch.setattr(SES_lambda, 'max_attempts', 3)
+    event = {'Records': [
+        sqs_record('sent', 'visitor@example.com'),
+        sqs_record('retry', 'throttled@example.com', receive_count=1),
+        sqs_record('dropped', 'throttled@example.com', receive_count=3) # Its last attempt: dropped, not retried.
+    ]}
+
+    assert SES_lambda.worker_handler(event, None) == {'batchItemFailures': [{'itemIdentifier': 'retry'}]}
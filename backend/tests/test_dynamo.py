@@ -0,0 +1,65 @@
+import pytest
+
+import dynamo
+
+
+class ThrottlingClient:
+    """
+    batch_get_item that leaves the last key of every call unprocessed the first `throttled` times.
+    """
+
+    def __init__(self, items, throttled):
+        self.items, self.throttled, self.calls = items, throttled, []
+
+    def batch_get_item(self, RequestItems):
+        (table_name, request), = RequestItems.items()
+        keys = request['Keys']
+        self.calls.append(len(keys))
+        assert len(keys) <= dynamo.MAX_BATCH_KEYS
+        answered, unprocessed = keys, []
+        if self.throttled:
+            self.throttled -= 1
+            answered, unprocessed = keys[:-1], keys[-1:]
+        response = {'Responses': {table_name: [self.items[key['id']] for key in answered if key['id'] in self.items]}}
+        response['UnprocessedKeys'] = {table_name: dict(request, Keys=unprocessed)} if unprocessed else {}
+        return response
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    pauses = []
+    monkeypatch.setattr(dynamo.time, 'sleep', pauses.append)
+    return pauses
+
+
+def test_get_items_batches_and_skips_missing_keys():
+    client = ThrottlingClient({n: {'id': n} for n in range(0, 250, 2)}, throttled=0)
+    items = list(dynamo.get_items(client, 'table', [{'id': n} for n in range(250)]))
+
+    assert sorted(item['id'] for item in items) == list(range(0, 250, 2))
+    assert client.calls == [100, 100, 50]
+
+
+def test_get_items_retries_unprocessed_keys_with_growing_backoff(no_sleep, monkeypatch):
+    monkeypatch.setattr(dynamo.random, 'uniform', lambda low, high: high) # Upper bound of each jittered pause.
+    client = ThrottlingClient({n: {'id': n} for n in range(10)}, throttled=3)
+    items = list(dynamo.get_items(client, 'table', [{'id': n} for n in range(10)]))
+
+    assert sorted(item['id'] for item in items) == list(range(10))
+    assert client.calls == [10, 1, 1, 1]
+    assert no_sleep == sorted(no_sleep) and len(no_sleep) == 3 and no_sleep[0] > 0
+
+
+def test_get_items_gives_up_after_max_attempts():
+    client = ThrottlingClient({}, throttled=100)
+    with pytest.raises(RuntimeError, match='unprocessed'):
+        list(dynamo.get_items(client, 'table', [{'id': 1}]))
+    assert len(client.calls) == dynamo.MAX_ATTEMPTS
+
+
+def test_conditional_check_failed():
+    import local_stubs
+
+    assert dynamo.conditional_check_failed(local_stubs._client_error('ConditionalCheckFailedException', 'PutItem'))
+    assert not dynamo.conditional_check_failed(local_stubs._client_error('ProvisionedThroughputExceededException', 'PutItem'))
+    assert not dynamo.conditional_check_failed(RuntimeError('boom'))
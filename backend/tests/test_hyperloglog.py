@@ -0,0 +1,35 @@
+import statistics
+
+import hyperloglog
+
+TRIALS = 20
+
+
+def mean_error(true_count):
+    """
+    Mean relative error (%) of the estimate over TRIALS independent sketches.
+    """
+    errors = []
+    for trial in range(TRIALS):
+        registers = hyperloglog.new_registers()
+        for i in range(true_count):
+            hyperloglog.add(registers, f"trial-{trial}-visitor-{i}")
+        errors.append((hyperloglog.estimate(registers) - true_count) / true_count * 100)
+    return statistics.mean(errors)
+
+
+def test_empty_sketch_estimates_zero():
+    assert hyperloglog.estimate(hyperloglog.new_registers()) == 0
+
+
+def test_no_bias_around_the_old_linear_counting_switch():
+    m = len(hyperloglog.new_registers())
+    for true_count in (int(2.0 * m), int(2.5 * m), int(3.0 * m)):
+        assert abs(mean_error(true_count)) < 1.0 # The classic estimator is ~2-3% high at 2.5 * m.
+
+
+def test_small_counts_are_close():
+    registers = hyperloglog.new_registers()
+    for i in range(100):
+        hyperloglog.add(registers, f"visitor-{i}")
+    assert abs(hyperloglog.estimate(registers) - 100) <= 3
@@ -0,0 +1,9 @@
+import pytest
+
+import import_budget
+
+
+@pytest.mark.parametrize('module', import_budget.HANDLERS)
+def test_handler_cold_import_is_within_budget(module):
+    total_ms, children, problems = import_budget.check(module, import_budget.budget(module), runs=5)
+    assert problems == [], f"{module}: {total_ms:.1f} ms, slowest imports {children[:3]}"
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+import aws_clients
+import lambda_function
+import page_counters
+import view_counter
+from conftest import TABLE
+
+
+@pytest.fixture
+def viewer_api(dynamodb):
+    aws_clients.override('dynamodb', resource=dynamodb)
+    yield dynamodb
+    aws_clients.reset()
+
+
+def post_view(ip, cookie=None, path=None):
+    headers = {'User-Agent': 'test'}
+    if cookie:
+        headers['Cookie'] = cookie
+    event = {
+        'httpMethod': 'POST',
+        'headers': headers,
+        'queryStringParameters': {'path': path} if path else None,
+        'requestContext': {'identity': {'sourceIp': ip, 'userAgent': 'test'}}
+    }
+    return lambda_function.lambda_handler(event, None)
+
+
+def test_views_are_deduped_by_fingerprint_without_cookies(viewer_api):
+    first = post_view('192.0.2.1')
+    other = post_view('192.0.2.2', cookie='vc_seen=9999999999') # A leftover cookie no longer makes a repeat.
+    repeat = post_view('192.0.2.1')
+
+    assert [json.loads(response['body'])['counted'] for response in (first, other, repeat)] == [True, True, False]
+    assert json.loads(repeat['body'])['view_count'] == 2
+    assert not any('set-cookie' in (name.lower() for name in response['headers']) for response in (first, other, repeat))
+
+
+def test_only_the_site_total_is_buffered(viewer_api, monkeypatch):
+    monkeypatch.setattr(lambda_function, 'buffer_size', 5)
+    monkeypatch.setattr(lambda_function, 'dedupe_window', 0)
+    monkeypatch.setattr(view_counter, '_buffer', {})
+    monkeypatch.setattr(page_counters, '_candidates', {})
+
+    for n in range(3):
+        post_view(f"192.0.2.{n}", path='/blog/post-1')
+
+    items = viewer_api.tables[TABLE].items
+    assert items[page_counters.page_key('/blog/post-1')]['view_count'] == 3 # Written on every view.
+    assert items[page_counters.section_key('/blog')]['view_count'] == 3
+    assert list(view_counter._buffer) == [lambda_function.primary_key]
+
+
+def test_failing_visitor_sketch_still_counts_the_view(viewer_api, monkeypatch, capsys):
+    def broken_record_visitor(*args, **kwargs):
+        raise RuntimeError('Gave up after 5 conflicting sketch updates')
+
+    monkeypatch.setattr(lambda_function, 'count_unique', True)
+    monkeypatch.setattr(lambda_function.unique_visitors, 'record_visitor', broken_record_visitor)
+    response = post_view('192.0.2.50')
+
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200 and body['counted'] is True
+    assert 'unique_visitors' not in body
+    assert 'Failed to record unique visitor' in capsys.readouterr().out
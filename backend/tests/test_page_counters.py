@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+import page_counters
+from conftest import TABLE
+
+
+def test_merge_top_ranks_by_views_then_path():
+    current = [['/a', 5], ['/b', 3]]
+    candidates = {'page#/b': 7, 'page#/c': 5, 'page#/a': 2, 'section#/blog': 9}
+
+    assert page_counters.merge_top(current, candidates, page_counters.PAGE_PREFIX, 3) == [['/b', 7], ['/a', 5], ['/c', 5]]
+    assert page_counters.merge_top(current, candidates, page_counters.PAGE_PREFIX, 2) == [['/b', 7], ['/a', 5]]
+    assert page_counters.merge_top([], candidates, page_counters.SECTION_PREFIX, 3) == [['/blog', 9]]
+
+
+@pytest.mark.parametrize('path, normalized', [
+    ('/', '/'),
+    ('/blog//post-1/?utm=1#top', '/blog/post-1'),
+    ('/blog/index.html', '/blog'),
+    ('/index.htm', '/'),
+    ('/docs/caf%C3%A9', '/docs/caf%C3%A9')
+])
+def test_normalize_path(path, normalized):
+    assert page_counters.normalize_path(path) == normalized
+
+
+@pytest.mark.parametrize('path', ['blog', '/blog/../admin', '/./blog', '/blog/<script>', '/a b', '/' + 'a' * 200])
+def test_normalize_path_rejects(path):
+    with pytest.raises(page_counters.InvalidPath):
+        page_counters.normalize_path(path)
+
+
+class RacingTable:
+    """
+    The viewer table, with another container writing the aggregate item between our read and our first `races` puts.
+    """
+
+    def __init__(self, table, races=1):
+        self.table, self.races = table, races
+
+    def get_item(self, **kwargs):
+        return self.table.get_item(**kwargs)
+
+    def put_item(self, **kwargs):
+        if self.races:
+            self.races -= 1
+            item = self.table.get_item(Key={'counter_id': page_counters.TOP_KEY}).get('Item') or {}
+            self.table.put_item(Item={
+                'counter_id': page_counters.TOP_KEY, 'pages': '[["/other",50]]', 'sections': '[]',
+                'version': int(item.get('version', 0)) + 1, 'updated_at': 0
+            })
+        return self.table.put_item(**kwargs)
+
+
+@pytest.fixture
+def candidates(monkeypatch):
+    monkeypatch.setattr(page_counters, '_candidates', {'page#/blog/post-1': 40, 'section#/blog': 95})
+    return page_counters._candidates
+
+
+def test_merge_candidates_merges_again_after_a_conflict(dynamodb, candidates):
+    table = dynamodb.Table(TABLE)
+
+    assert page_counters.merge_candidates(RacingTable(table), 10)
+    item = table.get_item(Key={'counter_id': page_counters.TOP_KEY})['Item']
+    assert json.loads(item['pages']) == [['/other', 50], ['/blog/post-1', 40]] # The other container's merge is kept.
+    assert json.loads(item['sections']) == [['/blog', 95]]
+    assert int(item['version']) == 2
+    assert page_counters._candidates == {}
+
+
+def test_merge_candidates_keeps_the_candidates_after_losing_every_race(dynamodb, candidates):
+    table = dynamodb.Table(TABLE)
+
+    with pytest.raises(RuntimeError, match='lost the race'):
+        page_counters.merge_candidates(RacingTable(table, races=page_counters.MERGE_ATTEMPTS), 10)
+    assert page_counters._candidates == {'page#/blog/post-1': 40, 'section#/blog': 95}
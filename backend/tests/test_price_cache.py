@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+import price_cache
+
+
+class BrokenTable:
+    """
+    A shared cache table whose every read and write fails, like a throttled or unreachable DynamoDB.
+    """
+    name = 'PriceCache'
+
+    class meta:
+        class client:
+            @staticmethod
+            def batch_get_item(**kwargs):
+                raise RuntimeError('ProvisionedThroughputExceededException')
+
+    def batch_writer(self):
+        raise RuntimeError('ProvisionedThroughputExceededException')
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(price_cache, '_memory', {})
+    monkeypatch.setattr(price_cache, '_inflight', {})
+
+
+def test_broken_shared_tier_falls_back_to_upstream():
+    calls = []
+
+    def fetch(symbols):
+        calls.append(symbols)
+        return {symbol: 1.0 for symbol in symbols.split(',')}
+
+    prices, outcome = price_cache.get_prices('btc,eth', fetch, table=BrokenTable())
+    assert (prices, outcome) == ({'BTC': 1.0, 'ETH': 1.0}, price_cache.MISS)
+
+    # The failed write still filled memory, so the next request is answered without the table or upstream.
+    prices, outcome = price_cache.get_prices('eth', fetch, table=BrokenTable())
+    assert (prices, outcome) == ({'ETH': 1.0}, price_cache.HIT)
+    assert calls == ['BTC,ETH']
+
+
+def test_broken_shared_tier_still_serves_stale_memory_when_upstream_fails():
+    price_cache._memory['BTC'] = {'price': 2.0, 'fetched_at': time.time() - 1000}
+
+    def fetch(symbols):
+        raise RuntimeError('upstream down')
+
+    prices, outcome = price_cache.get_prices('BTC', fetch, table=BrokenTable())
+    assert (prices, outcome) == ({'BTC': 2.0}, price_cache.STALE_ERROR)
@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import price_history
+
+NOW = datetime(2026, 10, 18, 14, 3, 7, tzinfo=timezone.utc)
+
+
+def test_ohlc_buckets_unsorted_points_into_aligned_candles():
+    start = NOW - timedelta(minutes=15)
+    base = int(start.timestamp()) - int(start.timestamp()) % 300 # 13:45:00
+    timestamps = [base + 320, base + 10, base + 610, base + 20, base + 400, base - 5]
+    prices = [5.0, 1.0, 7.0, 3.0, 4.0, 99.0] # The last point is before the range.
+
+    candles = price_history.ohlc(timestamps, prices, start, NOW, timedelta(minutes=5))
+
+    assert candles == [
+        {'t': base + 300, 'open': 5.0, 'high': 5.0, 'low': 4.0, 'close': 4.0},
+        {'t': base + 600, 'open': 7.0, 'high': 7.0, 'low': 7.0, 'close': 7.0}
+    ]
+
+
+def test_ohlc_of_no_points_is_empty():
+    assert price_history.ohlc([], [], NOW - timedelta(hours=1), NOW, timedelta(minutes=5)) == []
+
+
+def test_append_writes_every_symbol_and_query_reads_them_back(dynamodb):
+    dynamodb.create_table('PriceHistory', 'series_id')
+    table = dynamodb.Table('PriceHistory')
+
+    for minute in range(3):
+        price_history.append(table, {'BTC': 100.0 + minute, 'ETH': 10.0, 'NOPE': None}, NOW + timedelta(minutes=minute))
+
+    candles = price_history.query(dynamodb, 'PriceHistory', 'BTC', '1h', '1h', now=NOW + timedelta(minutes=5))
+    assert candles == [{'t': int(datetime(2026, 10, 18, 14, tzinfo=timezone.utc).timestamp()), 'open': 100.0, 'high': 102.0, 'low': 100.0, 'close': 102.0}]
+    assert 'Item' not in table.get_item(Key={'series_id': price_history.series_id('NOPE', NOW)})
+
+
+def test_append_without_waiting_only_logs_failures(monkeypatch, capsys):
+    class BrokenTable:
+        def update_item(self, **kwargs):
+            raise RuntimeError('throttled')
+
+    monkeypatch.setattr(price_history, '_pool', ThreadPoolExecutor(max_workers=2))
+    price_history.append(BrokenTable(), {'BTC': 1.0}, NOW, wait=False) # Returns at once, never raises.
+    price_history._pool.shutdown(wait=True)
+    assert 'Failed to record price history: throttled' in capsys.readouterr().out
@@ -0,0 +1,88 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import api_response
+import rate_limit
+import SES_lambda
+
+LIMIT_TABLE = 'RateLimitTable'
+
+
+@pytest.fixture
+def limits(dynamodb, monkeypatch):
+    """
+    The rate-limit table on the stub DynamoDB, wired into SES_lambda, with a fake synchronous send that counts emails.
+    """
+    dynamodb.create_table(LIMIT_TABLE, 'limit_key')
+    table = dynamodb.Table(LIMIT_TABLE)
+    sent = []
+    lock = threading.Lock()
+
+    def send_cv(recipient_email):
+        with lock:
+            sent.append(recipient_email)
+        return api_response.respond(200, {"message": "Email sent successfully!"}, api_response.POST_HEADERS)
+
+    monkeypatch.setattr(SES_lambda, 'rate_limit_table', table)
+    monkeypatch.setattr(SES_lambda, 'delivery_mode', 'sync')
+    monkeypatch.setattr(SES_lambda, 'send_cv', send_cv)
+    return table, sent
+
+
+def request(email, ip='203.0.113.7'):
+    return {
+        'httpMethod': 'POST',
+        'body': json.dumps({'email': email}),
+        'requestContext': {'identity': {'sourceIp': ip}}
+    }
+
+
+def test_concurrent_takes_never_spend_more_than_the_capacity(limits):
+    table, _ = limits
+    capacity = 10
+
+    def take(_):
+        return rate_limit.take_token(table, 'ip#load', capacity, 1e-6)[0]
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        allowed = sum(pool.map(take, range(200)))
+    # Some takes may give up after MAX_RETRIES conflicts; what is left must still be in the bucket.
+    while rate_limit.take_token(table, 'ip#load', capacity, 1e-6)[0]:
+        allowed += 1
+    assert allowed == capacity
+
+
+def test_load_of_double_clicks_sends_one_email(limits):
+    _, sent = limits
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        statuses = list(pool.map(lambda _: SES_lambda.lambda_handler(request('visitor@example.com'), None)['statusCode'], range(50)))
+
+    assert sent == ['visitor@example.com']
+    assert statuses.count(200) >= 1 and set(statuses) <= {200, 202} # Replays get 200 back, overlaps "in progress".
+
+
+def test_load_from_one_ip_is_cut_off_at_its_capacity(limits):
+    _, sent = limits
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        statuses = list(pool.map(lambda n: SES_lambda.lambda_handler(request(f"visitor{n}@example.com"), None)['statusCode'], range(40)))
+
+    assert len(sent) == statuses.count(200) <= SES_lambda.ip_capacity
+    assert statuses.count(429) >= 40 - SES_lambda.ip_capacity
+
+
+def test_failing_limiter_still_completes_the_claim(limits, monkeypatch):
+    _, sent = limits
+
+    def broken_take_token(*args, **kwargs):
+        raise RuntimeError('ProvisionedThroughputExceededException')
+
+    monkeypatch.setattr(rate_limit, 'take_token', broken_take_token)
+    first = SES_lambda.lambda_handler(request('visitor@example.com'), None)
+    retry = SES_lambda.lambda_handler(request('visitor@example.com'), None)
+
+    assert first['statusCode'] == 200 # Fails open
+    assert retry['statusCode'] == 200 and json.loads(retry['body']) == json.loads(first['body']) # The stored result, not "in progress"
+    assert sent == ['visitor@example.com']
@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+import price_cache
+import symbol_registry
+
+
+class SlowListing:
+    """
+    A listing loader that blocks until released, like a slow upstream /map call.
+    """
+
+    def __init__(self, symbols):
+        self.symbols, self.calls = symbols, 0
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        assert self.release.wait(5)
+        return self.symbols
+
+
+def wait_for_refresh(registry):
+    deadline = time.monotonic() + 5
+    while registry._expires_at is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_cold_registry_answers_from_the_seed_and_loads_in_the_background():
+    listing = SlowListing(['BTC', 'ETH', 'PEPE'])
+    registry = symbol_registry.SymbolRegistry(listing, seed='BTC,ETH')
+
+    assert registry.resolve('pepe,btc') == (['BTC'], ['PEPE']) # Doesn't wait for the listing.
+    assert registry.resolve('eth') == (['ETH'], [])
+
+    listing.release.set()
+    wait_for_refresh(registry)
+    assert registry.resolve('pepe,btc') == (['BTC', 'PEPE'], [])
+    assert listing.calls == 1
+
+
+def test_prewarmer_loads_in_the_foreground():
+    listing = SlowListing(['SOL'])
+    listing.release.set()
+    registry = symbol_registry.SymbolRegistry(listing, seed='BTC')
+
+    assert registry.index(wait=True) == frozenset({'BTC', 'SOL'})
+
+
+def test_requests_use_the_price_cache_canonical_form():
+    registry = symbol_registry.SymbolRegistry(seed='BTC,ETH', max_symbols=2)
+
+    known, _ = registry.resolve(' eth, BTC,btc,,')
+    assert known == price_cache.normalize_symbols(' eth, BTC,btc,,') == ['BTC', 'ETH']
+    with pytest.raises(symbol_registry.TooManySymbols):
+        registry.resolve('eth,BTC,BTCC')
+
+
+class BrokenTable:
+    def get_item(self, **kwargs):
+        raise RuntimeError('ProvisionedThroughputExceededException')
+
+    def put_item(self, **kwargs):
+        raise RuntimeError('ProvisionedThroughputExceededException')
+
+
+def test_failing_shared_table_falls_back_to_upstream_and_keeps_the_listing(capsys):
+    listing = SlowListing(['BTC', 'PEPE'])
+    listing.release.set()
+    registry = symbol_registry.SymbolRegistry(listing, seed='BTC', table=BrokenTable())
+
+    assert registry.index(wait=True) == frozenset({'BTC', 'PEPE'})
+    assert registry._expires_at > time.time() + symbol_registry.RETRY_AFTER # A full ttl, not a retry.
+    out = capsys.readouterr().out
+    assert 'Shared symbol listing read failed' in out and 'Shared symbol listing write failed' in out
+
+
+def test_failing_shared_table_without_upstream_keeps_the_seed():
+    listing = SlowListing(['PEPE'])
+    registry = symbol_registry.SymbolRegistry(listing, seed='BTC', table=BrokenTable())
+
+    assert registry.index(allow_upstream=False, wait=True) == frozenset({'BTC'})
+    assert listing.calls == 0
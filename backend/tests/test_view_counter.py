@@ -0,0 +1,84 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import local_stubs
+import view_counter
+from conftest import TABLE
+
+INCREMENTS = 200
+THREADS = 16
+
+
+def run_in_parallel(function):
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        return list(pool.map(lambda _: function(), range(INCREMENTS)))
+
+
+def test_parallel_increments_are_not_lost(dynamodb):
+    local_stubs.LATENCY['dynamodb'] = 0.001 # Every call yields, so the threads really interleave.
+    counts = run_in_parallel(lambda: view_counter.increment(dynamodb, TABLE, 'page_views'))
+
+    assert view_counter.read_total(dynamodb, TABLE, 'page_views') == INCREMENTS
+    assert sorted(counts) == list(range(1, INCREMENTS + 1)) # Every caller saw its own increment.
+
+
+def test_parallel_sharded_increments_are_not_lost(dynamodb):
+    local_stubs.LATENCY['dynamodb'] = 0.001
+    run_in_parallel(lambda: view_counter.increment(dynamodb, TABLE, 'page_views', shards=4))
+
+    shards = view_counter.read_shards(dynamodb, TABLE, 'page_views', 4)
+    assert sum(shards.values()) == INCREMENTS
+    assert len([count for count in shards.values() if count]) > 1 # The writes were spread out.
+
+
+def test_read_then_write_would_lose_updates(dynamodb):
+    """
+    The old get_item + put_item pair under the same load, so the tests above can tell the difference.
+    """
+    local_stubs.LATENCY['dynamodb'] = 0.002
+    table = dynamodb.Table(TABLE)
+
+    def read_then_write():
+        item = table.get_item(Key={'counter_id': 'page_views'}).get('Item', {})
+        table.put_item(Item={'counter_id': 'page_views', 'view_count': int(item.get('view_count', 0)) + 1})
+
+    run_in_parallel(read_then_write)
+    assert view_counter.read_total(dynamodb, TABLE, 'page_views') < INCREMENTS
+
+
+class FailingTable:
+    def update_item(self, **kwargs):
+        raise RuntimeError("throttled")
+
+
+class FailingDynamoDB:
+    def Table(self, name):
+        return FailingTable()
+
+
+def test_buffer_is_capped_when_writes_fail(monkeypatch):
+    monkeypatch.setattr(view_counter, '_buffer', {})
+    state = view_counter._buffer.setdefault('page_views', {'pending': 0, 'since': 0, 'last_total': 100})
+
+    for _ in range(50):
+        try:
+            view_counter.buffered_increment(FailingDynamoDB(), TABLE, 'page_views', max_pending=5, max_age=3600)
+        except RuntimeError:
+            pass
+        assert state['pending'] <= 4 # Never more than max_pending - 1 views waiting, however long DynamoDB is down.
+
+
+def test_buffer_keeps_counting_during_a_slow_write(dynamodb, monkeypatch):
+    monkeypatch.setattr(view_counter, '_buffer', {})
+    view_counter.buffered_increment(dynamodb, TABLE, 'page_views', max_pending=1000, max_age=3600) # Cold flush: total 1.
+    view_counter.buffered_increment(dynamodb, TABLE, 'page_views', max_pending=1000, max_age=3600) # Pending: 1.
+    local_stubs.LATENCY['dynamodb'] = 0.5
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        slow = pool.submit(view_counter.flush, dynamodb, TABLE, 'page_views')
+        time.sleep(0.1) # The write is in flight now.
+        started = time.monotonic()
+        estimate = view_counter.buffered_increment(dynamodb, TABLE, 'page_views', max_pending=1000, max_age=3600)
+        assert time.monotonic() - started < 0.1 # Didn't wait for the write in flight.
+        assert estimate == 2 # Last known total 1 + 1 pending.
+        assert slow.result() == 3 # 2 written + the 1 that arrived meanwhile.
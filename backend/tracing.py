@@ -0,0 +1,208 @@
+import functools
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+'''
+Per-invocation timing and metrics for all handlers, written as one CloudWatch Embedded Metric Format (EMF) line.
+
+Printing the whole raw event on every call costs serialization time and log bytes and says nothing about where the
+time goes. Instead, wrap the handler with @tracing.traced and mark the slow parts:
+
+    @tracing.traced
+    def lambda_handler(event, context):
+        with tracing.stage('dynamodb'):
+            ...
+        tracing.outcome('cache', 'HIT')
+
+At the end of the invocation a single JSON line is printed, e.g.
+
+    {"_aws": {"Timestamp": 1760796000000, "CloudWatchMetrics": [{"Namespace": "CloudResume", "Dimensions": [["Function"]],
+     "Metrics": [{"Name": "duration_ms", "Unit": "Milliseconds"}, {"Name": "ssm_ms", "Unit": "Milliseconds"}, ...]}]},
+     "Function": "crypto_api", "duration_ms": 152.3, "ssm_ms": 14.9, "upstream_http_ms": 131.0, "cold_start": 1,
+     "cache": "MISS", "cache_miss": 1, "status": 200, "route": "GET /crypto_api", "request_id": "..."}
+
+CloudWatch turns the listed fields into metrics (no PutMetricData calls, no extra latency); the other fields stay
+searchable in Logs Insights. Stage times are wall-clock and may nest (e.g. "signing" includes the SSM fetch of the
+key on a cold start). Stages marked on other threads are only recorded when the work was submitted with
+tracing.bind(function), e.g. the parallel lookups of the /bootstrap handler; background refreshes are not recorded.
+Stages that ran in parallel can add up to more than duration_ms.
+
+The Trace also remembers when Lambda will stop the invocation (context.get_remaining_time_in_millis()), so code
+calling a slow dependency can ask tracing.remaining() and give up in time to still answer.
+
+The raw event is only logged for a sample of invocations (EVENT_LOG_SAMPLE_RATE, default 1%) and for every
+invocation that fails with a 5xx or an exception.
+'''
+
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'CloudResume')
+EVENT_LOG_SAMPLE_RATE = float(os.environ.get('EVENT_LOG_SAMPLE_RATE', '0.01'))
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+
+_local = threading.local() # .trace: the Trace of the invocation running on this thread
+
+
+class Trace:
+    """
+    Collects stage timings, counts and properties for one invocation.
+    """
+
+    def __init__(self, function_name, cold_start):
+        self.function_name = function_name
+        self.started = time.perf_counter()
+        self.metrics = {'cold_start': 1 if cold_start else 0} # name -> value
+        self.units = {'cold_start': 'Count'}
+        self.properties = {}
+        self.lock = threading.Lock() # Worker threads (see bind) may add at the same time.
+        self.deadline = None # time.monotonic() at which Lambda stops the invocation, if the context tells us.
+
+    def add(self, name, value, unit='Count'):
+        with self.lock:
+            self.metrics[name] = self.metrics.get(name, 0) + value
+            self.units[name] = unit
+
+    def record(self):
+        """
+        Build the EMF log record for this invocation.
+        """
+        self.add('duration_ms', (time.perf_counter() - self.started) * 1000, 'Milliseconds')
+        record = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE,
+                    'Dimensions': [['Function']],
+                    'Metrics': [{'Name': name, 'Unit': unit} for name, unit in self.units.items()]
+                }]
+            },
+            'Function': self.function_name
+        }
+        record.update({name: round(value, 2) for name, value in self.metrics.items()})
+        record.update(self.properties)
+        return record
+
+
+def current():
+    """
+    Return the Trace of the invocation running on this thread, or None.
+    """
+    return getattr(_local, 'trace', None)
+
+
+def remaining():
+    """
+    Return the seconds left before Lambda stops the current invocation, or None outside an invocation (or without
+    a Lambda context, e.g. background refreshes and local runs).
+    """
+    trace = current()
+    if trace is None or trace.deadline is None:
+        return None
+    return trace.deadline - time.monotonic()
+
+
+def bind(function):
+    """
+    Wrap function so it records into the current invocation's Trace when it runs on another thread (thread pools).
+    """
+    trace = current()
+
+    @functools.wraps(function)
+    def bound(*args, **kwargs):
+        previous = current()
+        _local.trace = trace
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _local.trace = previous
+
+    return bound
+
+
+@contextmanager
+def _timed(trace, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(f"{name}_ms", (time.perf_counter() - started) * 1000, 'Milliseconds')
+
+
+def stage(name):
+    """
+    Context manager that adds the time spent inside it to the "<name>_ms" metric of the current invocation.
+    """
+    trace = current()
+    return _timed(trace, name) if trace is not None else nullcontext()
+
+
+def count(name, value=1):
+    """
+    Add to a counter metric of the current invocation.
+    """
+    trace = current()
+    if trace is not None:
+        trace.add(name, value)
+
+
+def outcome(kind, value):
+    """
+    Record an outcome such as a cache result: property kind=value plus a "<kind>_<value>" count of 1.
+    """
+    trace = current()
+    if trace is not None:
+        trace.properties[kind] = value
+        trace.add(f"{kind}_{str(value).lower()}", 1)
+
+
+def _log_event(event, reason):
+    try:
+        print(json.dumps({'event_sample': reason, 'event': event}, default=str))
+    except Exception:
+        pass # Logging must never break a request.
+
+
+def traced(handler):
+    """
+    Decorator for Lambda handlers: times the invocation, emits the EMF line and samples raw event logging.
+    """
+    cold = [True] # The first invocation of this handler in this container is the cold start.
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        trace = Trace(getattr(context, 'function_name', None) or handler.__module__, cold[0])
+        cold[0] = False
+        remaining_ms = getattr(context, 'get_remaining_time_in_millis', None)
+        if remaining_ms is not None:
+            trace.deadline = time.monotonic() + remaining_ms() / 1000
+        if isinstance(event, dict):
+            if event.get('httpMethod'):
+                trace.properties['route'] = f"{event['httpMethod']} {event.get('resource') or event.get('path', '')}"
+            request_id = (event.get('requestContext') or {}).get('requestId')
+            if request_id:
+                trace.properties['request_id'] = request_id
+        if random.random() < EVENT_LOG_SAMPLE_RATE:
+            _log_event(event, 'sampled')
+
+        _local.trace = trace
+        try:
+            response = handler(event, context)
+            status = response.get('statusCode') if isinstance(response, dict) else None
+            if status is not None:
+                trace.properties['status'] = status
+                if status >= 500:
+                    _log_event(event, f"status {status}")
+            return response
+        except Exception as e:
+            trace.properties['error'] = type(e).__name__
+            trace.add('errors', 1)
+            _log_event(event, 'exception')
+            raise
+        finally:
+            _local.trace = None
+            if METRICS_ENABLED:
+                print(json.dumps(trace.record(), separators=(',', ':')))
+
+    return wrapper
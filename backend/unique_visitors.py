@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta, timezone
+
+import dynamo # Batched reads and conditional write checks, see dynamo.py
+import hyperloglog
+
+'''
+Unique-visitor counting on top of viewer_count_table.
+
+Each UTC day gets one item holding a HyperLogLog register array (see hyperloglog.py):
+
+    {"counter_id": "unique_visitors#2026-10-18", "registers": <4096 bytes>, "version": 17}
+
+The item never grows, no matter how many visitors arrive. Updates use optimistic concurrency:
+read the item, merge our visitor in, and write it back only if `version` is still the value we read.
+If another invocation got there first, the conditional write fails and we retry with the fresh registers.
+
+Most requests from returning visitors don't change any register, so they cost one read and no write at all.
+'''
+
+KEY_PREFIX = "unique_visitors"
+MAX_RETRIES = 5
+WINDOWS = {'day': 1, 'week': 7, 'month': 30} # Days merged for each ?window= value.
+
+
+def today_utc():
+    """
+    Return today's date in UTC, the time bucket used for the daily sketches.
+    """
+    return datetime.now(timezone.utc).date()
+
+
+def day_key(day):
+    """
+    Return the counter_id of the HyperLogLog item for one UTC date.
+    """
+    return f"{KEY_PREFIX}#{day.isoformat()}"
+
+
+def visitor_id(event):
+    """
+    Build a visitor ID from the API Gateway proxy event (source IP + user agent).
+    """
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    return f"{identity.get('sourceIp', '')}|{headers.get('user-agent', '')}"
+
+
+def _registers(item):
+    """
+    Extract the register array from a DynamoDB item (boto3 wraps binary attributes in a Binary object).
+    """
+    raw = item.get('registers') if item else None
+    if raw is None:
+        return None
+    return bytearray(getattr(raw, 'value', raw))
+
+
+def record_visitor(table, visitor, day=None):
+    """
+    Add a visitor to the sketch for `day` (default: today, UTC) and return that day's unique-visitor estimate.
+    """
+    day = day or today_utc()
+    key = day_key(day)
+
+    for _ in range(MAX_RETRIES):
+        item = table.get_item(Key={'counter_id': key}, ConsistentRead=True).get('Item')
+        registers = _registers(item) or hyperloglog.new_registers()
+        version = int(item['version']) if item else 0
+
+        if not hyperloglog.add(registers, visitor):
+            return hyperloglog.estimate(registers) # Nothing changed, skip the write.
+
+        try:
+            table.put_item(
+                Item={'counter_id': key, 'registers': bytes(registers), 'version': version + 1},
+                ConditionExpression='attribute_not_exists(counter_id) OR version = :version',
+                ExpressionAttributeValues={':version': version}
+            )
+            return hyperloglog.estimate(registers)
+        except Exception as e:
+            if not dynamo.conditional_check_failed(e):
+                raise
+            # Someone else updated the sketch between our read and write, re-read and merge again.
+
+    raise RuntimeError(f"Gave up updating {key} after {MAX_RETRIES} conflicting writes")
+
+
+def estimate_range(dynamodb, table_name, end_day, days):
+    """
+    Merge the daily sketches of the `days` days ending on `end_day` and return the unique-visitor estimate.
+    """
+    keys = [day_key(end_day - timedelta(days=offset)) for offset in range(days)]
+    items = dynamo.get_items(dynamodb, table_name, [{'counter_id': key} for key in keys])
+    sketches = [_registers(item) for item in items]
+
+    return hyperloglog.estimate(hyperloglog.merge(*sketches))
+
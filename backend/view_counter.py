@@ -0,0 +1,228 @@
+import hashlib
+import random # Used to pick which shard a write lands on.
+import threading
+import time
+from collections import OrderedDict
+
+import dynamo # Batched reads and conditional write checks, see dynamo.py
+import tracing # Per-invocation metrics, see tracing.py
+
+'''
+Increment engine for the viewer counter.
+
+A single counter item ("page_views") is fine for a small site, but every write lands on the same partition key.
+During a traffic spike that one key is throttled long before the table runs out of capacity.
+Sharding spreads the writes over N items and sums them back up when we read:
+
+    page_views      -> shard 0 (the original item, so existing counts are kept)
+    page_views#1    -> shard 1
+    page_views#2    -> shard 2
+    ...
+
+Every write is a single atomic update_item with ADD, so concurrent invocations can never lose an increment
+(the old get_item + put_item pair could: two Lambdas read 10, both write 11).
+'''
+
+# Write-behind buffer, one entry per counter_id. Module level so it survives across warm invocations of the same container.
+_buffer = {}
+_buffer_lock = threading.Lock()
+
+# Visitors this container already knows were counted: fingerprint hash -> epoch seconds their window ends, oldest first.
+_seen = OrderedDict()
+_seen_lock = threading.Lock()
+MAX_SEEN = 10000 # ~1 MB at most; the oldest entries are forgotten first (DynamoDB still remembers them).
+SEEN_PREFIX = "seen"
+
+
+def shard_key(counter_id, shard):
+    """
+    Return the partition key of one shard. Shard 0 is the counter item itself.
+    """
+    return counter_id if shard == 0 else f"{counter_id}#{shard}"
+
+
+def add_to_item(table, key, amount=1):
+    """
+    Atomically add `amount` to the view_count of one item and return the new value.
+    """
+    response = table.update_item(
+        Key={'counter_id': key},
+        UpdateExpression='ADD view_count :inc', # ADD creates the attribute (starting at 0) if it doesn't exist yet.
+        ExpressionAttributeValues={':inc': amount},
+        ReturnValues='UPDATED_NEW' # Return the value after the update so we don't need a second read.
+    )
+    return int(response['Attributes']['view_count']) # DynamoDB returns numbers as Decimal.
+
+
+def read_counts(dynamodb, table_name, keys, consistent=True):
+    """
+    Read the view_count of many counter items with batch_get_item and return {key: count}.
+    consistent=False halves the read cost and may miss writes from the last second or so.
+    """
+    counts = {key: 0 for key in keys} # Counters that were never written to don't exist yet, they count as 0.
+    for item in dynamo.get_items(dynamodb, table_name, [{'counter_id': key} for key in keys], 'counter_id, view_count', consistent):
+        counts[item['counter_id']] = int(item.get('view_count', 0))
+    return counts
+
+
+def read_shards(dynamodb, table_name, counter_id, shards, consistent=True):
+    """
+    Read every shard of a counter and return {key: count}.
+    """
+    return read_counts(dynamodb, table_name, [shard_key(counter_id, shard) for shard in range(shards)], consistent)
+
+
+def read_total(dynamodb, table_name, counter_id, shards=1, consistent=True):
+    """
+    Return the current total of a (possibly sharded) counter.
+    """
+    return sum(read_shards(dynamodb, table_name, counter_id, shards, consistent).values())
+
+
+def increment(dynamodb, table_name, counter_id, shards=1, amount=1):
+    """
+    Add `amount` to the counter and return the new total.
+
+    With shards == 1 this is a single update_item round trip.
+    With shards > 1 the write goes to a random shard and the total is summed from a batch read.
+    """
+    table = dynamodb.Table(table_name)
+    if shards <= 1:
+        return add_to_item(table, counter_id, amount)
+
+    key = shard_key(counter_id, random.randrange(shards))
+    new_value = add_to_item(table, key, amount)
+
+    counts = read_shards(dynamodb, table_name, counter_id, shards)
+    counts[key] = max(counts[key], new_value) # Our own write is authoritative even if the read raced it.
+    return sum(counts.values())
+
+
+def buffered_increment(dynamodb, table_name, counter_id, shards=1, max_pending=10, max_age=30.0):
+    """
+    Count one view in the in-process buffer and only write to DynamoDB when a threshold is hit.
+
+    Returns an estimated total: the last total DynamoDB gave us plus the views still waiting in the buffer.
+    """
+    now = time.monotonic()
+    with _buffer_lock:
+        state = _buffer.setdefault(counter_id, {'pending': 0, 'since': now, 'last_total': None})
+        state['pending'] += 1
+        state['max_pending'] = max_pending
+        due = (
+            state['last_total'] is None # Cold container: flush straight away so we have a real total to estimate from.
+            or state['pending'] >= max_pending
+            or now - state['since'] >= max_age
+        )
+        if not due:
+            return state['last_total'] + state['pending']
+        amount = _take(state, now)
+    return _write(dynamodb, table_name, counter_id, shards, state, amount)
+
+
+def flush(dynamodb, table_name, counter_id, shards=1):
+    """
+    Write any buffered views for counter_id now. Returns the new total, or None if nothing was pending.
+    """
+    with _buffer_lock:
+        state = _buffer.get(counter_id)
+        if not state or not state['pending']:
+            return None
+        amount = _take(state, time.monotonic())
+    return _write(dynamodb, table_name, counter_id, shards, state, amount)
+
+
+def _take(state, now):
+    """
+    Swap the pending views out of the buffer. Caller must hold _buffer_lock.
+    """
+    amount = state['pending']
+    state.update(pending=0, since=now)
+    return amount
+
+
+def _write(dynamodb, table_name, counter_id, shards, state, amount):
+    """
+    Write views taken out of the buffer as one ADD, without holding _buffer_lock, so other callers keep counting
+    into the buffer (and other counters keep flushing) while we wait for DynamoDB.
+
+    If the write fails the views go back into the buffer, but never more than max_pending - 1 of them: the rest
+    are dropped and counted in the "views_dropped" metric, then the error is raised.
+    """
+    try:
+        total = increment(dynamodb, table_name, counter_id, shards=shards, amount=amount)
+    except Exception:
+        with _buffer_lock:
+            kept = min(state['pending'] + amount, max(0, state['max_pending'] - 1))
+            dropped = state['pending'] + amount - kept
+            state['pending'] = kept
+        if dropped:
+            tracing.count('views_dropped', dropped)
+            print(f"View buffer write failed, dropped {dropped} views of {counter_id}")
+        raise
+
+    with _buffer_lock:
+        state['last_total'] = max(state['last_total'] or 0, total) # Concurrent writes may answer out of order.
+        return state['last_total'] + state['pending'] # Views that arrived while we were writing.
+
+'''
+How many views can we lose?
+
+Lambda has no shutdown hook we can rely on, so views sitting in the buffer when a container is recycled are gone.
+Because a flush happens as soon as `pending` reaches max_pending, a container never holds more than max_pending - 1 unwritten views.
+So the worst case is (max_pending - 1) lost views per recycled container and buffered counter_id. lambda_function
+only buffers the site total (page and section counters are written directly), which keeps it at max_pending - 1
+per container.
+
+A failed write puts its views back, capped at max_pending - 1 as well, so an unreachable table can't grow the buffer
+(and the loss) without limit. Views over the cap are dropped on the spot and show up in the views_dropped metric.
+
+The DynamoDB write itself runs outside the buffer lock: the pending views are swapped out first, so a slow write
+never makes the other callers wait.
+
+max_age is only checked when the next view arrives (there is no background timer in Lambda), so it bounds how stale the
+stored total gets while traffic keeps coming. It does not shrink the loss bound above.
+
+With max_pending=1 every view is written immediately, which is the same as calling increment().
+'''
+
+
+def fingerprint_key(fingerprint):
+    """
+    Return the counter_id of a visitor's dedupe item. Hashed, so the table never stores IPs or user agents.
+    """
+    return f"{SEEN_PREFIX}#{hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()[:32]}"
+
+
+def first_visit(table, fingerprint, window, now=None):
+    """
+    True if this visitor hasn't been counted in the last `window` seconds (and marks them as counted now).
+
+    Checked in this container's memory first (no DynamoDB call at all for a repeat visitor on a warm container),
+    then with one conditional put of a "seen#<hash>" item that only succeeds if there is no unexpired one.
+    Concurrent requests of the same visitor can't both win the conditional put, so they count once.
+    """
+    now = now or time.time()
+    key = fingerprint_key(fingerprint)
+    with _seen_lock:
+        if _seen.get(key, 0) > now:
+            return False
+
+    try:
+        table.put_item(
+            Item={'counter_id': key, 'expires_at': int(now + window)}, # expires_at is the table's DynamoDB TTL attribute.
+            ConditionExpression='attribute_not_exists(counter_id) OR expires_at < :now',
+            ExpressionAttributeValues={':now': int(now)}
+        )
+        first = True
+    except Exception as e:
+        if not dynamo.conditional_check_failed(e):
+            raise
+        first = False # Counted by another container within the window.
+
+    with _seen_lock:
+        _seen[key] = now + window # For a repeat we don't know when their window started; err on the side of not counting.
+        _seen.move_to_end(key)
+        while len(_seen) > MAX_SEEN:
+            _seen.popitem(last=False)
+    return first
@@ -2,11 +2,13 @@
  * ✅ Update Counter (Viewer Count)
  ************************************************************************/
 const counter = document.querySelector(".counter-number"); // Select the element displaying the viewer count.
+const pagePath = encodeURIComponent(window.location.pathname); // Also counted per page (see backend/page_counters.py).
 
-// Function to fetch and update the viewer count from the API.
+// Function to fetch and update the viewer count from the API (used by loadPage() when /bootstrap can't provide it).
 async function updateCounter() {
     try {
-        let response = await fetch("https://zyst4gczkf.execute-api.us-east-1.amazonaws.com/prod/viewer-count");
+        // POST counts the view (once per visitor per dedupe window), GET only reads the total.
+        let response = await fetch(`https://zyst4gczkf.execute-api.us-east-1.amazonaws.com/prod/viewer-count?path=${pagePath}`, { method: "POST" });
         let data = await response.json();
         counter.innerHTML = `Views: ${data.view_count}`; // Update the counter with the new view count.
     } catch (error) {
@@ -14,16 +16,30 @@ async function updateCounter() {
     }
 }
 
-// Call the function on page load.
-updateCounter();
-
 /************************************************************************
  * ✅ Fetch and Display Cryptocurrency Prices
  ************************************************************************/
+const cryptoSymbols = "BTC,ETH,BNB,LTC,DOGE,NEO,ADA,SOL,XRP,TRX"; // Supported cryptocurrencies.
+
 async function fetchCryptoPrices() {
     const apiEndpoint = "https://zyst4gczkf.execute-api.us-east-1.amazonaws.com/prod/crypto_api";
-    const symbols = "BTC,ETH,BNB,LTC,DOGE,NEO,ADA,SOL,XRP,TRX"; // Supported cryptocurrencies.
 
+    try {
+        const response = await fetch(`${apiEndpoint}?symbols=${cryptoSymbols}`);
+        const data = await response.json();
+        
+        if (data.prices) {
+            renderCryptoPrices(data.prices);
+        } else {
+            console.error("No prices found in response");
+        }
+    } catch (error) {
+        console.error("Error fetching crypto prices:", error);
+    }
+}
+
+// Populate the crypto bar with price data ({symbol: price}).
+function renderCryptoPrices(prices) {
     // Mapping cryptocurrency symbols to their respective logo URLs.
     const cryptoLogos = {
         BTC: "https://cryptologos.cc/logos/bitcoin-btc-logo.png",
@@ -38,48 +54,63 @@ async function fetchCryptoPrices() {
         TRX: "https://cryptologos.cc/logos/tron-trx-logo.png",
     };
 
+    const cryptoBar = document.getElementById("crypto-bar");
+    cryptoBar.innerHTML = ""; // Clear existing content.
+
+    for (const [symbol, price] of Object.entries(prices)) {
+        const item = document.createElement("div");
+        item.className = "crypto-item";
+
+        const icon = document.createElement("img");
+        icon.src = cryptoLogos[symbol] || "https://via.placeholder.com/40";
+        icon.alt = `${symbol} logo`;
+        icon.style.width = "40px";
+        icon.style.height = "40px";
+
+        const name = document.createElement("div");
+        name.className = "crypto-name";
+        name.textContent = symbol;
+
+        const priceElement = document.createElement("div");
+        priceElement.className = "crypto-price";
+        priceElement.textContent = `$${price.toFixed(2)}`;
+
+        item.appendChild(icon);
+        item.appendChild(name);
+        item.appendChild(priceElement);
+        cryptoBar.appendChild(item);
+    }
+}
+
+/************************************************************************
+ * ✅ Page Load: viewer count + prices in one request
+ ************************************************************************/
+// /bootstrap counts the view and looks up the prices in one Lambda invocation (see backend/bootstrap.py),
+// instead of one request to /viewer-count and another to /crypto_api.
+// Whatever it couldn't provide is fetched from the old endpoints.
+async function loadPage() {
+    let data = {};
     try {
-        const response = await fetch(`${apiEndpoint}?symbols=${symbols}`);
-        const data = await response.json();
-        
-        if (data.prices) {
-            const cryptoBar = document.getElementById("crypto-bar");
-            cryptoBar.innerHTML = ""; // Clear existing content.
-            
-            // Populate the crypto bar with price data.
-            for (const [symbol, price] of Object.entries(data.prices)) {
-                const item = document.createElement("div");
-                item.className = "crypto-item";
-
-                const icon = document.createElement("img");
-                icon.src = cryptoLogos[symbol] || "https://via.placeholder.com/40";
-                icon.alt = `${symbol} logo`;
-                icon.style.width = "40px";
-                icon.style.height = "40px";
-
-                const name = document.createElement("div");
-                name.className = "crypto-name";
-                name.textContent = symbol;
-
-                const priceElement = document.createElement("div");
-                priceElement.className = "crypto-price";
-                priceElement.textContent = `$${price.toFixed(2)}`;
-
-                item.appendChild(icon);
-                item.appendChild(name);
-                item.appendChild(priceElement);
-                cryptoBar.appendChild(item);
-            }
-        } else {
-            console.error("No prices found in response");
-        }
+        const response = await fetch(`https://zyst4gczkf.execute-api.us-east-1.amazonaws.com/prod/bootstrap?symbols=${cryptoSymbols}&path=${pagePath}`);
+        data = await response.json();
     } catch (error) {
-        console.error("Error fetching crypto prices:", error);
+        console.error("Error fetching bootstrap data:", error);
+    }
+
+    if (data.view_count !== undefined) {
+        counter.innerHTML = `Views: ${data.view_count}`;
+    } else {
+        updateCounter();
+    }
+
+    if (data.prices) {
+        renderCryptoPrices(data.prices);
+    } else {
+        fetchCryptoPrices();
     }
 }
 
-// Fetch the cryptocurrency prices on page load.
-fetchCryptoPrices();
+loadPage();
 
 /************************************************************************
  * ✅ Email Sending Functionality
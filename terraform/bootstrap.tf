@@ -0,0 +1,58 @@
+# ------------------------- Bootstrap lambda (viewer count + crypto prices in one call) ------------------------- #
+
+resource "aws_lambda_function" "bootstrap_function" {
+  filename         = "build/bootstrap.zip" # python backend/build.py
+  source_code_hash = filebase64sha256("build/bootstrap.zip")
+  function_name    = "bootstrap"
+  role             = aws_iam_role.lambda_role.arn # Same role as viewer_count and crypto_api: DynamoDB + SSM access
+  handler          = "bootstrap.lambda_handler"
+  runtime          = "python3.9"
+  timeout          = 10 # bootstrap.py answers with whatever finished BOOTSTRAP_TIMEOUT (5 s) into the call.
+
+  environment {
+    variables = {
+      DYNAMODB_TABLE = aws_dynamodb_table.viewer_count_table.name
+    }
+  }
+
+  layers = [aws_lambda_layer_version.requests_layer.arn]
+
+  depends_on = [aws_iam_role_policy_attachment.lambda_policy_attachment]
+}
+
+# ------------------------- API Gateway ------------------------- #
+
+resource "aws_api_gateway_resource" "bootstrap_resource" {
+  rest_api_id = aws_api_gateway_rest_api.viewer_count_api.id # main rest api for all, (locatted in main.tf)
+  parent_id   = aws_api_gateway_rest_api.viewer_count_api.root_resource_id
+  path_part   = "bootstrap"
+}
+
+resource "aws_api_gateway_method" "bootstrap_method" {
+  rest_api_id   = aws_api_gateway_rest_api.viewer_count_api.id
+  resource_id   = aws_api_gateway_resource.bootstrap_resource.id
+  http_method   = "GET"
+  authorization = "NONE"
+}
+
+resource "aws_api_gateway_integration" "bootstrap_integration" {
+  rest_api_id             = aws_api_gateway_rest_api.viewer_count_api.id
+  resource_id             = aws_api_gateway_resource.bootstrap_resource.id
+  http_method             = aws_api_gateway_method.bootstrap_method.http_method
+  type                    = "AWS_PROXY"
+  integration_http_method = "POST" # MUST BE POST!
+  uri                     = aws_lambda_function.bootstrap_function.invoke_arn
+}
+
+resource "aws_lambda_permission" "api_gateway_bootstrap_permission" {
+  statement_id  = "AllowAPIGatewayInvokeBootstrap"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.bootstrap_function.function_name
+  principal     = "apigateway.amazonaws.com"
+  source_arn    = "${aws_api_gateway_rest_api.viewer_count_api.execution_arn}/*/GET/bootstrap"
+
+  depends_on = [
+    aws_api_gateway_rest_api.viewer_count_api,
+    aws_lambda_function.bootstrap_function
+  ]
+}
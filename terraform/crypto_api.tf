@@ -11,11 +11,13 @@ resource "aws_ssm_parameter" "lambda_btc_api_token" {
 # ------------------------- Crypto API lambda + iam role from main.tf ------------------------- #
 
 resource "aws_lambda_function" "crypto_api_function" {
-  filename      = "crypto_api.zip"
-  function_name = "crypto_api"
-  role          = aws_iam_role.lambda_role.arn
-  handler       = "crypto_api.lambda_handler" # must match the code files name
-  runtime       = "python3.9"
+  filename         = "build/crypto_api.zip" # python backend/build.py
+  source_code_hash = filebase64sha256("build/crypto_api.zip")
+  function_name    = "crypto_api"
+  role             = aws_iam_role.lambda_role.arn
+  handler          = "crypto_api.lambda_handler" # must match the code files name
+  runtime          = "python3.9"
+  timeout          = 10 # cmc_client stops retrying CMC_DEADLINE_MARGIN (1 s) before this, leaving time to answer from the cache.
 
   layers = [aws_lambda_layer_version.requests_layer.arn]
 
@@ -23,7 +25,8 @@ resource "aws_lambda_function" "crypto_api_function" {
 
 # Lambda Layer Resource
 resource "aws_lambda_layer_version" "requests_layer" {
-  filename            = "requests-layer.zip"
+  filename            = "build/requests_layer.zip"
+  source_code_hash    = filebase64sha256("build/requests_layer.zip")
   layer_name          = "requests_dependency_layer"
   compatible_runtimes = ["python3.9"] # Adjust if you're using a different Python version
   description         = "Lambda Layer containing the requests module"
@@ -397,11 +397,12 @@ resource "aws_ssm_parameter" "cloudfront_key_pair_id" {
 # ------------------------- Lambda Function for SES ------------------------- #
 
 resource "aws_lambda_function" "ses_lambda" {
-  filename      = "SES_lambda.zip"
-  function_name = "SESFunction"
-  role          = aws_iam_role.lambda_role.arn
-  handler       = "SES_lambda.lambda_handler"
-  runtime       = "python3.9"
+  filename         = "build/SES_lambda.zip" # python backend/build.py
+  source_code_hash = filebase64sha256("build/SES_lambda.zip")
+  function_name    = "SESFunction"
+  role             = aws_iam_role.lambda_role.arn
+  handler          = "SES_lambda.lambda_handler"
+  runtime          = "python3.9"
 
   environment {
     variables = {
@@ -421,7 +422,8 @@ resource "aws_lambda_function" "ses_lambda" {
 
 # Lambda Layer Resource
 resource "aws_lambda_layer_version" "rsa_layer" {
-  filename            = "rsa-layer.zip"
+  filename            = "build/rsa_layer.zip"
+  source_code_hash    = filebase64sha256("build/rsa_layer.zip")
   layer_name          = "rsa_dependency_layer"
   compatible_runtimes = ["python3.9"] # Adjust if you're using a different Python version
   description         = "Lambda Layer containing the rsa library"
@@ -588,6 +590,12 @@ resource "aws_dynamodb_table" "viewer_count_table" {
     type = "S"
   }
 
+  # Deletes the per-visitor "seen#..." dedupe items once their window has passed (see backend/lambda_function.py).
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
   tags = {
     Name = "Viewer Count DynamoDB Table"
   }
@@ -606,6 +614,7 @@ resource "aws_iam_policy" "lambda_policy" {
         Effect = "Allow",
         Action = [
           "dynamodb:GetItem",
+          "dynamodb:BatchGetItem", # Read path: counter shards, page counters and unique-visitor sketches
           "dynamodb:PutItem",
           "dynamodb:UpdateItem"
         ],
@@ -623,11 +632,13 @@ resource "aws_iam_role_policy_attachment" "lambda_policy_attachment" {
 # ------------------------- Lambda Function for Viewer Count ------------------------- #
 
 resource "aws_lambda_function" "viewer_count_function" {
-  filename      = "viewer_count.zip"
-  function_name = "viewer_count"
-  role          = aws_iam_role.lambda_role.arn
-  handler       = "lambda_function.lambda_handler"
-  runtime       = "python3.9"
+  filename         = "build/viewer_count.zip" # python backend/build.py
+  source_code_hash = filebase64sha256("build/viewer_count.zip")
+  function_name    = "viewer_count"
+  role             = aws_iam_role.lambda_role.arn
+  handler          = "lambda_function.lambda_handler"
+  runtime          = "python3.9"
+  timeout          = 10 # Room for the throttling backoff of dynamo.get_items (3 s default would cut it off).
 
   environment {
     variables = {
@@ -669,13 +680,30 @@ resource "aws_api_gateway_integration" "lambda_integration" {
   uri                     = aws_lambda_function.viewer_count_function.invoke_arn
 }
 
+# POST counts a view, GET only reads the total (same Lambda)
+resource "aws_api_gateway_method" "viewer_count_post" {
+  rest_api_id   = aws_api_gateway_rest_api.viewer_count_api.id
+  resource_id   = aws_api_gateway_resource.viewer_count_resource.id
+  http_method   = "POST"
+  authorization = "NONE"
+}
+
+resource "aws_api_gateway_integration" "viewer_count_post_integration" {
+  rest_api_id             = aws_api_gateway_rest_api.viewer_count_api.id
+  resource_id             = aws_api_gateway_resource.viewer_count_resource.id
+  http_method             = aws_api_gateway_method.viewer_count_post.http_method
+  type                    = "AWS_PROXY"
+  integration_http_method = "POST"
+  uri                     = aws_lambda_function.viewer_count_function.invoke_arn
+}
+
 # Lambda Permission for API Gateway to invoke viewer count lambda
 resource "aws_lambda_permission" "crypto_api_permission" {
   statement_id  = "AllowExecutionFromAPIGateway"
   action        = "lambda:InvokeFunction"
   function_name = aws_lambda_function.viewer_count_function.function_name
   principal     = "apigateway.amazonaws.com"
-  source_arn    = "${aws_api_gateway_rest_api.viewer_count_api.execution_arn}/*/GET/viewer-count"
+  source_arn    = "${aws_api_gateway_rest_api.viewer_count_api.execution_arn}/*/*/viewer-count" # GET and POST
 
   depends_on = [
     aws_api_gateway_rest_api.viewer_count_api,
@@ -724,8 +752,10 @@ resource "aws_lambda_permission" "api_gateway_send_cv_permission" {
 resource "aws_api_gateway_deployment" "api_deployment" {
   depends_on = [
     aws_api_gateway_integration.lambda_integration,
+    aws_api_gateway_integration.viewer_count_post_integration,
     aws_api_gateway_integration.send_cv_post_integration,
     aws_api_gateway_integration.crypto_api_integration,
+    aws_api_gateway_integration.bootstrap_integration,
     aws_api_gateway_integration.send_cv_options_integration
   ]
   rest_api_id = aws_api_gateway_rest_api.viewer_count_api.id
@@ -1,36 +1,10 @@
-data "archive_file" "crypto_api" {
-  type        = "zip"
-  source_file = "../backend/crypto_api.py"
-  output_path = "crypto_api.zip"
-}
-
-output "crypto_api_path" {
-  value = data.archive_file.crypto_api.output_path
-}
-
-# --------- # 
-
-
-data "archive_file" "lambda_function" {
-  type        = "zip"
-  source_file = "../backend/lambda_function.py"
-  output_path = "viewer_count.zip"
-}
-
-output "lambda_function_path" {
-  value = data.archive_file.lambda_function.output_path
-}
-
-# --------- # 
-
-data "archive_file" "SES_lambda" {
-  type        = "zip"
-  source_file = "../backend/SES_lambda.py"
-  output_path = "SES_lambda.zip"
-}
-
-output "SES_lambda_path" {
-  value = data.archive_file.SES_lambda.output_path
-}
-
-
+# Lambda function and layer zips are no longer built here.
+#
+# archive_file zipped each handler file on its own, but the handlers now import shared backend modules
+# (api_response, aws_clients, tracing, ...), and its zips changed bytes on every run. Build them with
+#
+#   python backend/build.py
+#
+# which writes reproducible zips (handler + the modules it imports, precompiled for python3.9) and the layers
+# (pinned requirements from backend/build_manifest.json) into terraform/build/. The functions and layers
+# reference those files together with source_code_hash, so only a real code change triggers an update.